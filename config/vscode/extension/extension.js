@@ -1,12 +1,33 @@
 const vscode = require('vscode');
 const fs = require('fs');
 const path = require('path');
+const net = require('net');
+const crypto = require('crypto');
 
 // Exception data storage
 let currentException = null;
 let exceptionHistory = [];
 const MAX_HISTORY_SIZE = 10;
 
+// Paged variable requests answered by the GDB helper (vscode-vars)
+const VARIABLES_PAGE_SIZE = 50;
+const VARIABLES_TIMEOUT_MS = 5000;
+const VARIABLES_MARKER = 'MPYVARS ';
+const pendingVariableRequests = new Map();
+let nextVariableRequestId = 1;
+let variablesOutputBuffer = '';
+
+// Event stream from the GDB helper (newline-delimited JSON over a local socket)
+const REFRESH_DELAY_MS = 20;
+let eventServer = null;
+let refreshTimer = null;
+let pendingVisualize = false;
+
+// Read position in the append-only history log (exception_history.jsonl)
+const HISTORY_INDEX_ENTRY_SIZE = 8;
+let historyLogIno = null;
+let historyLogOffset = 0;
+
 // Tree data providers
 let exceptionTreeProvider;
 let variablesTreeProvider;
@@ -39,7 +60,7 @@ function activate(context) {
     // Set up file system watcher for exception info file
     const workspaceRoot = vscode.workspace.workspaceFolders[0].uri.fsPath;
     const exceptionInfoPath = path.join(workspaceRoot, '.vscode', 'exception_info.json');
-    const exceptionHistoryPath = path.join(workspaceRoot, '.vscode', 'exception_history.json');
+    const exceptionHistoryPath = path.join(workspaceRoot, '.vscode', 'exception_history.jsonl');
 
     // Create .vscode directory if it doesn't exist
     const vscodePath = path.join(workspaceRoot, '.vscode');
@@ -65,6 +86,9 @@ function activate(context) {
         loadExceptionHistory(exceptionHistoryPath);
     });
 
+    // Exceptions stream in over the socket; the files above are the fallback
+    startEventServer(workspaceRoot);
+
     // Load initial data if available
     if (fs.existsSync(exceptionInfoPath)) {
         loadExceptionInfo(exceptionInfoPath);
@@ -73,6 +97,19 @@ function activate(context) {
         loadExceptionHistory(exceptionHistoryPath);
     }
 
+    // Replies to vscode-vars arrive as debug console output
+    context.subscriptions.push(vscode.debug.registerDebugAdapterTrackerFactory('*', {
+        createDebugAdapterTracker() {
+            return {
+                onDidSendMessage: message => {
+                    if (message.type === 'event' && message.event === 'output' && message.body) {
+                        handleVariablesOutput(message.body.output || '');
+                    }
+                }
+            };
+        }
+    }));
+
     // Register debug session event handlers
     vscode.debug.onDidStartDebugSession(session => {
         console.log('Debug session started');
@@ -92,6 +129,215 @@ function activate(context) {
  */
 function deactivate() {
     console.log('MicroPython Debugger extension is now deactivated');
+    if (eventServer) {
+        eventServer.close();
+        eventServer = null;
+    }
+}
+
+/**
+ * Path of the socket (named pipe on Windows) the GDB helper connects to
+ * @param {string} workspaceRoot 
+ * @returns {string}
+ */
+function eventChannelPath(workspaceRoot) {
+    if (process.platform === 'win32') {
+        const digest = crypto.createHash('sha1').update(path.normalize(workspaceRoot).toLowerCase()).digest('hex').slice(0, 16);
+        return `\\\\.\\pipe\\micropython-debugger-${digest}`;
+    }
+    return path.join(workspaceRoot, '.vscode', 'micropython-events.sock');
+}
+
+/**
+ * Listen for events from the GDB helper
+ * @param {string} workspaceRoot 
+ */
+function startEventServer(workspaceRoot) {
+    const socketPath = eventChannelPath(workspaceRoot);
+    if (process.platform === 'win32' || !fs.existsSync(socketPath)) {
+        listenForEvents(socketPath);
+        return;
+    }
+
+    // The socket may belong to another window of the same workspace: only
+    // take it over if nothing is listening on it any more
+    const probe = net.connect(socketPath);
+    probe.on('connect', () => {
+        probe.destroy();
+        console.log(`Debugger event socket ${socketPath} is in use by another window`);
+    });
+    probe.on('error', error => {
+        if (error.code === 'ECONNREFUSED') {
+            // Left behind by a window that has gone away
+            try {
+                fs.unlinkSync(socketPath);
+            } catch (unlinkError) {
+                console.error('Error removing stale debugger event socket:', unlinkError);
+                return;
+            }
+        } else if (error.code !== 'ENOENT') {
+            console.error('Error probing debugger event socket:', error);
+            return;
+        }
+        listenForEvents(socketPath);
+    });
+}
+
+/**
+ * Accept connections from the GDB helper on the event socket
+ * @param {string} socketPath 
+ */
+function listenForEvents(socketPath) {
+    eventServer = net.createServer(connection => {
+        let buffer = '';
+        connection.setEncoding('utf8');
+        connection.on('data', chunk => {
+            buffer += chunk;
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (!line) {
+                    continue;
+                }
+                try {
+                    handleEvent(JSON.parse(line));
+                } catch (error) {
+                    console.error('Error handling debugger event:', error);
+                }
+            }
+        });
+        connection.on('error', error => {
+            console.error('Debugger event connection error:', error);
+        });
+    });
+    eventServer.on('error', error => {
+        console.error('Error starting debugger event server:', error);
+    });
+    eventServer.listen(socketPath);
+}
+
+/**
+ * Handle one event from the GDB helper
+ * @param {object} event 
+ */
+function handleEvent(event) {
+    switch (event.event) {
+        case 'exception':
+            currentException = event.exception;
+            addToHistory(currentException);
+            pendingVisualize = true;
+            scheduleRefresh();
+            break;
+        case 'exception-repeat':
+            countRepeat(event);
+            scheduleRefresh();
+            break;
+        case 'resume':
+            // Variable references die with the stop they were taken at
+            if (currentException && currentException.variables) {
+                currentException.variables = null;
+                scheduleRefresh();
+            }
+            break;
+        default:
+            break;
+    }
+}
+
+/**
+ * Refresh the views once per burst of events rather than once per event
+ */
+function scheduleRefresh() {
+    if (refreshTimer) {
+        return;
+    }
+    refreshTimer = setTimeout(() => {
+        refreshTimer = null;
+        exceptionTreeProvider.refresh();
+        variablesTreeProvider.refresh();
+
+        const config = vscode.workspace.getConfiguration('micropythonDebugger');
+        if (pendingVisualize && config.get('autoVisualizeExceptions')) {
+            visualizeException();
+        }
+        pendingVisualize = false;
+    }, REFRESH_DELAY_MS);
+}
+
+/**
+ * Ask the GDB helper for one page of a variable reference's children
+ * @param {number} ref 
+ * @param {number} start 
+ * @param {number} count 
+ * @returns {Promise<object>} reply with total and variables
+ */
+function requestVariables(ref, start, count) {
+    const session = vscode.debug.activeDebugSession;
+    if (!session) {
+        return Promise.reject(new Error('No active debug session'));
+    }
+
+    const id = nextVariableRequestId++;
+    return new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+            pendingVariableRequests.delete(id);
+            reject(new Error('Timed out waiting for variables'));
+        }, VARIABLES_TIMEOUT_MS);
+        pendingVariableRequests.set(id, { resolve, reject, timer });
+
+        session.customRequest('evaluate', {
+            expression: `-exec vscode-vars ${ref} ${start} ${count} ${id}`,
+            context: 'repl'
+        }).then(response => {
+            // Some adapters return the command output in the response instead of an output event
+            if (response && response.result) {
+                handleVariablesOutput(response.result + '\n');
+            }
+        }, error => {
+            const pending = pendingVariableRequests.get(id);
+            if (pending) {
+                pendingVariableRequests.delete(id);
+                clearTimeout(pending.timer);
+                reject(error);
+            }
+        });
+    });
+}
+
+/**
+ * Resolve pending variable requests from debug adapter output
+ * @param {string} output 
+ */
+function handleVariablesOutput(output) {
+    variablesOutputBuffer += output;
+    const lines = variablesOutputBuffer.split('\n');
+    variablesOutputBuffer = lines.pop();
+
+    for (const line of lines) {
+        const start = line.indexOf(VARIABLES_MARKER);
+        if (start < 0) {
+            continue;
+        }
+
+        let reply;
+        try {
+            reply = JSON.parse(line.slice(start + VARIABLES_MARKER.length));
+        } catch (error) {
+            continue;
+        }
+
+        const pending = pendingVariableRequests.get(reply.id);
+        if (!pending) {
+            continue;
+        }
+        pendingVariableRequests.delete(reply.id);
+        clearTimeout(pending.timer);
+        if (reply.error) {
+            pending.reject(new Error(reply.error));
+        } else {
+            pending.resolve(reply);
+        }
+    }
 }
 
 /**
@@ -121,13 +367,46 @@ function loadExceptionInfo(filePath) {
 }
 
 /**
- * Load exception history from file
+ * Read entries appended to the history log since the last call
  * @param {string} filePath 
  */
 function loadExceptionHistory(filePath) {
     try {
-        const data = fs.readFileSync(filePath, 'utf8');
-        exceptionHistory = JSON.parse(data);
+        const stat = fs.statSync(filePath);
+        if (stat.ino !== historyLogIno || stat.size < historyLogOffset) {
+            // New or compacted log: start at the newest entries the index points at
+            historyLogIno = stat.ino;
+            historyLogOffset = historyTailOffset(filePath, stat.size);
+        }
+        if (stat.size <= historyLogOffset) {
+            return;
+        }
+
+        const buffer = Buffer.alloc(stat.size - historyLogOffset);
+        const fd = fs.openSync(filePath, 'r');
+        try {
+            fs.readSync(fd, buffer, 0, buffer.length, historyLogOffset);
+        } finally {
+            fs.closeSync(fd);
+        }
+
+        // Only consume complete lines; a line still being written is picked up next time
+        const end = buffer.lastIndexOf(0x0a) + 1;
+        historyLogOffset += end;
+        for (const line of buffer.toString('utf8', 0, end).split('\n')) {
+            if (!line) {
+                continue;
+            }
+            // A bad line is skipped, not retried: the offset has already moved past it
+            let entry;
+            try {
+                entry = JSON.parse(line);
+            } catch (error) {
+                console.error('Skipping malformed exception history line:', error);
+                continue;
+            }
+            addToHistory(entry);
+        }
         
         // Refresh views
         exceptionTreeProvider.refresh();
@@ -136,19 +415,44 @@ function loadExceptionHistory(filePath) {
     }
 }
 
+/**
+ * Offset of the oldest history entry worth reading, from the log's index
+ * @param {string} filePath 
+ * @param {number} size size of the log
+ * @returns {number}
+ */
+function historyTailOffset(filePath, size) {
+    const config = vscode.workspace.getConfiguration('micropythonDebugger');
+    const maxSize = config.get('exceptionHistorySize') || MAX_HISTORY_SIZE;
+    try {
+        const index = fs.readFileSync(filePath.replace(/\.jsonl$/, '.idx'));
+        const count = Math.floor(index.length / HISTORY_INDEX_ENTRY_SIZE);
+        if (count === 0) {
+            return 0;
+        }
+        const offset = Number(index.readBigUInt64LE(Math.max(0, count - maxSize) * HISTORY_INDEX_ENTRY_SIZE));
+        return offset < size ? offset : 0;
+    } catch (error) {
+        // No usable index: read the whole log
+        return 0;
+    }
+}
+
 /**
  * Add exception to history
  * @param {object} exception 
  */
 function addToHistory(exception) {
     // Check if exception is already in history
-    const exists = exceptionHistory.some(e => 
+    const existing = exceptionHistory.find(e => 
         e.type === exception.type && 
-        e.value === exception.value &&
         e.timestamp === exception.timestamp
     );
     
-    if (!exists) {
+    if (existing) {
+        // Same record seen again, e.g. logged once more with its folded repeat count
+        Object.assign(existing, exception);
+    } else {
         // Add to history
         exceptionHistory.push(exception);
         
@@ -162,6 +466,19 @@ function addToHistory(exception) {
     }
 }
 
+/**
+ * Fold a repeat of an exception into the record it repeats
+ * @param {object} repeat type, timestamp, count and last_seen of the record
+ */
+function countRepeat(repeat) {
+    for (const exception of [currentException, ...exceptionHistory]) {
+        if (exception && exception.type === repeat.type && exception.timestamp === repeat.timestamp) {
+            exception.count = repeat.count;
+            exception.last_seen = repeat.last_seen;
+        }
+    }
+}
+
 /**
  * Visualize the current exception
  */
@@ -502,6 +819,16 @@ class ExceptionTreeDataProvider {
                 vscode.TreeItemCollapsibleState.None
             ));
             
+            // Repeats folded into this record
+            if (exception.count > 1) {
+                items.push(new ExceptionItem(
+                    'Occurrences',
+                    `${exception.count} (last at ${exception.last_seen})`,
+                    { type: 'property', name: 'Occurrences', value: exception.count },
+                    vscode.TreeItemCollapsibleState.None
+                ));
+            }
+            
             // Traceback
             if (exception.traceback && exception.traceback.length > 0) {
                 items.push(new ExceptionItem(
@@ -627,7 +954,13 @@ class VariablesTreeDataProvider {
     getChildren(element) {
         if (!element) {
             // Root level - show variables from current exception
-            if (!currentException || !currentException.locals) {
+            if (!currentException) {
+                return [];
+            }
+            if (currentException.variables && currentException.variables.ref) {
+                return this.getPage(currentException.variables.ref, 0);
+            }
+            if (!currentException.locals) {
                 return [];
             }
             
@@ -646,8 +979,42 @@ class VariablesTreeDataProvider {
             });
         }
         
+        // Expandable variable, or the "more" item continuing a page
+        if (element.variable && element.variable.ref) {
+            return this.getPage(element.variable.ref, element.variable.start || 0);
+        }
+        
         return [];
     }
+    
+    getPage(ref, start) {
+        return requestVariables(ref, start, VARIABLES_PAGE_SIZE).then(reply => {
+            const items = reply.variables.map(variable => new VariableItem(
+                variable.name,
+                variable.value,
+                variable,
+                variable.ref ? vscode.TreeItemCollapsibleState.Collapsed : vscode.TreeItemCollapsibleState.None,
+                {
+                    command: 'micropython-debugger.viewVariableDetails',
+                    title: 'View Variable Details',
+                    arguments: [{ name: variable.name, value: variable.value }]
+                }
+            ));
+            
+            const next = start + reply.variables.length;
+            if (next < reply.total) {
+                items.push(new VariableItem(
+                    '...',
+                    `${reply.total - next} more`,
+                    { ref: ref, start: next },
+                    vscode.TreeItemCollapsibleState.Collapsed
+                ));
+            }
+            return items;
+        }, error => [
+            new VariableItem('Variables unavailable', error.message, {}, vscode.TreeItemCollapsibleState.None)
+        ]);
+    }
 }
 
 /**
@@ -3,6 +3,12 @@ import os
 import sys
 import json
 import re
+import hashlib
+import queue
+import socket
+import struct
+import threading
+import time
 from datetime import datetime
 
 # Add the scripts directory to the Python path
@@ -11,7 +17,7 @@ sys.path.append(os.path.join(workspace_folder, "scripts"))
 
 # Import the MicroPython GDB helper
 try:
-    from micropython_gdb import MicroPythonHelper, Colors, is_color_enabled
+    from micropython_gdb import MicroPythonHelper, Colors, is_color_enabled, get_shared_helper
 except ImportError:
     print("Error: Could not import MicroPython GDB helper")
     print(f"Looking in: {os.path.join(workspace_folder, 'scripts')}")
@@ -34,106 +40,517 @@ except ImportError:
     class MicroPythonHelper:
         def get_exception_info(self):
             return {"type": "Unknown", "value": "Error loading MicroPython helper"}
+    
+    def get_shared_helper():
+        return MicroPythonHelper()
+
+class VariableReferences:
+    """Expandable variables handed to the VS Code extension
+
+    A reference names either the locals of the stopped frame (raw words
+    captured at the stop) or an object by address. The extension fetches
+    children a page at a time with vscode-vars, so nothing is read or
+    formatted until the user expands it. References are only valid while
+    the target stays stopped; ids are never reused.
+    """
+    
+    def __init__(self, mpy):
+        self.mpy = mpy
+        self.refs = {}
+        self.next_ref = 1
+        self.stop_id = None
+        
+    def _check_stop(self):
+        """Drop references handed out before the target last resumed"""
+        if self.stop_id != self.mpy.stop_id:
+            self.refs.clear()
+            self.stop_id = self.mpy.stop_id
+            
+    def add(self, kind, payload):
+        """Register a reference and return its id"""
+        self._check_stop()
+        ref = self.next_ref
+        self.next_ref += 1
+        self.refs[ref] = (kind, payload)
+        return ref
+        
+    def children(self, ref, start, count):
+        """Return (total, variables) for one page of a reference's children"""
+        self._check_stop()
+        if ref not in self.refs:
+            raise KeyError(f"unknown or stale variable reference {ref}")
+        kind, payload = self.refs[ref]
+        if kind == "locals":
+            total, page = len(payload), payload[start:start + count]
+        else:
+            total, page = self.mpy.object_children(payload, start, count)
+        return total, [self.describe(name, word) for name, word in page]
+        
+    def describe(self, name, word):
+        """One variable: a short value, plus a reference if it can be expanded"""
+        type_name = self.mpy.get_obj_type(word)
+        count = self.mpy.object_children(word, 0, 0)[0]
+        if count:
+            return {"name": name, "value": f"{type_name} ({count} items)", "type": type_name,
+                    "ref": self.add("object", word), "count": count}
+        return {"name": name, "value": self.mpy.format_mp_obj(word), "type": type_name, "ref": 0, "count": 0}
+
+def event_channel_path(workspace):
+    """Where the VS Code extension listens for events from this script"""
+    if os.name == "nt":
+        digest = hashlib.sha1(os.path.normcase(workspace).encode("utf-8")).hexdigest()[:16]
+        return rf"\\.\pipe\micropython-debugger-{digest}"
+    return os.path.join(workspace, ".vscode", "micropython-events.sock")
+
+class EventChannel:
+    """Newline-delimited JSON events sent to the VS Code extension
+
+    The extension owns the socket (a named pipe on Windows); this side
+    connects on demand and a writer thread does the sending, so a slow or
+    missing reader never holds up a stop. Events that do not fit in the
+    queue are dropped and counted.
+    """
+    
+    QUEUE_SIZE = 1024
+    RECONNECT_INTERVAL = 1.0
+    
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue(self.QUEUE_SIZE)
+        self.conn = None
+        self.last_attempt = 0.0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.writer = threading.Thread(target=self._write_loop, name="vscode-events", daemon=True)
+        self.writer.start()
+        
+    @property
+    def connected(self):
+        return self.conn is not None
+        
+    def _connect(self):
+        """Try to reach the extension, at most once per RECONNECT_INTERVAL"""
+        now = time.monotonic()
+        if now - self.last_attempt < self.RECONNECT_INTERVAL:
+            return False
+        self.last_attempt = now
+        try:
+            if os.name == "nt":
+                conn = open(self.path, "wb", buffering=0)
+            else:
+                conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    conn.connect(self.path)
+                except OSError:
+                    conn.close()
+                    raise
+        except OSError:
+            return False
+        with self.lock:
+            self.conn = conn
+        return True
+        
+    def _disconnect(self):
+        with self.lock:
+            conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+                
+    def send(self, event, **body):
+        """Queue one event; returns False if the extension is not listening"""
+        if not self.connected and not self._connect():
+            return False
+        line = json.dumps(dict(body, event=event), separators=(",", ":"), default=str) + "\n"
+        try:
+            self.queue.put_nowait(line.encode("utf-8"))
+        except queue.Full:
+            self.dropped += 1
+        return True
+        
+    def _write_loop(self):
+        while True:
+            data = self.queue.get()
+            conn = self.conn
+            if conn is None:
+                continue
+            try:
+                if isinstance(conn, socket.socket):
+                    conn.sendall(data)
+                else:
+                    while data:
+                        data = data[conn.write(data):]
+            except OSError:
+                self._disconnect()
+
+class ExceptionLog:
+    """Append-only JSONL exception history with an offset index
+
+    Each exception is one line of the log; the .idx file beside it holds
+    the byte offset of every line as a little-endian uint64, so the newest
+    entries can be read without parsing the rest. Once the log grows past
+    MAX_BYTES or COMPACT_FACTOR times the number of entries kept, it is
+    rewritten with only the newest ones.
+    """
+    
+    OFFSET = struct.Struct("<Q")
+    MAX_BYTES = 1 << 20
+    COMPACT_FACTOR = 4
+    
+    def __init__(self, path, keep):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".idx"
+        self.keep = keep
+        self.offsets = []
+        self.size = 0
+        
+    def load(self):
+        """Return the newest entries, rebuilding the index if it does not match the log"""
+        if not os.path.exists(self.path):
+            self.offsets, self.size = [], 0
+            self._replace(self.index_path, b"")
+            return []
+            
+        self.size = os.path.getsize(self.path)
+        self.offsets = self._read_index()
+        if self.offsets is None:
+            self.offsets = self._scan()
+            self._replace(self.index_path, b"".join(self.OFFSET.pack(o) for o in self.offsets))
+        if not self.offsets:
+            return []
+            
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[-self.keep:][0])
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    pass
+        return entries
+        
+    def _read_index(self):
+        """Offsets from the index, or None if it is missing or out of step with the log"""
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) % self.OFFSET.size:
+            return None
+        offsets = [o for o, in self.OFFSET.iter_unpack(data)]
+        if not offsets:
+            return offsets if self.size == 0 else None
+        if offsets[0] != 0 or offsets[-1] >= self.size:
+            return None
+            
+        # The last indexed line must be exactly the rest of the log
+        with open(self.path, "rb") as f:
+            f.seek(offsets[-1])
+            tail = f.read()
+        return offsets if tail.count(b"\n") == 1 and tail.endswith(b"\n") else None
+        
+    def _scan(self):
+        """Offsets of every complete line, dropping a torn last write"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            self._replace(self.path, data[:end])
+            self.size = end
+        offsets = []
+        pos = 0
+        while pos < end:
+            offsets.append(pos)
+            pos = data.index(b"\n", pos) + 1
+        return offsets
+        
+    @staticmethod
+    def _replace(path, data):
+        """Write a file atomically, so readers never see it half-written"""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        
+    def append(self, entry):
+        """Append one entry, compacting the log if it has grown too large"""
+        line = (json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(line)
+        with open(self.index_path, "ab") as f:
+            f.write(self.OFFSET.pack(self.size))
+        self.offsets.append(self.size)
+        self.size += len(line)
+        
+        if self.size > self.MAX_BYTES or len(self.offsets) > self.COMPACT_FACTOR * self.keep:
+            self.compact()
+            
+    def compact(self):
+        """Rewrite the log with only the newest entries"""
+        kept = self.offsets[-self.keep:]
+        with open(self.path, "rb") as f:
+            f.seek(kept[0])
+            data = f.read()
+        self._replace(self.path, data)
+        self.offsets = [o - kept[0] for o in kept]
+        self.size = len(data)
+        self._replace(self.index_path, b"".join(self.OFFSET.pack(o) for o in self.offsets))
+
+class ExceptionCoalescer:
+    """Folds repeats of one exception raised from one place into one record
+
+    The signature is the exception type plus the file, line and function
+    of the innermost Python frame. A raise matching the open record within
+    WINDOW seconds of its last occurrence only bumps the record's count
+    and last_seen; the record closes when something else is raised or the
+    window lapses.
+    """
+    
+    WINDOW = 2.0
+    
+    def __init__(self):
+        self.signature = None
+        self.record = None
+        self.last = 0.0
+        
+    def repeat(self, signature):
+        """Count a raise against the open record if it is a repeat"""
+        now = time.monotonic()
+        if self.record is None or signature != self.signature or now - self.last > self.WINDOW:
+            return False
+        self.record["count"] += 1
+        self.record["last_seen"] = datetime.now().isoformat()
+        self.last = now
+        return True
+        
+    def open(self, signature, record):
+        """Start folding repeats into record"""
+        self.signature = signature
+        self.record = record
+        self.last = time.monotonic()
+        
+    def close(self):
+        """Close the open record; returns it if any repeats were folded into it"""
+        record, self.record, self.signature = self.record, None, None
+        return record if record is not None and record["count"] > 1 else None
+
+class VSCodeJsonFilesParameter(gdb.Parameter):
+    """Whether exception info is also written to .vscode/*.json
+
+    auto writes the files only while the extension is not connected to the
+    event socket; on and off force them either way. The exception history
+    log is appended regardless.
+    """
+    
+    set_doc = "Set whether exception info is written to JSON files"
+    show_doc = "Show whether exception info is written to JSON files"
+    
+    def __init__(self):
+        super(VSCodeJsonFilesParameter, self).__init__("vscode-json-files", gdb.COMMAND_DATA, gdb.PARAM_AUTO_BOOLEAN)
+        self.value = None
+        
+    def get_show_string(self, svalue):
+        return f"Writing exception info to JSON files is {svalue}."
 
 class VSCodeExceptionHandler:
+    MAX_HISTORY = 10
+    
     def __init__(self):
-        self.mpy = MicroPythonHelper()
+        self.mpy = get_shared_helper()
         self.output_dir = os.path.join(workspace_folder, ".vscode")
         self.output_file = os.path.join(self.output_dir, "exception_info.json")
-        self.history_file = os.path.join(self.output_dir, "exception_history.json")
+        self.history_file = os.path.join(self.output_dir, "exception_history.jsonl")
+        self.history_log = ExceptionLog(self.history_file, self.MAX_HISTORY)
         self.exception_history = []
+        self.current_exception = None
+        self.variables = VariableReferences(self.mpy)
+        self.events = EventChannel(event_channel_path(workspace_folder))
+        self.json_files = VSCodeJsonFilesParameter()
+        self.coalescer = ExceptionCoalescer()
+        self.stop_reported = False  # a "stop" the extension has not yet seen a "resume" for
         self.load_history()
         self.register_commands()
         
     def load_history(self):
         """Load exception history from file"""
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, "r") as f:
-                    self.exception_history = json.load(f)
+            os.makedirs(self.output_dir, exist_ok=True)
+            # A folded record is logged again when it closes, under the same type and timestamp
+            merged = {}
+            for entry in self.history_log.load():
+                merged.setdefault((entry.get("type"), entry.get("timestamp")), {}).update(entry)
+            self.exception_history = list(merged.values())[-self.MAX_HISTORY:]
         except Exception as e:
             print(f"Error loading exception history: {e}")
             self.exception_history = []
             
-    def save_history(self):
-        """Save exception history to file"""
+    def save_history(self, entry):
+        """Append one exception to the history file"""
         try:
-            os.makedirs(self.output_dir, exist_ok=True)
-            with open(self.history_file, "w") as f:
-                json.dump(self.exception_history, f, indent=2)
+            self.history_log.append(entry)
         except Exception as e:
             print(f"Error saving exception history: {e}")
         
+    def write_json_files(self):
+        """JSON files are the fallback for when the extension is not listening"""
+        if self.json_files.value is None:
+            return not self.events.connected
+        return self.json_files.value
+        
     def register_commands(self):
         """Register GDB event handlers and commands"""
         # Register a breakpoint handler for exceptions
         gdb.events.stop.connect(self.on_stop)
+        gdb.events.cont.connect(self.on_resume)
+        gdb.events.exited.connect(self.on_exit)
         
         # Register custom commands
         VSCodeExceptInfoCommand(self)
         VSCodeExceptVisualizeCommand(self)
+        VSCodeVarsCommand(self)
         
     def on_stop(self, event):
         """Handle GDB stop events"""
+        self.stop_reported = self.events.send("stop", reason=type(event).__name__)
         try:
             # Check if we stopped due to an exception
             frame = gdb.selected_frame()
             if frame and "mp_raise" in frame.name():
-                # Get exception information
+                exc = self.mpy.current_exception()
+                if not exc:
+                    return
+                    
+                # A repeat of the open record costs a type read and a frame lookup
+                signature = self.exception_signature(exc)
+                if self.coalescer.repeat(signature):
+                    record = self.coalescer.record
+                    self.current_exception = None
+                    self.events.send("exception-repeat", type=record["type"], timestamp=record["timestamp"],
+                                     count=record["count"], last_seen=record["last_seen"])
+                    return
+                self.flush_repeats()
+                
+                # Get exception information (a lazy snapshot: fields are read on access)
                 exc_info = self.mpy.get_exception_info()
                 if exc_info:
                     # Add timestamp
                     exc_info["timestamp"] = datetime.now().isoformat()
+                    exc_info["count"] = 1
+                    exc_info["first_seen"] = exc_info["last_seen"] = exc_info["timestamp"]
+                    self.current_exception = exc_info
                     
                     # Format for VSCode
                     self.format_for_vscode(exc_info)
                     
                     # Add to history
-                    self.add_to_history(exc_info)
+                    self.coalescer.open(signature, self.add_to_history(exc_info))
         except Exception as e:
             print(f"Error in exception handler: {e}")
+            
+    def exception_signature(self, exc):
+        """Exception type and raising location, used to recognise repeats"""
+        try:
+            frames = self.mpy.python_frames(limit=1)
+            location = self.mpy.frame_location(frames[0]) if frames else {}
+        except Exception:
+            location = {}
+        return (self.mpy.get_obj_type(exc), location.get("file"), location.get("line"), location.get("function"))
+        
+    def flush_repeats(self):
+        """Log the open record again if repeats were folded into it"""
+        record = self.coalescer.close()
+        if record is None:
+            return
+        self.save_history(record)
+        print(f"  {record['type']} repeated {record['count']} times "
+              f"({record['first_seen']} to {record['last_seen']})")
+            
+    def on_exit(self, event):
+        """Don't lose the count of a record still open when the target exits"""
+        self.flush_repeats()
+        
+    def on_resume(self, event):
+        """Tell the extension its variable references are no longer valid
+
+        Only after a stop it was told about: breakpoint conditions and
+        catchpoints that decline to stop also resume the target.
+        """
+        if not self.stop_reported:
+            return
+        self.stop_reported = False
+        self.events.send("resume")
                     
     def format_for_vscode(self, exc_info):
-        """Format exception information for VSCode"""
+        """Format exception information for VSCode
+
+        Locals are only included once something has already read them:
+        formatting every local on each raise is the expensive part of a stop.
+        """
         vscode_info = {
             "type": exc_info.get("type", "Unknown"),
             "value": exc_info.get("value", ""),
             "traceback": exc_info.get("traceback", []),
             "attributes": exc_info.get("attributes", {}),
-            "locals": exc_info.get("locals", {}),
-            "timestamp": exc_info.get("timestamp", datetime.now().isoformat())
+            "locals": exc_info.get("locals", {}) if self.locals_loaded(exc_info) else {},
+            "variables": self.export_variables(),
+            "timestamp": exc_info.get("timestamp", datetime.now().isoformat()),
+            "count": exc_info.get("count", 1),
+            "first_seen": exc_info.get("first_seen"),
+            "last_seen": exc_info.get("last_seen")
         }
         
-        # Write to file for VSCode extension to read
+        # Stream to the extension, falling back to a file it watches
+        sent = self.events.send("exception", exception=vscode_info)
         try:
-            os.makedirs(self.output_dir, exist_ok=True)
-            with open(self.output_file, "w") as f:
-                json.dump(vscode_info, f, indent=2)
+            if self.write_json_files():
+                os.makedirs(self.output_dir, exist_ok=True)
+                with open(self.output_file, "w") as f:
+                    json.dump(vscode_info, f, indent=2)
             
             # Print notification
             c = Colors if is_color_enabled() else type('obj', (object,), {'BOLD': '', 'RED': '', 'RESET': ''})
             print(f"\n{c.BOLD}Exception detected:{c.RESET}")
             print(f"  Type: {c.RED}{vscode_info['type']}{c.RESET}")
             print(f"  Value: {vscode_info['value']}")
-            print(f"  Details saved to: {self.output_file}")
+            print(f"  Details {'sent to VSCode' if sent else 'saved to: ' + self.output_file}")
             print(f"  Use {c.BOLD}vscode-except-info{c.RESET} or {c.BOLD}vscode-except-visualize{c.RESET} to view details")
         except Exception as e:
             print(f"Error saving exception info: {e}")
             
+    def export_variables(self):
+        """Reference to the raising frame's locals, expanded by the extension on demand"""
+        try:
+            local_words = self.mpy.current_local_words()
+        except Exception:
+            return {"ref": 0, "count": 0}
+        return {"ref": self.variables.add("locals", local_words), "count": len(local_words)}
+        
+    @staticmethod
+    def locals_loaded(exc_info):
+        """Whether the locals of an exception are at hand without reading the target"""
+        loaded = getattr(exc_info, "loaded", None)
+        return loaded("locals") if loaded else "locals" in exc_info
+
     def add_to_history(self, exc_info):
         """Add exception to history"""
-        # Limit history size
-        MAX_HISTORY = 10
-        
-        # Add to history
+        # Add to history (a plain copy: the snapshot goes stale once the target resumes)
+        if hasattr(exc_info, "to_dict"):
+            keys = ["type", "value", "traceback", "attributes", "timestamp", "address", "count", "first_seen", "last_seen"]
+            if self.locals_loaded(exc_info):
+                keys.append("locals")
+            exc_info = exc_info.to_dict(keys)
         self.exception_history.append(exc_info)
         
         # Trim history if needed
-        if len(self.exception_history) > MAX_HISTORY:
-            self.exception_history = self.exception_history[-MAX_HISTORY:]
+        if len(self.exception_history) > self.MAX_HISTORY:
+            self.exception_history = self.exception_history[-self.MAX_HISTORY:]
             
-        # Save history
-        self.save_history()
+        # Appending is cheap, so the history file is kept even while streaming
+        self.save_history(exc_info)
+        return exc_info
         
     def get_exception_history(self):
         """Get exception history"""
@@ -148,6 +565,9 @@ class VSCodeExceptionHandler:
         # Get exception info
         if index < 0 or index >= len(self.exception_history):
             exc_info = self.exception_history[-1]
+            # Still stopped at the raise: the live snapshot can read the locals now
+            if self.current_exception is not None and self.current_exception.get("address") == exc_info.get("address"):
+                exc_info = self.current_exception
         else:
             exc_info = self.exception_history[index]
             
@@ -174,6 +594,8 @@ class VSCodeExceptionHandler:
             except:
                 pass
             print(f"{c.BOLD}Time:{c.RESET} {timestamp}")
+        if exc_info.get('count', 1) > 1:
+            print(f"{c.BOLD}Occurrences:{c.RESET} {exc_info['count']} (last at {exc_info.get('last_seen', '')})")
         
         # Traceback
         print(f"\n{c.BOLD}{c.BLUE}Traceback:{c.RESET}")
@@ -281,9 +703,38 @@ class VSCodeExceptVisualizeCommand(gdb.Command):
         # Visualize exception
         self.handler.visualize_exception(index)
 
-# Initialize the VSCode exception handler
-try:
-    vscode_handler = VSCodeExceptionHandler()
-    print("VSCode MicroPython Exception Handler initialized")
-except Exception as e:
-    print(f"Error initializing VSCode exception handler: {e}") 
\ No newline at end of file
+class VSCodeVarsCommand(gdb.Command):
+    """Answer a VS Code request for one page of a variable reference's children"""
+    
+    MARKER = "MPYVARS "
+    
+    def __init__(self, handler):
+        super(VSCodeVarsCommand, self).__init__("vscode-vars", gdb.COMMAND_USER)
+        self.handler = handler
+        
+    def invoke(self, arg, from_tty):
+        """Handle command invocation: vscode-vars <ref> [start] [count] [request-id]"""
+        args = arg.split()
+        if not args or not all(a.isdigit() for a in args):
+            print("Usage: vscode-vars <ref> [start] [count] [request-id]")
+            return
+            
+        ref = int(args[0])
+        start = int(args[1]) if len(args) > 1 else 0
+        count = int(args[2]) if len(args) > 2 else 50
+        reply = {"id": int(args[3]) if len(args) > 3 else 0, "ref": ref, "start": start}
+        try:
+            reply["total"], reply["variables"] = self.handler.variables.children(ref, start, count)
+        except Exception as e:
+            reply["error"] = str(e)
+            
+        # One line, found by the extension in the debug adapter's output
+        print(self.MARKER + json.dumps(reply, separators=(",", ":")))
+
+# Initialize the VSCode exception handler when sourced into GDB
+if __name__ == '__main__':
+    try:
+        vscode_handler = VSCodeExceptionHandler()
+        print("VSCode MicroPython Exception Handler initialized")
+    except Exception as e:
+        print(f"Error initializing VSCode exception handler: {e}") 
\ No newline at end of file
@@ -66,4 +66,13 @@ fi
 cp "build-$BOARD/firmware.dfu" "$BUILD_DIR/" 2>/dev/null || true
 cp "build-$BOARD/firmware.elf" "$BUILD_DIR/" 2>/dev/null || true
 
+# Emit the static qstr index used by the GDB helper (scripts/micropython_gdb.py)
+if [ -f "build-$BOARD/genhdr/qstrdefs.generated.h" ] && [ -f "$BUILD_DIR/firmware.elf" ]; then
+    echo "Generating static qstr index..."
+    python3 "$PROJECT_DIR/scripts/gen_qstr_index.py" \
+        "build-$BOARD/genhdr/qstrdefs.generated.h" \
+        "$BUILD_DIR/firmware.elf" \
+        -o "$BUILD_DIR/qstr_index.json" || echo "Warning: Failed to generate qstr index"
+fi
+
 echo "Firmware successfully built at $BUILD_DIR/"
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Static QSTR index generator
+
+Reads the qstrdefs.generated.h header produced by a MicroPython build and
+writes a JSON index of the compile-time qstrs, keyed by the build-id of the
+matching firmware.elf. The GDB helper (micropython_gdb.py) loads this index
+to resolve static qstrs without reading target memory.
+
+Usage:
+  gen_qstr_index.py <qstrdefs.generated.h> <firmware.elf> [-o qstr_index.json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+from typing import List, Optional
+
+INDEX_FORMAT = 1
+
+# QDEF0/QDEF1(MP_QSTR_x, hash, len, "str") since v1.20, QDEF(MP_QSTR_x, (const byte*)"hdr" "str") before
+QDEF_RE = re.compile(r'^QDEF[01]?\((MP_QSTR\w*),\s*(.*)\)\s*$')
+C_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+C_ESCAPE_RE = re.compile(r'\\(x[0-9a-fA-F]+|[0-7]{1,3}|.)')
+
+NT_GNU_BUILD_ID = 3
+SHT_NOTE = 7
+
+def unescape_c_string(literal: str) -> bytes:
+    """Decode the body of a C string literal into bytes"""
+    simple = {"n": b"\n", "t": b"\t", "r": b"\r", "0": b"\0", "\\": b"\\", '"': b'"', "'": b"'", "?": b"?",
+              "a": b"\a", "b": b"\b", "f": b"\f", "v": b"\v"}
+
+    def replace(m):
+        esc = m.group(1)
+        if esc[0] == "x":
+            return bytes([int(esc[1:], 16) & 0xFF])
+        if esc[0] in "01234567":
+            return bytes([int(esc, 8) & 0xFF])
+        return simple.get(esc, esc.encode())
+
+    out = b""
+    pos = 0
+    for m in C_ESCAPE_RE.finditer(literal):
+        out += literal[pos:m.start()].encode("utf-8") + replace(m)
+        pos = m.end()
+    return out + literal[pos:].encode("utf-8")
+
+def parse_qstrdefs(lines) -> List[str]:
+    """Return the static qstrs in pool order (the index is the qstr id)
+
+    Since v1.20 the QDEF0 qstrs fill mp_qstr_const_pool_static and take the
+    first ids, and the QDEF1 ones follow in mp_qstr_const_pool, each in
+    header order (py/qstr.h numbers them in two passes over the header).
+    """
+    static, main = [], []
+    for line in lines:
+        m = QDEF_RE.match(line.strip())
+        if not m:
+            continue
+        literals = C_STRING_RE.findall(m.group(2))
+        if line.lstrip().startswith("QDEF("):
+            # Legacy layout: first literal holds the hash and length bytes
+            literals = literals[1:]
+        qstr = b"".join(unescape_c_string(s) for s in literals).decode("utf-8", "replace")
+        (main if line.lstrip().startswith("QDEF1(") else static).append(qstr)
+    return static + main
+
+def read_build_id(elf_path: str) -> Optional[str]:
+    """Return the GNU build-id of an ELF file as hex, or None if it has none"""
+    with open(elf_path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"\x7fELF":
+        return None
+    is64 = data[4] == 2
+    endian = "<" if data[5] == 1 else ">"
+    if is64:
+        shoff, = struct.unpack_from(endian + "Q", data, 0x28)
+        shentsize, shnum = struct.unpack_from(endian + "HH", data, 0x3A)
+    else:
+        shoff, = struct.unpack_from(endian + "I", data, 0x20)
+        shentsize, shnum = struct.unpack_from(endian + "HH", data, 0x2E)
+    for i in range(shnum):
+        base = shoff + i * shentsize
+        if is64:
+            sh_type, = struct.unpack_from(endian + "I", data, base + 4)
+            offset, size = struct.unpack_from(endian + "QQ", data, base + 0x18)
+        else:
+            sh_type, = struct.unpack_from(endian + "I", data, base + 4)
+            offset, size = struct.unpack_from(endian + "II", data, base + 0x10)
+        if sh_type != SHT_NOTE:
+            continue
+        pos = offset
+        while pos + 12 <= offset + size:
+            namesz, descsz, n_type = struct.unpack_from(endian + "III", data, pos)
+            name_start = pos + 12
+            desc_start = name_start + ((namesz + 3) & ~3)
+            if n_type == NT_GNU_BUILD_ID and data[name_start:name_start + namesz].rstrip(b"\0") == b"GNU":
+                return data[desc_start:desc_start + descsz].hex()
+            pos = desc_start + ((descsz + 3) & ~3)
+    return None
+
+def file_sha1(path: str) -> str:
+    """SHA-1 of a file, used to key the index when the ELF has no build-id"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def build_index(qstrdefs_path: str, elf_path: str) -> dict:
+    with open(qstrdefs_path, "r", encoding="utf-8", errors="replace") as f:
+        qstrs = parse_qstrdefs(f)
+    return {
+        "format": INDEX_FORMAT,
+        "build_id": read_build_id(elf_path),
+        "elf_sha1": file_sha1(elf_path),
+        "qstrs": qstrs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a static qstr index for the GDB helper")
+    parser.add_argument("qstrdefs", help="path to genhdr/qstrdefs.generated.h")
+    parser.add_argument("elf", help="path to firmware.elf")
+    parser.add_argument("-o", "--output", help="output file (default: qstr_index.json next to the ELF)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.elf)), "qstr_index.json")
+    index = build_index(args.qstrdefs, args.elf)
+    with open(output, "w") as f:
+        json.dump(index, f)
+    print(f"Wrote {len(index['qstrs'])} static qstrs to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
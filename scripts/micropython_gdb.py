@@ -7,9 +7,18 @@ allowing inspection of Python-level state from GDB.
 """
 
 import gdb
+import gdb.printing
 import re
 import sys
 import os
+import json
+import bisect
+import hashlib
+import itertools
+import struct
+import threading
+from collections import Counter, deque
+from datetime import datetime
 from typing import Optional, Dict, List, Any
 
 # ANSI color codes for terminal output
@@ -55,15 +64,533 @@ def is_color_enabled():
         # If we can't determine, default to enabled
         return True
 
+class TargetMemoryCache:
+    """Page-granular cache of target memory shared by all decoders
+
+    Target memory cannot change while the inferior is stopped, so pages are
+    filled lazily on first use and kept until the target resumes (or memory
+    is written from GDB). Runs of missing pages are fetched with a single
+    read request. Hit/miss counters are reported by mpy-cache-stats.
+    """
+
+    PAGE_SIZE = 512
+
+    def __init__(self):
+        self.pages: Dict[int, bytes] = {}
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+        self.flushes = 0
+
+    def flush(self) -> None:
+        """Drop all cached pages"""
+        if self.pages:
+            self.flushes += 1
+        self.pages.clear()
+
+    def reset_stats(self) -> None:
+        self.hits = self.misses = self.requests = self.bytes_fetched = self.flushes = 0
+
+    def _fetch(self, first: int, last: int) -> None:
+        """Fetch pages first..last (inclusive) in one request"""
+        inferior = gdb.selected_inferior()
+        size = (last - first + 1) * self.PAGE_SIZE
+        try:
+            self.requests += 1
+            raw = inferior.read_memory(first * self.PAGE_SIZE, size).tobytes()
+            self.bytes_fetched += size
+        except gdb.MemoryError:
+            # Run crosses unmapped memory: keep whichever pages are readable
+            for page in range(first, last + 1):
+                try:
+                    self.requests += 1
+                    self.pages[page] = inferior.read_memory(page * self.PAGE_SIZE, self.PAGE_SIZE).tobytes()
+                    self.bytes_fetched += self.PAGE_SIZE
+                except gdb.MemoryError:
+                    pass
+            return
+        for i, page in enumerate(range(first, last + 1)):
+            self.pages[page] = raw[i * self.PAGE_SIZE:(i + 1) * self.PAGE_SIZE]
+
+    def read(self, addr: int, size: int) -> bytes:
+        """Read size bytes at addr, fetching only pages not seen since the last resume"""
+        if size <= 0:
+            return b""
+        first = addr // self.PAGE_SIZE
+        last = (addr + size - 1) // self.PAGE_SIZE
+        run_start = None
+        for page in range(first, last + 2):
+            if page <= last and page not in self.pages:
+                self.misses += 1
+                if run_start is None:
+                    run_start = page
+            else:
+                if page <= last:
+                    self.hits += 1
+                if run_start is not None:
+                    self._fetch(run_start, page - 1)
+                    run_start = None
+        try:
+            data = b"".join(self.pages[page] for page in range(first, last + 1))
+        except KeyError:
+            # Part of the range is unreadable; let GDB report the exact error
+            return gdb.selected_inferior().read_memory(addr, size).tobytes()
+        offset = addr - first * self.PAGE_SIZE
+        return data[offset:offset + size]
+
+class QstrCache:
+    """Session cache mapping qstr ids to strings
+
+    The qstr pools form a chain from MP_STATE_VM(last_pool) back to the
+    compile-time pool. A pool never changes once it is full, so the pointer
+    table of each pool is bulk-read once and every resolved string is kept
+    for the rest of the session. Only the newest pool can grow; the chain is
+    re-checked at most once per stop and only new entries are fetched.
+
+    When the build left a qstr_index.json next to the ELF (see
+    gen_qstr_index.py) and it matches the ELF's build-id, static qstrs are
+    resolved from it without touching the target at all.
+    """
+
+    INDEX_FILE = "qstr_index.json"
+
+    # Strings of a pool are fetched in one read when they lie this close together
+    MAX_SPAN_READ = 64 * 1024
+
+    # Header layout of pre-1.20 pools, where each entry points at hash+len+data
+    LEGACY_HASH_BYTES = 2
+    LEGACY_LEN_BYTES = 1
+
+    def __init__(self, mem: TargetMemoryCache):
+        self.mem = mem
+        self.strings: Dict[int, str] = {}
+        self.pools: Dict[int, Dict[str, Any]] = {}  # pool address -> pool record
+        self.chain: List[Dict[str, Any]] = []  # pool records, newest first
+        self.static_pools = None  # addresses of the ROM pools
+        self.stale = True
+        self.reads = 0
+        self.index_checked = False
+        self.index_path = None
+
+    def invalidate(self) -> None:
+        """Mark the dynamic part of the chain for re-checking (target resumed)"""
+        self.stale = True
+
+    def reset(self) -> None:
+        """Forget everything (new symbol file loaded)"""
+        self.strings.clear()
+        self.pools.clear()
+        self.chain = []
+        self.static_pools = None
+        self.stale = True
+        self.index_checked = False
+        self.index_path = None
+
+    def load_static_index(self) -> bool:
+        """Seed static qstrs from the build's index if it matches the loaded ELF"""
+        self.index_checked = True
+        elf = gdb.current_progspace().filename
+        if not elf:
+            return False
+        path = os.path.join(os.path.dirname(elf), self.INDEX_FILE)
+        try:
+            with open(path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        build_id = next((o.build_id for o in gdb.objfiles() if o.filename == elf), None)
+        if build_id:
+            matches = index.get("build_id") == build_id
+        else:
+            h = hashlib.sha1()
+            with open(elf, "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    h.update(chunk)
+            matches = index.get("elf_sha1") == h.hexdigest()
+        if not matches:
+            print(f"Ignoring stale qstr index {path} (does not match {elf})")
+            return False
+
+        for q, s in enumerate(index.get("qstrs", [])):
+            self.strings[q] = s
+        self.index_path = path
+        return True
+
+    def _read(self, addr: int, size: int) -> bytes:
+        self.reads += 1
+        return self.mem.read(addr, size)
+
+    def _find_static_pools(self) -> set:
+        pools = set()
+        # Since v1.22 the compile-time qstrs are split over two ROM pools
+        for name in ("mp_qstr_const_pool_static", "mp_qstr_const_pool", "mp_qstr_frozen_const_pool"):
+            try:
+                pools.add(int(gdb.parse_and_eval(f"&{name}")))
+            except gdb.error:
+                pass
+        return pools
+
+    def _read_pool(self, addr: int) -> Dict[str, Any]:
+        """Read a pool header (one struct-sized read)"""
+        pool_type = gdb.lookup_type("qstr_pool_t")
+        pool = gdb.Value(self._read(addr, pool_type.sizeof), pool_type)
+        record = {
+            "addr": addr,
+            "prev": int(pool["prev"]),
+            "total_prev_len": int(pool["total_prev_len"]),
+            "len": int(pool["len"]),
+            "static": addr in self.static_pools,
+            "ptrs": [],
+            "lengths": None,
+            "lengths_addr": None,
+        }
+        if any(f.name == "lengths" for f in pool_type.strip_typedefs().fields()):
+            record["lengths_addr"] = int(pool["lengths"])
+            record["len_size"] = pool["lengths"].type.target().sizeof
+        return record
+
+    def _read_tables(self, record: Dict[str, Any], start: int) -> None:
+        """Bulk-read pointer (and length) table entries from index start onwards"""
+        n = record["len"] - start
+        if n <= 0:
+            return
+        pool_type = gdb.lookup_type("qstr_pool_t").strip_typedefs()
+        ptr_size = gdb.lookup_type("char").pointer().sizeof
+        qstrs_offset = next(f.bitpos for f in pool_type.fields() if f.name == "qstrs") // 8
+        raw = self._read(record["addr"] + qstrs_offset + start * ptr_size, n * ptr_size)
+        record["ptrs"] = record["ptrs"][:start] + list(struct.unpack("<" + ("I" if ptr_size == 4 else "Q") * n, raw))
+        if record["lengths_addr"] is not None:
+            len_size = record["len_size"]
+            raw = self._read(record["lengths_addr"] + start * len_size, n * len_size)
+            lengths = list(struct.unpack("<" + ("B" if len_size == 1 else "H") * n, raw))
+            record["lengths"] = (record["lengths"] or [])[:start] + lengths
+
+    def _sync(self) -> None:
+        """Bring the pool chain up to date with the target"""
+        if self.static_pools is None:
+            self.static_pools = self._find_static_pools()
+        old_chain = self.chain
+        chain = []
+        addr = int(gdb.parse_and_eval("mp_state_ctx.vm.last_pool"))
+        while addr:
+            known = self.pools.get(addr)
+            if known is not None and known["static"]:
+                # Static pools never change, and neither does anything below them
+                while known is not None:
+                    chain.append(known)
+                    known = self.pools.get(known["prev"])
+                break
+            record = self._read_pool(addr)
+            if (known is not None and known["prev"] == record["prev"]
+                    and known["total_prev_len"] == record["total_prev_len"]
+                    and known["len"] <= record["len"]):
+                # Same pool, possibly grown: fetch only the new entries
+                start = known["len"]
+                record["ptrs"], record["lengths"] = known["ptrs"], known["lengths"]
+            else:
+                start = 0
+            self._read_tables(record, start)
+            chain.append(record)
+            if known is not None and start == record["len"] and chain[0] is record:
+                # Newest pool unchanged: the whole chain is as we left it
+                chain = old_chain
+                break
+            addr = record["prev"]
+
+        # Forget ids of dynamic pools that went away (e.g. soft reset)
+        current = {(r["addr"], r["total_prev_len"]) for r in chain}
+        for r in old_chain:
+            if not r["static"] and (r["addr"], r["total_prev_len"]) not in current:
+                for q in range(r["total_prev_len"], r["total_prev_len"] + r["len"]):
+                    self.strings.pop(q, None)
+        self.pools = {r["addr"]: r for r in chain}
+        self.chain = chain
+        self.stale = False
+
+    def _prefetch_strings(self, record: Dict[str, Any]) -> None:
+        """Fetch all strings of a static pool with a single read when compact"""
+        ptrs = record["ptrs"]
+        lengths = record["lengths"]
+        if not ptrs or lengths is None:
+            return
+        start = min(ptrs)
+        end = max(p + n for p, n in zip(ptrs, lengths))
+        if end - start > self.MAX_SPAN_READ:
+            return
+        blob = self._read(start, end - start)
+        base = record["total_prev_len"]
+        for i, (p, n) in enumerate(zip(ptrs, lengths)):
+            self.strings.setdefault(base + i, blob[p - start:p - start + n].decode("utf-8", "replace"))
+        record["prefetched"] = True
+
+    def _read_entry(self, record: Dict[str, Any], index: int) -> str:
+        ptr = record["ptrs"][index]
+        if record["lengths"] is not None:
+            length = record["lengths"][index]
+            return self._read(ptr, length).decode("utf-8", "replace") if length else ""
+        # Legacy layout: the length is stored in front of the data
+        header = self._read(ptr, self.LEGACY_HASH_BYTES + self.LEGACY_LEN_BYTES)
+        length = int.from_bytes(header[self.LEGACY_HASH_BYTES:], "little")
+        offset = self.LEGACY_HASH_BYTES + self.LEGACY_LEN_BYTES
+        return self._read(ptr + offset, length).decode("utf-8", "replace") if length else ""
+
+    def lookup(self, q: int) -> Optional[str]:
+        """Resolve a qstr id, reading the target only for unseen ids"""
+        if not self.index_checked:
+            self.load_static_index()
+        s = self.strings.get(q)
+        if s is not None:
+            return s
+        if self.stale or not self.chain:
+            self._sync()
+        for record in self.chain:
+            if q >= record["total_prev_len"]:
+                index = q - record["total_prev_len"]
+                if index >= record["len"]:
+                    return None
+                if record["static"] and not record.get("prefetched"):
+                    self._prefetch_strings(record)
+                    s = self.strings.get(q)
+                    if s is not None:
+                        return s
+                s = self._read_entry(record, index)
+                self.strings[q] = s
+                return s
+        return None
+
+class ObjectRepr:
+    """Decoder for tagged mp_obj_t words (MICROPY_OBJ_REPR_A..D)
+
+    Small ints, qstrs, immediate objects (None/False/True) and, with REPR_C
+    and REPR_D, floats are encoded in the word itself. They are decoded here
+    without touching target memory; anything else is a heap pointer.
+    decode() returns (tag, value) with tag one of "int", "qstr", "const",
+    "float" or "ptr".
+    """
+
+    # MICROPY_OBJ_REPR values from py/mpconfig.h
+    KINDS = ("A", "B", "C", "D")
+    IMMEDIATE_NAMES = {0: "None", 1: "False", 3: "True"}
+
+    def __init__(self, kind: str = "A", word_bits: int = 32):
+        self.kind = kind
+        self.word_bits = word_bits
+        self.decode = getattr(self, f"_decode_{kind.lower()}")
+
+    @staticmethod
+    def detect() -> str:
+        """Find the object representation the firmware was built with"""
+        try:
+            value = int(gdb.parse_and_eval("MICROPY_OBJ_REPR"))  # needs -g3 macro info
+            if 0 <= value < len(ObjectRepr.KINDS):
+                return ObjectRepr.KINDS[value]
+        except gdb.error:
+            pass
+        # REPR_D is the only one with a 64-bit mp_obj_t on a 32-bit target
+        if gdb.lookup_type("mp_obj_t").sizeof == 8 and gdb.lookup_type("void").pointer().sizeof == 4:
+            return "D"
+        return "A"
+
+    def _signed(self, value: int, bits: int) -> int:
+        value &= (1 << bits) - 1
+        return value - (1 << bits) if value >> (bits - 1) else value
+
+    def _decode_a(self, w: int) -> tuple:
+        if w & 1:
+            return ("int", self._signed(w, self.word_bits) >> 1)
+        if w & 7 == 2:
+            return ("qstr", w >> 3)
+        if w & 7 == 6:
+            return ("const", w >> 3)
+        return ("ptr", w)
+
+    def _decode_b(self, w: int) -> tuple:
+        if w & 3 == 1:
+            return ("int", self._signed(w, self.word_bits) >> 2)
+        if w & 7 == 3:
+            return ("qstr", w >> 3)
+        if w & 7 == 7:
+            return ("const", w >> 3)
+        return ("ptr", w)
+
+    def _decode_c(self, w: int) -> tuple:
+        if w & 1:
+            return ("int", self._signed(w, 32) >> 1)
+        if w & 0xff80000f == 0x00000006:
+            return ("qstr", w >> 4)
+        if w & 0xff80000f == 0x0000000e:
+            return ("const", w >> 4)
+        if w & 3 == 2:
+            bits = ((w - 0x80800000) & ~3) & 0xffffffff
+            return ("float", struct.unpack("<f", struct.pack("<I", bits))[0])
+        return ("ptr", w)
+
+    def _decode_d(self, w: int) -> tuple:
+        top = w & 0xffff000000000000
+        if top == 0:
+            return ("ptr", w)
+        if top == 0x0001000000000000:
+            return ("int", self._signed(w << 16, 64) >> 17)
+        if top == 0x0002000000000000:
+            return ("qstr", (w & 0xffffffff) >> 1)
+        if top == 0x0003000000000000:
+            return ("const", (w >> 46) & 3)
+        bits = (w - 0x8004000000000000) & 0xffffffffffffffff
+        return ("float", struct.unpack("<d", struct.pack("<Q", bits))[0])
+
+class ExceptionHistory:
+    """Bounded history of exceptions, oldest first
+
+    A ring buffer of compact entries with a hash index on a dedup key, so
+    recording, deduplicating and evicting an exception are O(1) whatever
+    the capacity. An entry holds the exception's address and type pointer
+    plus a few small fields; the message and raw local words are added
+    once read, and MicroPythonHelper.expand_history_entry formats the rest
+    when the entry is viewed.
+    """
+
+    def __init__(self, capacity: Optional[int] = 1000):
+        self.capacity = capacity
+        self.entries: deque = deque()
+        self.index: Dict[tuple, Dict[str, Any]] = {}
+
+    @staticmethod
+    def key(entry: Dict[str, Any]) -> tuple:
+        """Same object of the same type"""
+        return (entry.get("address"), entry.get("type_addr"))
+
+    def add(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Record an entry and return the one kept
+
+        Recording the same exception again at the same stop (it is looked
+        at by several commands) changes nothing. A repeat at a later stop
+        bumps the count of the recorded entry, which then describes the
+        latest raise: its message and locals are read again.
+        """
+        key = self.key(entry)
+        seen = self.index.get(key)
+        if seen is not None:
+            if seen.get("stop_id") == entry.get("stop_id"):
+                return seen
+            count = seen["count"] + 1
+            seen.clear()
+            seen.update(entry, count=count)
+            return seen
+        entry["count"] = 1
+        self.entries.append(entry)
+        self.index[key] = entry
+        self.trim()
+        return entry
+
+    def trim(self) -> None:
+        while self.capacity is not None and len(self.entries) > self.capacity:
+            old = self.entries.popleft()
+            del self.index[self.key(old)]
+
+    def set_capacity(self, capacity: Optional[int]) -> None:
+        self.capacity = capacity
+        self.trim()
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.index.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self.entries[index]
+
 class MicroPythonHelper:
     def __init__(self):
         self.mp_state_ctx = None
         self.mp_state_vm = None
         self.current_frame = None
         self.exception_breakpoints = {}
+        self.exception_tracepoint: Optional["ExceptionTracepoint"] = None  # see mpy-except-trace
+        self.last_exception = None
+        self.exception_history = ExceptionHistory()  # Track exception history
+        self.mem = TargetMemoryCache()
+        self.qstrs = QstrCache(self.mem)
+        # Rendering limits (None = unlimited), see MPLimitParameter
+        self.max_depth = 3
+        self.max_items = 32
+        self.max_string = 256
+        # Per-stop rendering memo keyed by (address, remaining depth)
+        self.format_memo: Dict[tuple, str] = {}
+        self.rendering: Dict[int, int] = {}  # addresses on the current path -> path depth
+        self.lowest_backref = 0
+        # Type dispatch: builtin type addresses (per ELF) and user classes (per stop)
+        self.type_table: Optional[Dict[int, tuple]] = None
+        self.instance_make_new = 0  # mp_obj_instance_make_new, looked up with the type table
+        self.heap_type_info: Dict[int, tuple] = {}
+        # Tagged-word decoder, detected from the ELF on first use ("auto")
+        self.obj_repr_setting = "auto"
+        self.obj_repr: Optional[ObjectRepr] = None
+        self.heap_snapshots: Dict[str, Dict[str, Any]] = {}
+        # Incremented on every resume; snapshots taken at an older stop are stale
+        self.stop_id = 0
+        # Python frame chain of the last full walk, kept across stops, see python_frames
+        self.last_frames: List[Dict[str, int]] = []
+        self.frames_reused = 0
+        # Decoded bytecode preludes keyed by bytecode address, see code_info
+        self.code_infos: Dict[int, Dict[str, Any]] = {}
+        # Python function index for mp_break, see function_index
+        self.func_index: Optional[Dict[str, List[tuple]]] = None
+        self.func_index_key: Optional[tuple] = None
+        gdb.events.cont.connect(self.on_resume)
+        gdb.events.memory_changed.connect(self.on_memory_changed)
+        gdb.events.inferior_call.connect(self.on_memory_changed)
+        gdb.events.new_objfile.connect(self.on_new_objfile)
+
+    def on_resume(self, event) -> None:
+        """Target is running again: cached target state may change"""
+        self.mem.flush()
+        self.qstrs.invalidate()
+        self.clear_format_memo()
+        self.heap_type_info.clear()
+        self.stop_id += 1
+
+    def reset(self) -> None:
+        """Back to the state of a freshly loaded helper
+
+        Deletes the internal mp_raise breakpoints of mpy-catch and
+        mpy-except-trace, forgets exception history and heap snapshots and
+        drops every cache, as if the ELF had just been loaded.
+        """
+        for bp in list(self.exception_breakpoints.values()) + [self.exception_tracepoint]:
+            if bp is not None and bp.is_valid():
+                bp.delete()
+        self.exception_breakpoints.clear()
+        self.exception_tracepoint = None
+        self.exception_history.clear()
         self.last_exception = None
-        self.exception_history = []  # Track exception history
-        self.max_history = 10  # Maximum number of exceptions to track
+        self.heap_snapshots.clear()
+        self.on_new_objfile(None)
+        self.stop_id += 1
+
+    def on_memory_changed(self, event) -> None:
+        """Memory was written (or code run) from GDB while stopped"""
+        self.mem.flush()
+        self.qstrs.invalidate()
+        self.clear_format_memo()
+
+    def on_new_objfile(self, event) -> None:
+        """A new ELF was loaded: drop everything derived from the old one"""
+        self.mem.flush()
+        self.qstrs.reset()
+        self.clear_format_memo()
+        self.heap_type_info.clear()
+        self.type_table = None
+        self.obj_repr = None
+        self.code_infos.clear()
+        self.func_index = None
+        self.last_frames = []
 
     def get_mp_state(self) -> None:
         """Get MicroPython state from GDB"""
@@ -85,111 +612,430 @@ class MicroPythonHelper:
     def get_qstr(self, qstr_val: gdb.Value) -> str:
         """Convert QSTR value to string"""
         try:
-            # Get QSTR pool
-            pool = gdb.parse_and_eval('MP_STATE_VM(qstr_pool)')
-            # Extract string from pool
-            str_data = pool['entries'][int(qstr_val)]['str']
-            str_len = int(str_data['len'])
-            str_ptr = str_data['data'].cast(gdb.lookup_type('char').pointer())
-            return str_ptr.string(length=str_len)
-        except Exception as e:
-            return f"<qstr:{int(qstr_val)}>"
+            s = self.qstrs.lookup(int(qstr_val))
+            if s is not None:
+                return s
+        except Exception:
+            pass
+        return f"<qstr:{int(qstr_val)}>"
+
+    # Reserved mp_obj_t values that mark empty and deleted map slots. The
+    # sentinel is 4, or 8 with MICROPY_DEBUG_MP_OBJ_SENTINELS; neither is a
+    # valid key, so both are skipped.
+    MP_OBJ_NULL = 0
+    MP_OBJ_SENTINELS = (4, 8)
+    MAP_UNUSED_KEYS = (MP_OBJ_NULL,) + MP_OBJ_SENTINELS
+
+    # Map slots read per request when only part of a map is rendered
+    MAP_CHUNK_SLOTS = 64
+
+    # GC allocation table: 2 bits per block, see py/gc.c
+    GC_AT_FREE, GC_AT_HEAD, GC_AT_TAIL, GC_AT_MARK = 0, 1, 2, 3
+    GC_BLOCKS_PER_ATB = 4
+    GC_ATB_STATES = [tuple((byte >> (2 * k)) & 3 for k in range(4)) for byte in range(256)]
+    GC_RAW_ALLOC = "<data>"  # allocation that is not an object (item arrays, str bodies, ...)
+
+    # Builtin types dispatched by type-object address: (name, decoder kind)
+    BUILTIN_TYPES = [
+        ("str", "str"), ("bytes", "str"), ("bytearray", "object"),
+        ("int", "int"), ("float", "float"),
+        ("list", "sequence"), ("tuple", "sequence"), ("dict", "dict"),
+        ("NoneType", "none"),
+        ("set", "object"), ("frozenset", "object"), ("bool", "object"),
+        ("function", "object"), ("closure", "object"), ("module", "object"), ("type", "object"),
+    ]
+    BUILTIN_TYPE_SYMBOLS = {"function": "fun_bc"}
+    BUILTIN_EXCEPTIONS = [
+        "BaseException", "ArithmeticError", "AssertionError", "AttributeError", "EOFError",
+        "Exception", "GeneratorExit", "ImportError", "IndentationError", "IndexError",
+        "KeyError", "KeyboardInterrupt", "LookupError", "MemoryError", "NameError",
+        "NotImplementedError", "OSError", "OverflowError", "RuntimeError",
+        "StopAsyncIteration", "StopIteration", "SyntaxError", "SystemExit", "TypeError",
+        "UnicodeError", "ValueError", "ZeroDivisionError",
+    ]
+
+    @staticmethod
+    def obj_addr(obj) -> int:
+        """Address of a MicroPython object given as mp_obj_t, pointer, struct or int"""
+        if isinstance(obj, int):
+            return obj
+        if obj.type.strip_typedefs().code == gdb.TYPE_CODE_STRUCT:
+            return int(obj.address)
+        return int(obj)
+
+    def cast_obj(self, addr: int, type_name: str) -> gdb.Value:
+        """View the object at addr as the given MicroPython struct (read through the cache)"""
+        obj_type = gdb.lookup_type(type_name)
+        return gdb.Value(self.mem.read(addr, obj_type.sizeof), obj_type)
+
+    @staticmethod
+    def field_offset(type_name: str, field: str) -> int:
+        """Byte offset of a field in a struct type"""
+        for f in gdb.lookup_type(type_name).strip_typedefs().fields():
+            if f.name == field:
+                return f.bitpos // 8
+        raise gdb.error(f"{type_name} has no field {field}")
+
+    def read_words(self, addr: int, count: int) -> List[int]:
+        """Read count mp_obj_t-sized words starting at addr in one request"""
+        if count <= 0:
+            return []
+        word_size = gdb.lookup_type("mp_obj_t").sizeof
+        raw = self.mem.read(addr, count * word_size)
+        return list(struct.unpack("<" + ("I" if word_size == 4 else "Q") * count, raw))
+
+    def iter_map_entries(self, mp_map: gdb.Value, chunk: Optional[int] = None):
+        """Yield the used (key, value) words of an mp_map_t, reading chunk slots at a time
+
+        Reading stops when the caller stops iterating, so only the slots up
+        to the last entry consumed are fetched. Without a chunk size the
+        whole table is fetched in one read.
+        """
+        table = int(mp_map['table'])
+        alloc = int(mp_map['alloc'])
+        chunk = alloc if chunk is None else chunk
+        slot_size = 2 * gdb.lookup_type("mp_obj_t").sizeof
+        for first in range(0, alloc, max(chunk, 1)):
+            words = self.read_words(table + first * slot_size, 2 * min(chunk, alloc - first))
+            for i in range(0, len(words), 2):
+                if words[i] not in self.MAP_UNUSED_KEYS:
+                    yield words[i], words[i + 1]
+
+    def read_map_entries(self, mp_map: gdb.Value, start: int = 0, limit: Optional[int] = None) -> List[tuple]:
+        """Return used (key, value) words of an mp_map_t
+
+        Without a limit the table is fetched in one read. With a limit it is
+        read in chunks and reading stops once enough used slots were found,
+        so only the rows that are actually shown are fetched.
+        """
+        entries = self.iter_map_entries(mp_map, None if limit is None else self.MAP_CHUNK_SLOTS)
+        stop = None if limit is None else start + limit
+        return list(itertools.islice(entries, start, stop))
+
+    def object_children(self, addr: int, start: int = 0, count: Optional[int] = None) -> tuple:
+        """(total, [(name, word), ...]) for one page of an object's children
+
+        Lists and tuples page through their items array; dicts and
+        instances of classes defined in Python through their hash table,
+        reading only up to the end of the page. Other objects have none.
+        """
+        if self.decode_word(addr)[0] != "ptr" or not addr:
+            return 0, []
+        type_addr = self.read_words(addr, 1)[0]
+        type_name, kind = self.get_type_info(type_addr)
+        stop = None if count is None else start + count
+        if kind == "sequence":
+            items_addr, total = self.sequence_items(addr, type_name)
+            n = max(min(total, total if stop is None else stop) - start, 0)
+            words = self.read_words(items_addr + start * gdb.lookup_type("mp_obj_t").sizeof, n)
+            return total, [(f"[{start + i}]", w) for i, w in enumerate(words)]
+        if kind == "dict":
+            mp_map = self.cast_obj(addr, 'mp_obj_dict_t')['map']
+
+            def name(key):
+                return f"[{self.format_mp_obj(key)}]"
+        elif kind == "object" and self.is_python_class(type_addr):
+            # Instance of a class defined in Python: attributes live in its members map
+            mp_map = self.cast_obj(addr, 'mp_obj_instance_t')['members']
+            name = self.map_key_name
+        else:
+            return 0, []
+        entries = itertools.islice(self.iter_map_entries(mp_map, self.MAP_CHUNK_SLOTS), start, stop)
+        return int(mp_map['used']), [(name(k), v) for k, v in entries]
+
+    @staticmethod
+    def elided(shown: int, total: int) -> str:
+        """Marker for items left out of a bounded rendering"""
+        return f"...(+{total - shown} more)" if total > shown else ""
+
+    def window(self, start: int, total: int) -> int:
+        """Number of items to render from start given the max-items limit"""
+        remaining = max(total - start, 0)
+        return remaining if self.max_items is None else min(remaining, self.max_items)
+
+    def build_type_table(self) -> Dict[int, tuple]:
+        """Map addresses of the builtin mp_type_* objects to (name, decoder kind)
+
+        Built once per ELF; afterwards typing an object costs the single read
+        of its type pointer.
+        """
+        table = {}
+        for name, kind in self.BUILTIN_TYPES + [(exc, "exception") for exc in self.BUILTIN_EXCEPTIONS]:
+            symbol = f"mp_type_{self.BUILTIN_TYPE_SYMBOLS.get(name, name)}"
+            sym = gdb.lookup_global_symbol(symbol) or gdb.lookup_static_symbol(symbol)
+            if sym is not None:
+                table[int(sym.value().address)] = (name, kind)
+        sym = gdb.lookup_global_symbol("mp_obj_instance_make_new")
+        self.instance_make_new = int(sym.value().address) if sym is not None else 0
+        self.type_table = table
+        return table
+
+    def is_python_class(self, type_addr: int) -> bool:
+        """Whether a type is a class defined in Python
+
+        Only such classes construct their instances with
+        mp_obj_instance_make_new, as mp_obj_instance_t with a members map;
+        native types keep their own layout.
+        """
+        table = self.type_table if self.type_table is not None else self.build_type_table()
+        if type_addr in table or not self.instance_make_new:
+            return False
+        try:
+            return self._type_slot(type_addr, 'make_new') == self.instance_make_new
+        except (gdb.error, gdb.MemoryError):
+            return False
+
+    def get_type_info(self, type_addr: int) -> tuple:
+        """(name, decoder kind) for a type object address
+
+        Builtins come from the per-ELF table; user classes take the slower
+        path of resolving the type's name qstr, cached per stop.
+        """
+        table = self.type_table if self.type_table is not None else self.build_type_table()
+        info = table.get(type_addr)
+        if info is None:
+            info = self.heap_type_info.get(type_addr)
+        if info is None:
+            name = self.get_qstr(self.cast_obj(type_addr, 'mp_obj_type_t')['name'])
+            info = (name, "object")
+            self.heap_type_info[type_addr] = info
+        return info
+
+    def get_obj_repr(self) -> ObjectRepr:
+        """Tagged-word decoder for the loaded firmware"""
+        if self.obj_repr is None:
+            kind = self.obj_repr_setting if self.obj_repr_setting != "auto" else ObjectRepr.detect()
+            self.obj_repr = ObjectRepr(kind, 8 * gdb.lookup_type("mp_obj_t").sizeof)
+        return self.obj_repr
+
+    def decode_word(self, obj) -> tuple:
+        """Split an mp_obj_t into (tag, value) without reading target memory"""
+        return self.get_obj_repr().decode(self.obj_addr(obj))
+
+    def format_immediate(self, tag: str, value) -> str:
+        """Render a value decoded from the word itself"""
+        if tag == "int":
+            return str(value)
+        if tag == "qstr":
+            return f'"{self.get_qstr(value)}"'
+        if tag == "const":
+            return ObjectRepr.IMMEDIATE_NAMES.get(value, f"<immediate {value}>")
+        return repr(value)
+
+    def map_key_name(self, key: int) -> str:
+        """Name of a map key; variable names are qstrs decoded from the word"""
+        tag, value = self.decode_word(key)
+        if tag == "qstr":
+            return self.get_qstr(value)
+        return self.format_mp_obj(key)
+
+    def get_obj_type_info(self, obj) -> tuple:
+        """(name, decoder kind) of the object at obj"""
+        tag, value = self.decode_word(obj)
+        if tag != "ptr":
+            name = {"int": "int", "qstr": "str", "float": "float"}.get(tag)
+            if name is None:
+                name = "NoneType" if value == 0 else "bool"
+            return (name, "immediate")
+        type_addr = self.read_words(self.obj_addr(obj), 1)[0]
+        if not type_addr:
+            return ("<unknown>", "object")
+        return self.get_type_info(type_addr)
 
     def get_obj_type(self, obj: gdb.Value) -> str:
         """Get MicroPython object type"""
         try:
-            type_ptr = obj['type']
-            if type_ptr:
-                type_name = self.get_qstr(type_ptr['name'])
-                return type_name
+            return self.get_obj_type_info(obj)[0]
         except Exception:
             pass
         return "<unknown>"
 
-    def format_mp_obj(self, obj: gdb.Value) -> str:
-        """Format MicroPython object for display"""
-        obj_type = self.get_obj_type(obj)
-        
-        if obj_type == "str":
-            # Handle string objects
-            try:
-                str_data = obj['str']
-                str_len = int(str_data['len'])
-                str_ptr = str_data['data'].cast(gdb.lookup_type('char').pointer())
-                return f'"{str_ptr.string(length=str_len)}"'
-            except:
-                return "<str:error>"
-        elif obj_type == "int":
-            # Handle integer objects
-            try:
-                return str(int(obj['value']))
-            except:
-                return "<int:error>"
-        elif obj_type == "float":
-            # Handle float objects
-            try:
-                return str(float(obj['value']))
-            except:
-                return "<float:error>"
-        elif obj_type == "list":
-            # Handle list objects
-            try:
-                items = []
-                for i in range(int(obj['len'])):
-                    item = obj['items'][i]
-                    items.append(self.format_mp_obj(item))
-                return f"[{', '.join(items)}]"
-            except:
-                return "<list:error>"
-        elif obj_type == "dict":
-            # Handle dict objects
-            try:
-                items = []
-                table = obj['map']['table']
-                for i in range(int(table['alloc'])):
-                    if table['table'][i]['key'] != 0:
-                        key = self.format_mp_obj(table['table'][i]['key'])
-                        value = self.format_mp_obj(table['table'][i]['value'])
-                        items.append(f"{key}: {value}")
-                return f"{{{', '.join(items)}}}"
-            except:
-                return "<dict:error>"
-        elif obj_type == "exception":
-            return self.format_exception(obj)
-        else:
-            return f"<{obj_type} object at {obj.address}>"
+    def format_mp_obj(self, obj: gdb.Value, depth: int = 0, start: int = 0) -> str:
+        """Format MicroPython object for display
+
+        Rendering is bounded by max_depth, max_items and max_string; elided
+        parts can be expanded later by address with mpy-expand, which passes
+        start to continue where the previous rendering stopped.
+
+        Renderings are memoised per stop by object address, so shared
+        sub-objects are read and formatted once, and a reference back to an
+        object that is still being rendered is shown as <cycle @0x...>.
+        """
+        addr = self.obj_addr(obj)
+        tag, value = self.decode_word(addr)
+        if tag != "ptr":
+            return self.format_immediate(tag, value)
+        if addr == self.MP_OBJ_NULL:
+            return "NULL"
+        if start:
+            # Expansions of a tail are one-off; don't memoise them
+            return self._format_obj(obj, addr, depth, start)
+
+        budget = None if self.max_depth is None else self.max_depth - depth
+        key = (addr, budget)
+        text = self.format_memo.get(key)
+        if text is not None:
+            return text
+        if addr in self.rendering:
+            self.lowest_backref = min(self.lowest_backref, self.rendering[addr])
+            return f"<cycle @{addr:#x}>"
+
+        path_depth = len(self.rendering)
+        outer_backref = self.lowest_backref
+        self.lowest_backref = path_depth
+        self.rendering[addr] = path_depth
+        try:
+            text = self._format_obj(obj, addr, depth, start)
+        finally:
+            del self.rendering[addr]
+        if self.lowest_backref >= path_depth:
+            # Self-contained subtree: safe to reuse wherever the object appears
+            self.format_memo[key] = text
+        self.lowest_backref = min(outer_backref, self.lowest_backref)
+        return text
+
+    def clear_format_memo(self) -> None:
+        """Forget memoised renderings (target resumed or limits changed)"""
+        self.format_memo.clear()
+
+    def _format_obj(self, obj: gdb.Value, addr: int, depth: int, start: int) -> str:
+        """Render one object; format_mp_obj handles memoisation and cycles"""
+        try:
+            obj_type, kind = self.get_obj_type_info(addr)
+        except Exception:
+            obj_type, kind = "<unknown>", "object"
+        decoder = self.DECODERS.get(kind)
+        if decoder is None:
+            return f"<{obj_type} object at {addr:#x}>"
+        try:
+            return decoder(self, addr, obj_type, depth, start)
+        except Exception:
+            return f"<{obj_type}:error>"
+
+    def _format_str(self, addr: int, obj_type: str, depth: int, start: int) -> str:
+        """str/bytes: read no more than max_string bytes"""
+        str_obj = self.cast_obj(addr, 'mp_obj_str_t')
+        str_len = int(str_obj['len'])
+        start = min(start, str_len)
+        n = str_len - start if self.max_string is None else min(str_len - start, self.max_string)
+        data = self.mem.read(int(str_obj['data']) + start, n)
+        text = f'"{data.decode("utf-8", "replace")}"' if obj_type == "str" else repr(data)
+        return text + self.elided(start + n, str_len)
+
+    def _format_int(self, addr: int, obj_type: str, depth: int, start: int) -> str:
+        return str(int(self.cast_obj(addr, 'mp_obj_int_t')['val']))
+
+    def _format_float(self, addr: int, obj_type: str, depth: int, start: int) -> str:
+        return str(float(self.cast_obj(addr, 'mp_obj_float_t')['value']))
+
+    def sequence_items(self, addr: int, obj_type: str) -> tuple:
+        """Address and length of a list's or tuple's items array"""
+        if obj_type == "list":
+            list_obj = self.cast_obj(addr, 'mp_obj_list_t')
+            return int(list_obj['items']), int(list_obj['len'])
+        total = int(self.cast_obj(addr, 'mp_obj_tuple_t')['len'])
+        return addr + self.field_offset('mp_obj_tuple_t', 'items'), total
+
+    def _format_sequence(self, addr: int, obj_type: str, depth: int, start: int) -> str:
+        """list/tuple: fetch the visible part of the items array at once"""
+        items_addr, total = self.sequence_items(addr, obj_type)
+        if self.max_depth is not None and depth >= self.max_depth and total:
+            return f"<{obj_type} @{addr:#x} len={total}>"
+        n = self.window(start, total)
+        words = self.read_words(items_addr + start * gdb.lookup_type("mp_obj_t").sizeof, n)
+        items = [self.format_mp_obj(w, depth + 1) for w in words]
+        if start + n < total:
+            items.append(self.elided(start + n, total))
+        if obj_type == "tuple":
+            return f"({', '.join(items)}{',' if total == 1 else ''})"
+        return f"[{', '.join(items)}]"
+
+    def _format_dict(self, addr: int, obj_type: str, depth: int, start: int) -> str:
+        """dict: fetch only the visible rows of the hash table"""
+        mp_map = self.cast_obj(addr, 'mp_obj_dict_t')['map']
+        total = int(mp_map['used'])
+        if self.max_depth is not None and depth >= self.max_depth and total:
+            return f"<{obj_type} @{addr:#x} len={total}>"
+        n = self.window(start, total)
+        items = []
+        for key, value in self.read_map_entries(mp_map, start, n):
+            items.append(f"{self.format_mp_obj(key, depth + 1)}: {self.format_mp_obj(value, depth + 1)}")
+        if start + n < total:
+            items.append(self.elided(start + n, total))
+        return f"{{{', '.join(items)}}}"
+
+    def _format_exception(self, addr: int, obj_type: str, depth: int, start: int) -> str:
+        return self.format_exception(addr)
+
+    def _format_none(self, addr: int, obj_type: str, depth: int, start: int) -> str:
+        return "None"
 
     def format_exception(self, exc_obj: gdb.Value) -> str:
         """Format an exception object for display"""
         try:
-            exc_type = self.get_obj_type(exc_obj["base"]["type"])
-            exc_args = self.format_mp_obj(exc_obj["args"])
-            return f"{exc_type}({exc_args})"
+            addr = self.obj_addr(exc_obj)
+            exc_type = self.get_obj_type(addr)
+            exc_args = self.format_mp_obj(int(self.cast_obj(addr, 'mp_obj_exception_t')['args']))
+            return f"{exc_type}{exc_args}"
         except:
             return "<error formatting exception>"
 
-    def get_locals(self) -> Dict[str, str]:
-        """Get local variables from current frame"""
-        frame = self.get_current_frame()
-        if not frame:
-            return {}
-        
+    def get_locals(self, local_words: Optional[List[tuple]] = None) -> Dict[str, str]:
+        """Get local variables from current frame, or format the given raw locals"""
         locals_dict = {}
         try:
-            # Get locals dict
-            locals_ptr = frame['locals']
-            if locals_ptr:
-                for i in range(int(locals_ptr['map']['alloc'])):
-                    entry = locals_ptr['map']['table'][i]
-                    if entry['key'] != 0:
-                        name = self.get_qstr(entry['key'])
-                        value = self.format_mp_obj(entry['value'])
-                        locals_dict[name] = value
+            if local_words is None:
+                local_words = self.current_local_words()
+            for name, word in local_words:
+                locals_dict[name] = self.format_mp_obj(word)
         except Exception as e:
             print(f"Error getting locals: {e}")
         
         return locals_dict
 
+    def frame_locals(self, frame: Dict[str, int]) -> List[tuple]:
+        """(name, raw word) of the bound locals of a Python frame
+
+        Locals sit at the top of code_state->state[], local i at
+        state[n_state - 1 - i], above the value stack that grows up from
+        state[0]. Only arguments have names in the bytecode; other locals
+        are numbered.
+        """
+        info = self.code_info(frame["fun_bc"])
+        cs = frame["code_state"]
+        state_addr = cs + self.field_offset('mp_code_state_t', 'state')
+        n_state = info["n_state"]
+        words = self.read_words(state_addr, n_state)
+        sp = int(self.cast_obj(cs, 'mp_code_state_t')['sp'])
+        stack_top = (sp - state_addr) // gdb.lookup_type("mp_obj_t").sizeof
+        arg_names = info["arg_names"]
+        result = []
+        for i in range(n_state):
+            slot = n_state - 1 - i
+            if slot <= stack_top:
+                break
+            if words[slot] == self.MP_OBJ_NULL:
+                continue  # unbound
+            result.append((arg_names[i] if i < len(arg_names) else f"local_{i}", words[slot]))
+        return result
+
+    def frame_stack(self, frame: Dict[str, int]) -> List[int]:
+        """Raw words on the value stack of a Python frame, bottom first
+
+        The stack grows up from code_state->state[0] and sp points at its
+        top item (at state[-1] when it is empty).
+        """
+        cs = frame["code_state"]
+        state_addr = cs + self.field_offset('mp_code_state_t', 'state')
+        sp = int(self.cast_obj(cs, 'mp_code_state_t')['sp'])
+        n = (sp - state_addr) // gdb.lookup_type("mp_obj_t").sizeof + 1
+        return self.read_words(state_addr, min(max(n, 0), self.code_info(frame["fun_bc"])["n_state"]))
+
+    def current_local_words(self) -> List[tuple]:
+        """Raw locals of the innermost Python frame"""
+        frames = self.python_frames(limit=1)
+        return self.frame_locals(frames[0]) if frames else []
+
     def get_globals(self) -> Dict[str, str]:
         """Get global variables from current frame"""
         frame = self.get_current_frame()
@@ -201,78 +1047,566 @@ class MicroPythonHelper:
             # Get globals dict
             globals_ptr = frame['globals']
             if globals_ptr:
-                for i in range(int(globals_ptr['map']['alloc'])):
-                    entry = globals_ptr['map']['table'][i]
-                    if entry['key'] != 0:
-                        name = self.get_qstr(entry['key'])
-                        value = self.format_mp_obj(entry['value'])
-                        globals_dict[name] = value
+                for key, value in self.read_map_entries(globals_ptr['map']):
+                    name = self.map_key_name(key)
+                    globals_dict[name] = self.format_mp_obj(value)
         except Exception as e:
             print(f"Error getting globals: {e}")
         
         return globals_dict
 
+    def builtin_type_addr(self, name: str) -> Optional[int]:
+        """Address of a builtin type object, from the per-ELF type table"""
+        table = self.type_table if self.type_table is not None else self.build_type_table()
+        return next((addr for addr, info in table.items() if info[0] == name), None)
+
+    def read_gc_areas(self) -> List[Dict[str, Any]]:
+        """Describe the GC heap area(s): pool bounds and allocation table"""
+        mem = gdb.parse_and_eval("mp_state_ctx.mem")
+        field_names = [f.name for f in mem.type.strip_typedefs().fields()]
+        areas = []
+        # Split-heap builds keep a linked list of areas in mem.area
+        area = mem["area"] if "area" in field_names else mem
+        while True:
+            areas.append({
+                "atb_start": int(area["gc_alloc_table_start"]),
+                "atb_len": int(area["gc_alloc_table_byte_len"]),
+                "pool_start": int(area["gc_pool_start"]),
+                "pool_end": int(area["gc_pool_end"]),
+            })
+            area_fields = [f.name for f in area.type.strip_typedefs().fields()]
+            if "next" not in area_fields or not int(area["next"]):
+                break
+            area = area["next"].dereference()
+        return areas
+
+    def gc_block_size(self) -> int:
+        """MICROPY_BYTES_PER_GC_BLOCK (defaults to four words)"""
+        try:
+            return int(gdb.parse_and_eval("MICROPY_BYTES_PER_GC_BLOCK"))
+        except gdb.error:
+            return 4 * gdb.lookup_type("mp_obj_t").sizeof
+
+    def heap_census(self, owners: bool = False) -> Dict[str, Any]:
+        """Census of the GC heap decoded from one snapshot of each area
+
+        The allocation table and the whole pool are read once (through the
+        page cache) and decoded in Python: block states, free runs and the
+        type of every allocation, taken from its first word. With owners,
+        every allocation's words are also scanned to find, for each block,
+        the first allocation that points at it (its owning container).
+        """
+        block_size = self.gc_block_size()
+        word_size = gdb.lookup_type("mp_obj_t").sizeof
+        word_fmt = "<I" if word_size == 4 else "<Q"
+        type_type = self.builtin_type_addr("type")
+        census = {
+            "block_size": block_size,
+            "areas": [],
+            "total_blocks": 0,
+            "free_blocks": 0,
+            "largest_free": 0,
+            "free_hist": {},
+            "types": {},
+            "allocs": [],
+        }
+        type_names: Dict[int, str] = {}
+        snapshots = []  # (pool start, pool bytes, allocations) per area
+
+        for area in self.read_gc_areas():
+            pool_start = area["pool_start"]
+            n_blocks = min(area["atb_len"] * self.GC_BLOCKS_PER_ATB,
+                           (area["pool_end"] - pool_start) // block_size)
+            atb = self.mem.read(area["atb_start"], area["atb_len"])
+            pool = self.mem.read(pool_start, n_blocks * block_size)
+            states = [st for byte in atb for st in self.GC_ATB_STATES[byte]][:n_blocks]
+            first_alloc = len(census["allocs"])
+            census["areas"].append({"start": pool_start, "end": pool_start + n_blocks * block_size,
+                                    "states": states})
+            census["total_blocks"] += n_blocks
+
+            def type_of(block: int) -> str:
+                type_addr = struct.unpack_from(word_fmt, pool, block * block_size)[0]
+                name = type_names.get(type_addr)
+                if name is not None:
+                    return name
+                info = self.type_table.get(type_addr)
+                if info is not None:
+                    name = info[0]
+                elif (pool_start <= type_addr < pool_start + n_blocks * block_size
+                      and (type_addr - pool_start) % block_size == 0
+                      and states[(type_addr - pool_start) // block_size] in (self.GC_AT_HEAD, self.GC_AT_MARK)
+                      and struct.unpack_from(word_fmt, pool, type_addr - pool_start)[0] == type_type):
+                    # Instance of a class defined in Python (its type lives on the heap)
+                    name = self.get_type_info(type_addr)[0]
+                else:
+                    name = self.GC_RAW_ALLOC
+                type_names[type_addr] = name
+                return name
+
+            i = 0
+            while i < n_blocks:
+                state = states[i]
+                if state == self.GC_AT_FREE:
+                    j = i + 1
+                    while j < n_blocks and states[j] == self.GC_AT_FREE:
+                        j += 1
+                    run = j - i
+                    census["free_blocks"] += run
+                    census["largest_free"] = max(census["largest_free"], run)
+                    bucket = 1 << (run.bit_length() - 1)
+                    census["free_hist"][bucket] = census["free_hist"].get(bucket, 0) + 1
+                    i = j
+                elif state == self.GC_AT_TAIL:
+                    i += 1  # tail without a head: table is mid-update
+                else:
+                    j = i + 1
+                    while j < n_blocks and states[j] == self.GC_AT_TAIL:
+                        j += 1
+                    name = type_of(i)
+                    entry = census["types"].setdefault(name, [0, 0])
+                    entry[0] += 1
+                    entry[1] += (j - i) * block_size
+                    census["allocs"].append((pool_start + i * block_size, j - i, name))
+                    i = j
+            snapshots.append((pool_start, pool, census["allocs"][first_alloc:]))
+
+        census["used_blocks"] = census["total_blocks"] - census["free_blocks"]
+        if owners:
+            heads = {a[0] for a in census["allocs"]}
+            owner: Dict[int, int] = {}
+            for pool_start, pool, allocs in snapshots:
+                for addr, n, _ in allocs:
+                    offset = addr - pool_start
+                    for (word,) in struct.iter_unpack(word_fmt, pool[offset:offset + n * block_size]):
+                        if word in heads and word != addr and word not in owner:
+                            owner[word] = addr
+            census["owners"] = owner
+        return census
+
+    def heap_summary(self, census: Dict[str, Any]) -> Dict[str, Any]:
+        """Compact snapshot of a census: totals, per-type and per-owner aggregates
+
+        Allocations are attributed to the nearest owning object; raw blocks
+        (item arrays, str bodies) are looked through so that list elements
+        count towards the list rather than its items array. Allocations no
+        heap block refers to are attributed to "<root>" (address 0).
+        """
+        names = {addr: name for addr, _, name in census["allocs"]}
+        owner = census.get("owners", {})
+        by_owner: Dict[int, list] = {}
+        for addr, n, name in census["allocs"]:
+            o = owner.get(addr, 0)
+            if o and names.get(o) == self.GC_RAW_ALLOC and owner.get(o):
+                o = owner[o]
+            entry = by_owner.setdefault(o, [names.get(o, "<root>"), 0, 0])
+            entry[1] += 1
+            entry[2] += n * census["block_size"]
+        return {
+            "time": datetime.now().isoformat(),
+            "block_size": census["block_size"],
+            "used_blocks": census["used_blocks"],
+            "free_blocks": census["free_blocks"],
+            "largest_free": census["largest_free"],
+            "allocations": len(census["allocs"]),
+            "types": {name: tuple(v) for name, v in census["types"].items()},
+            "owners": {o: tuple(v) for o, v in by_owner.items()},
+        }
+
+    @staticmethod
+    def diff_heap_summaries(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+        """Growth from snapshot a to snapshot b, by type and by owning container"""
+        types = []
+        for name in set(a["types"]) | set(b["types"]):
+            ca, ba = a["types"].get(name, (0, 0))
+            cb, bb = b["types"].get(name, (0, 0))
+            if (ca, ba) != (cb, bb):
+                types.append((name, cb - ca, bb - ba))
+        owners = []
+        for o in set(a["owners"]) | set(b["owners"]):
+            na, ca, ba = a["owners"].get(o, (None, 0, 0))
+            nb, cb, bb = b["owners"].get(o, (None, 0, 0))
+            if (ca, ba) != (cb, bb):
+                owners.append((o, nb or na, cb - ca, bb - ba))
+        types.sort(key=lambda t: t[2], reverse=True)
+        owners.sort(key=lambda t: t[3], reverse=True)
+        return {
+            "used_blocks": b["used_blocks"] - a["used_blocks"],
+            "allocations": b["allocations"] - a["allocations"],
+            "largest_free": (a["largest_free"], b["largest_free"]),
+            "types": types,
+            "owners": owners,
+        }
+
+    # Frames walked before giving up on a (corrupt or cyclic) frame chain
+    MAX_PY_FRAMES = 64
+
+    def python_frames(self, limit: Optional[int] = None) -> List[Dict[str, int]]:
+        """Python frames of the stopped target, innermost first
+
+        Returns the code_state, fun_bc and ip of each frame. Settrace builds
+        keep the chain in mp_state_ctx.thread.current_code_state and it is
+        walked in target memory; otherwise each mp_execute_bytecode C frame
+        holds one Python frame in its code_state argument. The walk stops
+        after limit frames.
+        """
+        frames = []
+        limit = self.MAX_PY_FRAMES if limit is None else min(limit, self.MAX_PY_FRAMES)
+        thread = gdb.parse_and_eval("mp_state_ctx.thread")
+        if "current_code_state" in [f.name for f in thread.type.strip_typedefs().fields()]:
+            cs = int(thread["current_code_state"])
+            while cs and len(frames) < limit:
+                state = self.cast_obj(cs, 'mp_code_state_t')
+                frames.append({"code_state": cs, "fun_bc": int(state['fun_bc']), "ip": int(state['ip'])})
+                cs = int(state['prev_state'])
+            return frames
+
+        # Frames of the previous full walk, by code_state address: once the
+        # unwind reaches one of them, the older ones are checked in memory
+        # instead of being unwound again
+        previous = {f["code_state"]: i for i, f in enumerate(self.last_frames)}
+        frame = gdb.newest_frame()
+        while frame is not None and len(frames) < limit:
+            if frame.name() == "mp_execute_bytecode":
+                cs = int(frame.read_var("code_state"))
+                state = self.cast_obj(cs, 'mp_code_state_t')
+                saved_ip = int(state['ip'])
+                ip = saved_ip
+                if not frames:
+                    # The innermost frame keeps ip in a local until it is saved
+                    try:
+                        ip = int(frame.read_var("ip"))
+                    except (gdb.error, ValueError):
+                        pass
+                frames.append({"code_state": cs, "fun_bc": int(state['fun_bc']), "ip": ip, "saved_ip": saved_ip})
+                k = previous.get(cs)
+                if k is not None:
+                    rest = self.unchanged_frames(self.last_frames[k + 1:])
+                    if rest is not None:
+                        rest = rest[:limit - len(frames)]
+                        frames.extend(rest)
+                        self.frames_reused += len(rest)
+                        break
+            frame = frame.older()
+        if limit == self.MAX_PY_FRAMES:
+            self.last_frames = frames
+        return frames
+
+    def unchanged_frames(self, old: List[Dict[str, int]]) -> Optional[List[Dict[str, int]]]:
+        """The old frames if every code_state still holds the same function and ip
+
+        The code_states sit next to each other on the C stack, so this is a
+        page or two of reads rather than a GDB unwind through every C frame
+        between them.
+        """
+        frames = []
+        for f in old:
+            state = self.cast_obj(f["code_state"], 'mp_code_state_t')
+            if int(state['fun_bc']) != f["fun_bc"] or int(state['ip']) != f["saved_ip"]:
+                return None
+            frames.append(dict(f, ip=f["saved_ip"]))
+        return frames
+
+    @staticmethod
+    def decode_uint(data: bytes, pos: int) -> tuple:
+        """Decode a bytecode var-uint (7 bits per byte, MSB first): (value, next pos)"""
+        value = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            value = (value << 7) | (b & 0x7f)
+            if not b & 0x80:
+                return value, pos
+
+    @staticmethod
+    def decode_prelude(data: bytes) -> Dict[str, int]:
+        """Decode the signature and size header of a v6 bytecode prelude (py/bc.h)"""
+        z = data[0]
+        pos = 1
+        n_state, n_pos, n_kwonly = (z >> 3) & 0xf, z & 0x3, 0
+        n = 0
+        while z & 0x80:
+            z = data[pos]
+            pos += 1
+            n_state |= (z & 0x30) << (2 * n)
+            n_pos |= (z & 0x4) << n
+            n_kwonly |= ((z & 0x08) >> 3) << n
+            n += 1
+        n_info = n_cell = 0
+        n = 0
+        while True:
+            z = data[pos]
+            pos += 1
+            n_cell |= (z & 1) << n
+            n_info |= ((z & 0x7e) >> 1) << (6 * n)
+            n += 1
+            if not z & 0x80:
+                break
+        return {"n_state": n_state + 1, "n_pos_args": n_pos, "n_kwonly_args": n_kwonly,
+                "n_info": n_info, "n_cell": n_cell, "code_info": pos}
+
+    # Bytes fetched for the prelude header; it is never longer than this
+    PRELUDE_HEADER_BYTES = 16
+
+    def code_info(self, fun_bc: int) -> Dict[str, Any]:
+        """Name, source file and prelude layout of a bytecode function
+
+        Decoded once per code object (keyed by its bytecode address) and
+        kept for the session. Bytecode compiled at runtime lives on the GC
+        heap and its address can be reused, so an entry is only reused
+        while the prelude header read at that address still matches.
+        """
+        fun = self.cast_obj(fun_bc, 'mp_obj_fun_bc_t')
+        bytecode = int(fun['bytecode'])
+        header = self.mem.read(bytecode, self.PRELUDE_HEADER_BYTES)
+        info = self.code_infos.get(bytecode)
+        if info is not None and info["header"] == header:
+            return info
+
+        prelude = self.decode_prelude(header)
+        code_info_addr = bytecode + prelude["code_info"]
+        body = self.mem.read(code_info_addr, prelude["n_info"])
+        name, pos = self.decode_uint(body, 0)
+        arg_names = []
+        for _ in range(prelude["n_pos_args"] + prelude["n_kwonly_args"]):
+            arg, pos = self.decode_uint(body, pos)
+            arg_names.append(arg)
+
+        constants = fun['context'].dereference()['constants']
+        if "qstr_table" in [f.name for f in constants.type.strip_typedefs().fields()]:
+            # MICROPY_EMIT_BYTECODE_USES_QSTR_TABLE: qstrs are indices into the module's table
+            table = int(constants['qstr_table'])
+            entry_size = constants['qstr_table'].type.target().sizeof
+            fmt = {1: "<B", 2: "<H", 4: "<I"}[entry_size]
+
+            def qstr_at(index):
+                return struct.unpack(fmt, self.mem.read(table + index * entry_size, entry_size))[0]
+
+            name = qstr_at(name)
+            arg_names = [qstr_at(a) for a in arg_names]
+            source_file = qstr_at(0)
+        else:
+            source_file = int(constants['source_file'])
+
+        info = {
+            "header": header,
+            "name": self.get_qstr(name),
+            "file": self.get_qstr(source_file),
+            "arg_names": [self.get_qstr(a) for a in arg_names],
+            "n_state": prelude["n_state"],
+            "lines": self.decode_line_table(body[pos:]),
+            "code_start": code_info_addr + prelude["n_info"] + prelude["n_cell"],
+        }
+        self.code_infos[bytecode] = info
+        return info
+
+    @staticmethod
+    def decode_line_table(line_info: bytes) -> tuple:
+        """Decode a prelude line-info table into (offsets, lines)
+
+        Entries are 0b0LLBBBBB, or 0b1LLLBBBB plus a low line byte, each
+        advancing the bytecode offset by B and the line by L (see
+        mp_bytecode_get_source_line). offsets[i] is the first bytecode
+        offset of lines[i]; offsets is sorted for bisection.
+        """
+        offsets, lines = [0], [1]
+        offset, line = 0, 1
+        pos = 0
+        while pos < len(line_info):
+            c = line_info[pos]
+            if not c & 0x80:
+                b, l = c & 0x1f, c >> 5
+                pos += 1
+            else:
+                if pos + 1 >= len(line_info):
+                    break
+                b, l = c & 0xf, ((c << 4) & 0x700) | line_info[pos + 1]
+                pos += 2
+            offset += b
+            line += l
+            offsets.append(offset)
+            lines.append(line)
+        return offsets, lines
+
+    def source_line(self, fun_bc: int, ip: int) -> int:
+        """Source line executing at ip in a bytecode function"""
+        info = self.code_info(fun_bc)
+        offsets, lines = info["lines"]
+        return lines[bisect.bisect_right(offsets, ip - info["code_start"]) - 1]
+
+    def frame_location(self, frame: Dict[str, int]) -> Dict[str, Any]:
+        """Function name, file and line of a frame from python_frames"""
+        info = self.code_info(frame["fun_bc"])
+        return {"function": info["name"], "file": info["file"],
+                "line": self.source_line(frame["fun_bc"], frame["ip"])}
+
+    def line_starts(self, fun_bc: int) -> List[int]:
+        """Addresses of the first opcode of each source line of a function"""
+        info = self.code_info(fun_bc)
+        offsets, lines = info["lines"]
+        starts = {offsets[i] for i in range(len(offsets)) if i == 0 or lines[i] != lines[i - 1]}
+        return sorted(info["code_start"] + offset for offset in starts)
+
+    @staticmethod
+    def bytecode_c_frame(code_state: int) -> Optional[gdb.Frame]:
+        """The mp_execute_bytecode C frame running a Python frame"""
+        frame = gdb.newest_frame()
+        while frame is not None:
+            if frame.name() == "mp_execute_bytecode" and int(frame.read_var("code_state")) == code_state:
+                return frame
+            frame = frame.older()
+        return None
+
+    def _dict_map(self, dict_addr: int) -> gdb.Value:
+        return self.cast_obj(dict_addr, 'mp_obj_dict_t')['map']
+
+    def _type_slot(self, type_addr: int, name: str) -> int:
+        """Word stored in an optional type member (0 if the type has none)"""
+        type_obj = self.cast_obj(type_addr, 'mp_obj_type_t')
+        field_names = [f.name for f in type_obj.type.strip_typedefs().fields()]
+        if name in field_names:
+            return int(type_obj[name])
+        # Since v1.19 optional type members live in slots[]
+        index = int(type_obj[f'slot_index_{name}'])
+        if not index:
+            return 0
+        slots = type_addr + self.field_offset('mp_obj_type_t', 'slots')
+        return self.read_words(slots + (index - 1) * gdb.lookup_type("mp_obj_t").sizeof, 1)[0]
+
+    def _type_locals_dict(self, type_addr: int) -> int:
+        """Address of a class's locals dict (0 if it has none)"""
+        return self._type_slot(type_addr, 'locals_dict')
+
+    def type_parents(self, type_addr: int) -> List[int]:
+        """Direct base types of a type (a tuple of them with multiple inheritance)"""
+        parent = self._type_slot(type_addr, 'parent')
+        if not parent:
+            return []
+        if self.read_words(parent, 1)[0] == self.builtin_type_addr("tuple"):
+            n = int(self.cast_obj(parent, 'mp_obj_tuple_t')['len'])
+            return self.read_words(parent + self.field_offset('mp_obj_tuple_t', 'items'), n)
+        return [parent]
+
+    # Bases followed before giving up on a (corrupt or cyclic) type hierarchy
+    MAX_MRO = 32
+
+    def type_mro(self, type_addr: int) -> List[int]:
+        """The type followed by all its base types, depth first, each once"""
+        mro = []
+        pending = [type_addr]
+        while pending and len(mro) < self.MAX_MRO:
+            t = pending.pop(0)
+            if t and t not in mro:
+                mro.append(t)
+                pending[0:0] = self.type_parents(t)
+        return mro
+
+    def function_index_key(self) -> tuple:
+        """Cheap fingerprint of the loaded modules; changes when a module is imported"""
+        vm = gdb.parse_and_eval("mp_state_ctx.vm")
+        modules = vm['mp_loaded_modules_dict']['map']
+        main = vm['dict_main']['map']
+        return (int(modules['table']), int(modules['used']), int(main['table']), int(main['used']))
+
+    def function_index(self) -> Dict[str, List[tuple]]:
+        """Map Python function names to (qualified name, fun_bc, bytecode address)
+
+        Built from the globals of __main__ and every loaded module, including
+        methods of the classes defined there. Each function is reachable as
+        name, module.name, Class.name and module.Class.name. The index is
+        cached until a module is imported or __main__ gains new globals.
+        """
+        key = self.function_index_key()
+        if self.func_index is not None and self.func_index_key == key:
+            return self.func_index
+
+        fun_type = self.builtin_type_addr("function")
+        type_type = self.builtin_type_addr("type")
+        module_type = self.builtin_type_addr("module")
+        index: Dict[str, List[tuple]] = {}
+
+        def add(qualname: str, fun_bc: int) -> None:
+            bytecode = int(self.cast_obj(fun_bc, 'mp_obj_fun_bc_t')['bytecode'])
+            parts = qualname.split(".")
+            names = {".".join(parts[i:]) for i in range(len(parts))}
+            for name in names:
+                entries = index.setdefault(name, [])
+                if all(e[2] != bytecode for e in entries):
+                    entries.append((qualname, fun_bc, bytecode))
+
+        def scan(prefix: str, dict_addr: int, classes: bool) -> None:
+            for k, v in self.read_map_entries(self._dict_map(dict_addr)):
+                tag, _ = self.decode_word(v)
+                if tag != "ptr" or not v:
+                    continue
+                obj_type = self.read_words(v, 1)[0]
+                name = f"{prefix}{self.map_key_name(k)}"
+                if obj_type == fun_type:
+                    add(name, v)
+                elif classes and obj_type == type_type:
+                    locals_dict = self._type_locals_dict(v)
+                    if locals_dict:
+                        scan(f"{name}.", locals_dict, False)
+
+        vm = gdb.parse_and_eval("mp_state_ctx.vm")
+        scan("__main__.", int(vm['dict_main'].address), True)
+        for k, v in self.read_map_entries(vm['mp_loaded_modules_dict']['map']):
+            if self.decode_word(v)[0] != "ptr" or self.read_words(v, 1)[0] != module_type:
+                continue
+            globals_dict = int(self.cast_obj(v, 'mp_obj_module_t')['globals'])
+            if globals_dict:
+                scan(f"{self.map_key_name(k)}.", globals_dict, True)
+
+        self.func_index = index
+        self.func_index_key = key
+        return index
+
     def get_backtrace(self) -> List[str]:
         """Get Python-level backtrace"""
-        frame = self.get_current_frame()
-        if not frame:
-            return []
-        
         backtrace = []
         try:
-            while frame:
-                # Get function name
-                fun_name = "<unknown>"
-                if frame['fun']:
-                    fun_name = self.get_qstr(frame['fun']['name'])
-                
-                # Get source info
-                source = "<unknown>"
-                if frame['ip']:
-                    source_info = frame['ip'].dereference()['source_file']
-                    if source_info:
-                        source = self.get_qstr(source_info)
-                        line_no = int(source_info['line_number'])
-                        source = f"{source}:{line_no}"
-                
-                backtrace.append(f"{fun_name} at {source}")
-                frame = frame['back']
+            for frame in self.python_frames():
+                try:
+                    # Frames reused from the previous stop keep their resolved location
+                    loc = frame.get("location")
+                    if loc is None:
+                        loc = frame["location"] = self.frame_location(frame)
+                    backtrace.append(f"{loc['function']} at {loc['file']}:{loc['line']}")
+                except Exception:
+                    backtrace.append(f"<unknown> at <unknown> (code_state {frame['code_state']:#x})")
         except Exception as e:
             print(f"Error getting backtrace: {e}")
         
         return backtrace
 
-    def get_exception_info(self) -> Dict[str, Any]:
-        """Get information about the current exception"""
+    def current_exception(self) -> Optional[int]:
+        """Address of the exception being raised or pending, if any"""
         try:
-            state = self.get_mp_state()
-            if not state:
-                return None
-            
-            exc = state["thread"]["state"]["exc_state"]["cur_exception"]
+            # Stopped in mp_raise: the exception is its argument
+            exc = int(gdb.selected_frame().read_var("exc"))
+            if exc:
+                return exc
+        except (gdb.error, ValueError, RuntimeError):
+            pass
+        try:
+            exc = int(gdb.parse_and_eval("mp_state_ctx.thread.mp_pending_exception"))
+            return exc or None
+        except gdb.error:
+            return None
+
+    def get_exception_info(self) -> Optional["ExceptionSnapshot"]:
+        """Get information about the current exception
+
+        Returns a lazy ExceptionSnapshot: only the exception's type pointer
+        is read here, and recording it in history reads nothing more. The
+        rest is read when first accessed.
+        """
+        try:
+            exc = self.current_exception()
             if not exc:
                 return None
             
-            # Get exception details
-            exc_type = self.get_obj_type(exc)
-            exc_value = self.format_mp_obj(exc)
-            traceback = self.get_exception_traceback(exc)
-            
-            # Get exception attributes
-            attributes = self.get_exception_attributes(exc)
-            
-            # Get local variables at exception point
-            locals_dict = self.get_locals()
-            
-            # Create exception info dictionary
-            exception_info = {
-                "type": exc_type,
-                "value": exc_value,
-                "traceback": traceback,
-                "attributes": attributes,
-                "locals": locals_dict,
-                "address": str(exc.address)
-            }
+            exception_info = ExceptionSnapshot(self, exc)
             
             # Store in history
             self.add_to_exception_history(exception_info)
@@ -282,58 +1616,128 @@ class MicroPythonHelper:
             print(f"Error getting exception info: {e}")
             return None
 
-    def get_exception_traceback(self, exc_obj: gdb.Value) -> List[str]:
-        """Get the traceback for an exception"""
+    def get_exception_traceback(self, exc_obj) -> List[str]:
+        """Get the traceback for an exception
+
+        The exception records (file, line, block) qstr/int triples as it
+        propagates, innermost first; they are returned outermost first.
+        """
         frames = []
         try:
-            frame = exc_obj["traceback"]
-            while frame:
-                file_name = self.get_qstr(frame["file"])
-                line_num = int(frame["line"])
-                frames.append(f"  File \"{file_name}\", line {line_num}")
-                frame = frame["next"]
+            exc = self.cast_obj(self.obj_addr(exc_obj), 'mp_obj_exception_t')
+            n = int(exc["traceback_len"])
+            data = int(exc["traceback_data"])
+            if n and data:
+                words = struct.unpack(f"<{n}" + ("I" if gdb.lookup_type("size_t").sizeof == 4 else "Q"),
+                                      self.mem.read(data, n * gdb.lookup_type("size_t").sizeof))
+                for i in range(n - 3, -1, -3):
+                    file_name = self.get_qstr(words[i])
+                    block = self.get_qstr(words[i + 2])
+                    frames.append(f"  File \"{file_name}\", line {words[i + 1]}, in {block}")
         except:
             frames.append("<error getting traceback>")
         return frames
 
-    def get_exception_attributes(self, exc_obj: gdb.Value) -> Dict[str, str]:
+    def get_exception_attributes(self, exc_obj) -> Dict[str, str]:
         """Get attributes of an exception object"""
         attributes = {}
         try:
+            addr = self.obj_addr(exc_obj)
             # Get the exception args
-            args_obj = exc_obj["args"]
+            args_obj = int(self.cast_obj(addr, 'mp_obj_exception_t')["args"])
             if args_obj:
                 attributes["args"] = self.format_mp_obj(args_obj)
-            
-            # Try to get common exception attributes
-            common_attrs = ["message", "errno", "strerror", "filename", "lineno", "offset", "text"]
-            for attr in common_attrs:
-                try:
-                    # This is a simplification - in reality, we'd need to search the exception's
-                    # locals dictionary for these attributes
-                    attr_val = exc_obj[attr]
-                    if attr_val:
-                        attributes[attr] = self.format_mp_obj(attr_val)
-                except:
-                    pass
+                # OSError(errno, strerror) keeps errno as the first argument
+                if self.get_obj_type(addr) == "OSError" and int(self.cast_obj(args_obj, 'mp_obj_tuple_t')['len']):
+                    items = args_obj + self.field_offset('mp_obj_tuple_t', 'items')
+                    attributes["errno"] = self.format_mp_obj(self.read_words(items, 1)[0])
         except:
             pass
         
         return attributes
 
-    def add_to_exception_history(self, exception_info: Dict[str, Any]) -> None:
-        """Add exception to history"""
-        # Check if this exception is already in history (by address)
-        for exc in self.exception_history:
-            if exc.get("address") == exception_info.get("address"):
-                return
-        
-        # Add to history
-        self.exception_history.append(exception_info)
-        
-        # Trim history if needed
-        if len(self.exception_history) > self.max_history:
-            self.exception_history.pop(0)
+    # Longest exception message kept in a history entry
+    HISTORY_VALUE_CHARS = 200
+
+    def add_to_exception_history(self, exception_info: "ExceptionSnapshot") -> None:
+        """Add a compact record of the exception to history
+
+        Only what the snapshot already holds is recorded: the address, type
+        and stop. The message and local words are filled in when the
+        snapshot reads them or the entry is viewed, see expand_history_entry.
+        """
+        exception_info.history_entry = self.exception_history.add({
+            "address": exception_info.addr,
+            "type_addr": exception_info.type_addr,
+            "type": exception_info["type"],
+            "stop_id": exception_info.stop_id,
+            "timestamp": exception_info["timestamp"],
+        })
+
+    def record_history_value(self, entry: Dict[str, Any], value: str) -> str:
+        """Keep a (truncated) exception message in a history entry"""
+        if len(value) > self.HISTORY_VALUE_CHARS:
+            value = value[:self.HISTORY_VALUE_CHARS] + "..."
+        entry["value"] = value
+        return value
+
+    def history_entry_value(self, entry: Dict[str, Any], valid: Optional[bool] = None) -> str:
+        """The exception message of a history entry, read on first use"""
+        if "value" in entry:
+            return entry["value"]
+        if not (self.history_object_valid(entry) if valid is None else valid):
+            return "<unavailable: object freed>"
+        return self.record_history_value(entry, str(self.format_mp_obj(entry["address"])))
+
+    def history_object_valid(self, entry: Dict[str, Any]) -> bool:
+        """Whether the exception object of a history entry can still be read
+
+        Always at the stop it was recorded at; after that only while its
+        memory still holds an object of the recorded type, since it may
+        have been collected and reused.
+        """
+        if entry["stop_id"] == self.stop_id:
+            return True
+        try:
+            return self.read_words(entry["address"], 1)[0] == entry["type_addr"]
+        except Exception:
+            return False
+
+    def expand_history_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Full exception info for a history entry, formatted now
+
+        The traceback and attributes are read from the exception object and
+        the locals rendered from the words captured at the raise (read now
+        when still at that stop); objects they point to show their current
+        contents.
+        """
+        addr = entry["address"]
+        valid = self.history_object_valid(entry)
+        exc_info = {
+            "type": entry["type"],
+            "value": self.history_entry_value(entry, valid),
+            "address": f"{addr:#x}",
+            "timestamp": entry["timestamp"],
+            "count": entry["count"],
+            "traceback": [],
+            "attributes": {},
+        }
+        if valid:
+            exc_info["traceback"] = self.get_exception_traceback(addr)
+            exc_info["attributes"] = self.get_exception_attributes(addr)
+        if "local_words" not in entry and entry["stop_id"] == self.stop_id:
+            try:
+                entry["local_words"] = self.current_local_words()
+            except Exception:
+                entry["local_words"] = []
+        locals_dict = {}
+        for name, word in entry.get("local_words", []):
+            try:
+                locals_dict[name] = self.format_mp_obj(word)
+            except Exception:
+                locals_dict[name] = f"<{word:#x}>"
+        exc_info["locals"] = locals_dict
+        return exc_info
 
     def format_exception_display(self, exc_info: Dict[str, Any], detailed: bool = False) -> str:
         """Format exception information for display with colors and structure"""
@@ -379,20 +1783,358 @@ class MicroPythonHelper:
         # Combine all sections
         return f"{header}: {value}\n{traceback_header}\n" + "\n".join(traceback_lines) + attributes_section + locals_section
 
-    def navigate_exception_history(self, index: int = -1) -> Dict[str, Any]:
-        """Navigate through exception history"""
-        if not self.exception_history:
-            return None
-        
-        # Ensure index is within bounds
-        if index < -len(self.exception_history) or index >= len(self.exception_history):
-            index = -1  # Default to most recent
-        
-        # Convert negative indices
-        if index < 0:
-            index = len(self.exception_history) + index
+    def navigate_exception_history(self, index: int = -1) -> Dict[str, Any]:
+        """Navigate through exception history"""
+        if not self.exception_history:
+            return None
+        
+        # Ensure index is within bounds
+        if index < -len(self.exception_history) or index >= len(self.exception_history):
+            index = -1  # Default to most recent
+        
+        # Convert negative indices
+        if index < 0:
+            index = len(self.exception_history) + index
+        
+        return self.expand_history_entry(self.exception_history[index])
+
+MicroPythonHelper.DECODERS = {
+    "str": MicroPythonHelper._format_str,
+    "int": MicroPythonHelper._format_int,
+    "float": MicroPythonHelper._format_float,
+    "sequence": MicroPythonHelper._format_sequence,
+    "dict": MicroPythonHelper._format_dict,
+    "exception": MicroPythonHelper._format_exception,
+    "none": MicroPythonHelper._format_none,
+}
+
+class ExceptionSnapshot:
+    """An exception seen at a stop, read lazily
+
+    Taking the snapshot reads only the exception's type; the value,
+    traceback, attributes and locals are read and formatted the first
+    time they are accessed and then kept. Supports the dict-style access
+    (info['type'], info.get('locals')) callers of get_exception_info use.
+    Fields not read before the target resumed are reported as unavailable.
+    The message and raw locals read at the stop are also kept in the
+    snapshot's history entry.
+    """
+
+    LAZY_FIELDS = ("value", "traceback", "attributes", "locals")
+    UNAVAILABLE = {"value": "<unavailable: target resumed>", "traceback": [], "attributes": {}, "locals": {}}
+
+    def __init__(self, mpy: MicroPythonHelper, addr: int):
+        self.mpy = mpy
+        self.addr = addr
+        self.stop_id = mpy.stop_id
+        self.history_entry: Optional[Dict[str, Any]] = None
+        try:
+            self.type_addr = mpy.read_words(addr, 1)[0]
+            type_name = mpy.get_type_info(self.type_addr)[0] if self.type_addr else "<unknown>"
+        except Exception:
+            self.type_addr = 0
+            type_name = "<unknown>"
+        self.fields: Dict[str, Any] = {
+            "type": type_name,
+            "address": f"{addr:#x}",
+            "timestamp": datetime.now().isoformat(),
+        }
+
+    def _load(self, key: str) -> Any:
+        if self.mpy.stop_id != self.stop_id:
+            return self.UNAVAILABLE[key]
+        if key == "value":
+            value = self.mpy.format_mp_obj(self.addr)
+            if self.recording():
+                self.mpy.record_history_value(self.history_entry, str(value))
+            return value
+        if key == "traceback":
+            return self.mpy.get_exception_traceback(self.addr)
+        if key == "attributes":
+            return self.mpy.get_exception_attributes(self.addr)
+        if not self.recording():
+            return self.mpy.get_locals()
+        try:
+            local_words = self.mpy.current_local_words()
+        except Exception as e:
+            print(f"Error getting locals: {e}")
+            local_words = []
+        self.history_entry.setdefault("local_words", local_words)
+        return self.mpy.get_locals(local_words)
+
+    def recording(self) -> bool:
+        """Whether fields read now belong in the snapshot's history entry"""
+        return self.history_entry is not None and self.history_entry["stop_id"] == self.stop_id
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.fields:
+            if key not in self.LAZY_FIELDS:
+                raise KeyError(key)
+            self.fields[key] = self._load(key)
+        return self.fields[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.fields[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.fields or key in self.LAZY_FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def loaded(self, key: str) -> bool:
+        """Whether a field has been read already"""
+        return key in self.fields
+
+    def to_dict(self, keys=None) -> Dict[str, Any]:
+        """Plain dict of the given fields (all of them by default), loading as needed"""
+        if keys is None:
+            keys = list(self.fields) + [k for k in self.LAZY_FIELDS if k not in self.fields]
+        return {k: self[k] for k in keys}
+
+class PythonProfiler:
+    """Sampling profiler for Python code running on the target
+
+    The target is continued in the background and interrupted from a timer
+    at the sampling rate. Each stop records only the fun_bc addresses of the
+    Python frame chain; names are resolved once per code object when the
+    profile is written, so a sample costs a few word reads.
+    """
+
+    def __init__(self, mpy: MicroPythonHelper):
+        self.mpy = mpy
+        self.samples: Counter = Counter()
+        self.running = False
+        self.interval = 0.01
+        self.deadline: Optional[float] = None
+        self.output = "profile.folded"
+        self.started: Optional[datetime] = None
+        self.errors = 0
+        self.timer: Optional[threading.Timer] = None
+        self.interrupting = False
+        self.finishing = False
+
+    def start(self, rate_hz: float, duration: Optional[float], output: str) -> None:
+        self.samples.clear()
+        self.errors = 0
+        self.interval = 1.0 / rate_hz
+        self.output = output
+        self.started = datetime.now()
+        self.deadline = None if duration is None else self.started.timestamp() + duration
+        self.running = True
+        self.finishing = False
+        gdb.events.stop.connect(self.on_stop)
+        try:
+            self.resume()
+        except gdb.error:
+            self.running = False
+            gdb.events.stop.disconnect(self.on_stop)
+            raise
+
+    def resume(self) -> None:
+        """Continue the target and schedule the next sample"""
+        if not self.running:
+            return
+        self.interrupting = False
+        gdb.execute("continue &")
+        self.timer = threading.Timer(self.interval, lambda: gdb.post_event(self.interrupt))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def interrupt(self) -> None:
+        if self.running and not self.interrupting:
+            self.interrupting = True
+            gdb.execute("interrupt")
+
+    def request_stop(self) -> None:
+        """Stop sampling; the profile is written once the target has halted"""
+        if not self.running:
+            return
+        self.finishing = True
+        if self.timer is not None:
+            self.timer.cancel()
+        if gdb.selected_thread() is not None and gdb.selected_thread().is_running():
+            self.interrupt()
+        else:
+            self.finish()
+
+    def on_stop(self, event) -> None:
+        if not self.running:
+            return
+        ours = self.interrupting and isinstance(event, gdb.SignalEvent) and event.stop_signal == "SIGINT"
+        if not ours:
+            # Breakpoint or fault: leave the target stopped for the user
+            print(Colors.colorize("Target stopped outside the profiler; writing profile", Colors.YELLOW))
+            self.finish()
+            return
+        self.sample()
+        if self.finishing or (self.deadline is not None and datetime.now().timestamp() >= self.deadline):
+            self.finish()
+        else:
+            gdb.post_event(self.resume)
+
+    def sample(self) -> None:
+        try:
+            stack = tuple(f["fun_bc"] for f in self.mpy.python_frames())
+            if not stack:
+                frame = gdb.newest_frame()
+                stack = (f"[{frame.name() or '??'}]",)
+        except Exception:
+            self.errors += 1
+            return
+        self.samples[stack] += 1
+
+    def finish(self) -> None:
+        self.running = False
+        if self.timer is not None:
+            self.timer.cancel()
+        gdb.events.stop.disconnect(self.on_stop)
+        try:
+            lines = self.folded_stacks()
+            with open(self.output, "w") as f:
+                f.write("\n".join(lines) + ("\n" if lines else ""))
+            total = sum(self.samples.values())
+            print(Colors.colorize(f"Profile written to {self.output}: {total} samples, "
+                                  f"{len(lines)} distinct stacks", Colors.GREEN))
+        except OSError as e:
+            print(Colors.colorize(f"Error writing profile: {e}", Colors.RED))
+
+    def frame_label(self, entry) -> str:
+        if isinstance(entry, str):
+            return entry
+        try:
+            info = self.mpy.code_info(entry)
+            return f"{info['file']}:{info['name']}"
+        except Exception:
+            return f"<code @{entry:#x}>"
+
+    def folded_stacks(self) -> List[str]:
+        """Samples as 'outer;...;inner count' lines, the format flamegraph tools read"""
+        labels: Dict[Any, str] = {}
+        folded: Counter = Counter()
+        for stack, count in self.samples.items():
+            names = []
+            for entry in reversed(stack):
+                if entry not in labels:
+                    labels[entry] = self.frame_label(entry)
+                names.append(labels[entry].replace(";", ":"))
+            folded[";".join(names)] += count
+        return [f"{stack} {count}" for stack, count in folded.most_common()]
+
+class _CallEntry(gdb.Breakpoint):
+    """Stepping breakpoint on entry to any Python function"""
+
+    def __init__(self):
+        super().__init__("mp_execute_bytecode", internal=True)
+        self.fired = False
+
+    def stop(self) -> bool:
+        self.fired = True
+        return True
+
+class _FrameReturn(gdb.FinishBreakpoint):
+    """Stepping breakpoint on return from one Python frame's mp_execute_bytecode"""
+
+    def __init__(self, frame: gdb.Frame):
+        super().__init__(frame, internal=True)
+        self.fired = False
+
+    def stop(self) -> bool:
+        self.fired = True
+        return True
+
+    def out_of_scope(self) -> None:
+        pass
+
+class PythonStepper:
+    """Python-level stepping with temporary breakpoints
+
+    The VM executes bytecode, so a Python line has no code address to break
+    on. Instead the first opcode of every line of the current function gets
+    a read watchpoint, conditioned on the frame's code_state, and fires when
+    the VM fetches it. Calls are caught on mp_execute_bytecode entry and
+    returns with a finish breakpoint on the frame's mp_execute_bytecode.
+    The target runs at full speed in between, so a step is a handful of
+    stops however much C code the line runs.
+    """
+
+    def __init__(self, mpy: MicroPythonHelper):
+        self.mpy = mpy
+        self.watches: List[gdb.Breakpoint] = []
+        self.entry: Optional[_CallEntry] = None
+        self.ret: Optional[_FrameReturn] = None
+
+    def arm(self, mode: str, top: Dict[str, int]) -> None:
+        if mode != "finish":
+            for addr in self.mpy.line_starts(top["fun_bc"]):
+                if addr == top["ip"]:
+                    continue  # about to be fetched: would fire without progress
+                wp = gdb.Breakpoint(f"*(const unsigned char *){addr:#x}", gdb.BP_WATCHPOINT,
+                                    gdb.WP_READ, internal=True)
+                wp.condition = f"code_state == (void *){top['code_state']:#x}"
+                self.watches.append(wp)
+        if mode == "step":
+            self.entry = _CallEntry()
+        c_frame = self.mpy.bytecode_c_frame(top["code_state"])
+        if c_frame is not None:
+            self.ret = _FrameReturn(c_frame)
+
+    def disarm(self) -> str:
+        """Delete the stepping breakpoints and say which one stopped the target"""
+        fired = "other"
+        if self.ret is not None and self.ret.fired:
+            fired = "return"
+        elif self.entry is not None and self.entry.fired:
+            fired = "call"
+        elif any(wp.is_valid() and wp.hit_count for wp in self.watches):
+            fired = "line"
+        for bp in self.watches + [self.entry, self.ret]:
+            if bp is not None and bp.is_valid():
+                bp.delete()
+        self.watches = []
+        self.entry = None
+        self.ret = None
+        return fired
+
+    def run(self, mode: str) -> str:
+        """Resume until the next line (step, next) or the frame's return (finish)
+
+        Returns what stopped the target: line, call, return or other.
+        """
+        fired = "other"
+        output = ""
+        for _ in range(self.mpy.MAX_PY_FRAMES):
+            frames = self.mpy.python_frames(limit=1)
+            if not frames:
+                print(Colors.colorize("No Python frame to step in", Colors.YELLOW))
+                return "other"
+            try:
+                self.arm(mode, frames[0])
+                output = gdb.execute("continue", to_string=True)
+            finally:
+                fired = self.disarm()
+            if fired != "return" or mode == "finish":
+                break
+            # Left the frame without reaching another line: keep stepping in the caller
         
-        return self.exception_history[index]
+        if fired == "other":
+            # Stopped for another reason (breakpoint, signal): show GDB's report
+            print(output, end="")
+        self.report(fired)
+        return fired
+
+    def report(self, fired: str) -> None:
+        frames = self.mpy.python_frames(limit=1)
+        if not frames:
+            print("Not in Python code")
+            return
+        loc = self.mpy.frame_location(frames[0])
+        prefix = {"call": "Entered ", "return": "Returned to "}.get(fired, "")
+        print(f"{prefix}{Colors.colorize(loc['function'], Colors.CYAN)} at "
+              f"{Colors.colorize(loc['file'], Colors.GREEN)}:{Colors.colorize(str(loc['line']), Colors.MAGENTA)}")
 
 class MPLocalsCommand(gdb.Command):
     """Print local variables in current Python frame"""
@@ -439,6 +2181,148 @@ class MPBacktraceCommand(gdb.Command):
         else:
             print("No Python backtrace available")
 
+def lookup_type_object(exc_type: str) -> Optional[int]:
+    """Address of the mp_type_<name> object, or None for classes defined in Python"""
+    symbol = f"mp_type_{exc_type}"
+    sym = gdb.lookup_global_symbol(symbol) or gdb.lookup_static_symbol(symbol)
+    return int(sym.value().address) if sym is not None else None
+
+# Raise with no NLR handler at all, not even the REPL's: it ends in nlr_jump_fail
+UNCAUGHT_CONDITION = "mp_state_ctx.thread.nlr_top == 0"
+
+class ExceptionCatchpoint(gdb.Breakpoint):
+    """mp_raise breakpoint with subclass matching and stop thresholds
+
+    Used when the type test cannot be a plain breakpoint condition: the
+    first raise of each exception type walks its MRO and the verdict is
+    cached by type address, so later raises cost one read of the type
+    pointer. Ignore and every-Nth thresholds count matching raises only.
+    """
+
+    def __init__(self, mpy: MicroPythonHelper, exc_type: str, uncaught: bool,
+                 subclasses: bool, ignore: int, every: int):
+        super().__init__("mp_raise", internal=True)
+        self.mpy = mpy
+        self.exc_type = exc_type
+        self.type_addr = lookup_type_object(exc_type)
+        self.uncaught = uncaught
+        self.subclasses = subclasses
+        self.ignore = ignore
+        self.every = max(every, 1)
+        self.matched = 0
+        self.verdicts: Dict[int, bool] = {}
+        self.warned = False
+
+    def matches(self, type_addr: int) -> bool:
+        verdict = self.verdicts.get(type_addr)
+        if verdict is None:
+            mro = self.mpy.type_mro(type_addr) if self.subclasses else [type_addr]
+            if self.type_addr is not None:
+                verdict = self.type_addr in mro
+            else:
+                # Classes defined in Python have no symbol and are matched by name
+                verdict = any(self.mpy.get_type_info(t)[0] == self.exc_type for t in mro)
+            self.verdicts[type_addr] = verdict
+        return verdict
+
+    def stop(self) -> bool:
+        try:
+            exc = int(gdb.selected_frame().read_var("exc"))
+            if self.mpy.decode_word(exc)[0] != "ptr" or not self.matches(self.mpy.read_words(exc, 1)[0]):
+                return False
+            if self.uncaught and not bool(gdb.parse_and_eval(UNCAUGHT_CONDITION)):
+                return False
+        except Exception as e:
+            # Stopping on every raise would hide the catchpoint's filters
+            if not self.warned:
+                print(Colors.colorize(f"mpy-catch {self.exc_type}: cannot check raise, not stopping: {e}",
+                                      Colors.RED))
+                self.warned = True
+            return False
+        self.matched += 1
+        if self.matched <= self.ignore:
+            return False
+        return (self.matched - self.ignore - 1) % self.every == 0
+
+def install_exception_catchpoint(mpy: MicroPythonHelper, exc_type: str, uncaught: bool = False,
+                                 subclasses: bool = False, ignore: int = 0, every: int = 1) -> gdb.Breakpoint:
+    """Break on raises of exc_type without calling into the target
+
+    An exact match on a builtin type is a pointer compare against the
+    address of mp_type_<X>, resolved here once, set as an ordinary
+    breakpoint condition that GDB evaluates without Python. Subclass
+    matching, Python-defined classes and every-Nth stops need
+    ExceptionCatchpoint.
+    """
+    type_addr = lookup_type_object(exc_type)
+    if type_addr is None or subclasses or every > 1:
+        return ExceptionCatchpoint(mpy, exc_type, uncaught, subclasses, ignore, every)
+    bp = gdb.Breakpoint("mp_raise", internal=True)
+    bp.condition = f"*(void **)exc == (void *){type_addr:#x}"
+    if uncaught:
+        bp.condition += f" && {UNCAUGHT_CONDITION}"
+    bp.ignore_count = ignore
+    return bp
+
+class ExceptionTracepoint(gdb.Breakpoint):
+    """mp_raise breakpoint that records raises and never stops the target
+
+    A raise costs the read of the exception's type pointer and of the
+    innermost Python frame. Type names and source lines are resolved the
+    first time a (type, frame, ip) combination is seen; after that a
+    raise only bumps a counter in the (type, file, line) aggregate.
+    """
+
+    def __init__(self, mpy: MicroPythonHelper, type_filter: Optional[str] = None):
+        super().__init__("mp_raise", internal=True)
+        self.mpy = mpy
+        self.type_filter = type_filter
+        # (type address, fun_bc, ip) -> resolved (type, file, line, function) key
+        self.resolved: Dict[tuple, tuple] = {}
+        # resolved key -> [count, first seen, last seen]
+        self.stats: Dict[tuple, list] = {}
+        self.total = 0
+        self.errors = 0
+
+    def stop(self) -> bool:
+        try:
+            exc = int(gdb.selected_frame().read_var("exc"))
+            type_addr = self.mpy.read_words(exc, 1)[0] if self.mpy.decode_word(exc)[0] == "ptr" else 0
+            frames = self.mpy.python_frames(limit=1)
+            fun_bc, ip = (frames[0]["fun_bc"], frames[0]["ip"]) if frames else (0, 0)
+            raw = (type_addr, fun_bc, ip)
+            key = self.resolved.get(raw)
+            if key is None:
+                key = self.resolve(raw)
+                self.resolved[raw] = key
+            if self.type_filter is not None and key[0] != self.type_filter:
+                return False
+            now = datetime.now()
+            entry = self.stats.get(key)
+            if entry is None:
+                self.stats[key] = [1, now, now]
+            else:
+                entry[0] += 1
+                entry[2] = now
+            self.total += 1
+        except Exception:
+            self.errors += 1
+        return False
+
+    def resolve(self, raw: tuple) -> tuple:
+        type_addr, fun_bc, ip = raw
+        type_name = self.mpy.get_type_info(type_addr)[0] if type_addr else "<unknown>"
+        if not fun_bc:
+            return (type_name, "<native>", 0, "")
+        loc = self.mpy.frame_location({"fun_bc": fun_bc, "ip": ip})
+        return (type_name, loc["file"], loc["line"], loc["function"])
+
+    def reset(self) -> None:
+        self.stats.clear()
+        self.resolved.clear()
+        self.total = 0
+        self.errors = 0
+
 class MPCatchCommand(gdb.Command):
     """Configure exception catching and breakpoints"""
     
@@ -449,24 +2333,94 @@ class MPCatchCommand(gdb.Command):
     def invoke(self, arg: str, from_tty: bool) -> None:
         args = arg.split()
         if not args:
-            print("Usage: mpy-catch <exception_type> [all|uncaught]")
+            print("Usage: mpy-catch <exception_type> [all|uncaught] [-s|--subclasses] [--ignore N] [--every N]")
             return
         
         exc_type = args[0]
-        catch_type = args[1] if len(args) > 1 else "uncaught"
+        catch_type = args[1] if len(args) > 1 and args[1] in ("all", "uncaught") else "all"
+        subclasses = "-s" in args or "--subclasses" in args
+        ignore, every = 0, 1
+        for i, a in enumerate(args):
+            if a in ("--ignore", "--every") and i + 1 < len(args) and args[i + 1].isdigit():
+                if a == "--ignore":
+                    ignore = int(args[i + 1])
+                else:
+                    every = int(args[i + 1])
         
         # Set breakpoint on exception handling
         try:
-            bp = gdb.Breakpoint("mp_raise", internal=True)
-            bp.condition = f"mp_obj_get_type(exc) == mp_type_{exc_type}"
-            if catch_type == "uncaught":
-                bp.condition += " && !mp_state_ctx.thread.state.exc_state.handler"
-            
+            old = self.mpy.exception_breakpoints.pop(exc_type, None)
+            if old is not None and old.is_valid():
+                old.delete()
+            bp = install_exception_catchpoint(self.mpy, exc_type, catch_type == "uncaught", subclasses, ignore, every)
             self.mpy.exception_breakpoints[exc_type] = bp
-            print(Colors.colorize(f"Will break on {catch_type} {exc_type} exceptions", Colors.GREEN))
+            
+            what = f"{exc_type} (and subclasses)" if subclasses else exc_type
+            extra = ""
+            if ignore:
+                extra += f", ignoring the first {ignore}"
+            if every > 1:
+                extra += f", stopping on every {every}th"
+            print(Colors.colorize(f"Will break on {catch_type} {what} exceptions{extra}", Colors.GREEN))
         except Exception as e:
             print(Colors.colorize(f"Error setting exception breakpoint: {e}", Colors.RED))
 
+class MPExceptTraceCommand(gdb.Command):
+    """Count raised exceptions by type and location without stopping"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-except-trace", gdb.COMMAND_USER)
+        self.mpy = mpy
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        args = arg.split()
+        if not args or args[0] not in ("start", "stop", "dump", "reset"):
+            print("Usage: mpy-except-trace start [type] | stop | dump [-n N] | reset")
+            return
+        tp = self.mpy.exception_tracepoint
+        
+        if args[0] == "start":
+            if tp is not None and tp.is_valid():
+                tp.delete()
+            try:
+                self.mpy.exception_tracepoint = ExceptionTracepoint(self.mpy, args[1] if len(args) > 1 else None)
+            except Exception as e:
+                print(Colors.colorize(f"Error setting exception tracepoint: {e}", Colors.RED))
+                return
+            what = args[1] if len(args) > 1 else "all"
+            print(Colors.colorize(f"Tracing {what} exceptions (target will not stop)", Colors.GREEN))
+            return
+        
+        if tp is None:
+            print(Colors.colorize("Exception tracing has not been started", Colors.YELLOW))
+            return
+        
+        if args[0] == "stop":
+            if tp.is_valid():
+                tp.delete()
+            print(f"Exception tracing stopped after {tp.total} raises; 'mpy-except-trace dump' shows them")
+        elif args[0] == "reset":
+            tp.reset()
+            print("Exception trace statistics reset")
+        else:
+            top = None
+            for i, a in enumerate(args):
+                if a == "-n" and i + 1 < len(args) and args[i + 1].isdigit():
+                    top = int(args[i + 1])
+            self.dump(tp, top)
+    
+    def dump(self, tp: ExceptionTracepoint, top: Optional[int]) -> None:
+        print(Colors.colorize(f"Exceptions raised: {tp.total} ({len(tp.stats)} distinct sites"
+                              f"{f', {tp.errors} unreadable' if tp.errors else ''})", Colors.CYAN, bold=True))
+        ranked = sorted(tp.stats.items(), key=lambda kv: kv[1][0], reverse=True)
+        print(f"  {'count':>8}  {'type':<20} {'location':<36} first / last seen")
+        for (type_name, file_name, line, func), (count, first, last) in ranked[:top]:
+            location = f"{file_name}:{line} ({func})" if func else file_name
+            print(f"  {count:>8}  {Colors.colorize(f'{type_name:<20}', Colors.RED)} {location:<36} "
+                  f"{first.strftime('%H:%M:%S')} / {last.strftime('%H:%M:%S')}")
+        if top is not None and len(ranked) > top:
+            print(f"  ...(+{len(ranked) - top} more)")
+
 class MPExceptInfoCommand(gdb.Command):
     """Show information about the current exception"""
     
@@ -589,7 +2543,8 @@ class MPExceptHistoryCommand(gdb.Command):
         
         print(Colors.colorize("Exception History:", Colors.CYAN, bold=True))
         for i, exc in enumerate(self.mpy.exception_history):
-            print(f"{i}: {Colors.colorize(exc['type'], Colors.RED)}: {Colors.colorize(exc['value'], Colors.YELLOW)}")
+            repeats = f" (x{exc['count']})" if exc.get('count', 1) > 1 else ""
+            print(f"{i}: {Colors.colorize(exc['type'], Colors.RED)}: {Colors.colorize(self.mpy.history_entry_value(exc), Colors.YELLOW)}{repeats}")
 
 class MPExceptVisualizeCommand(gdb.Command):
     """Visualize exception information"""
@@ -644,10 +2599,460 @@ class MPExceptVisualizeCommand(gdb.Command):
         # Close the box
         print("╚" + "═" * (width - 2) + "╝")
 
+class MPLimitParameter(gdb.Parameter):
+    """Rendering limit for MicroPython objects (0 or unlimited disables it)"""
+    
+    def __init__(self, mpy: MicroPythonHelper, name: str, attr: str, what: str):
+        self.mpy = mpy
+        self.attr = attr
+        self.what = what
+        self.set_doc = f"Set the {what} shown when formatting MicroPython objects."
+        self.show_doc = f"Show the {what} shown when formatting MicroPython objects."
+        super().__init__(name, gdb.COMMAND_DATA, gdb.PARAM_ZUINTEGER_UNLIMITED)
+        current = getattr(mpy, attr)
+        self.value = -1 if current is None else current
+    
+    def get_set_string(self) -> str:
+        unlimited = self.value is None or self.value <= 0
+        setattr(self.mpy, self.attr, None if unlimited else int(self.value))
+        self.mpy.clear_format_memo()
+        return ""
+    
+    def get_show_string(self, svalue: str) -> str:
+        return f"The {self.what} shown is {svalue}."
+
+class MPObjReprParameter(gdb.Parameter):
+    """Object representation (MICROPY_OBJ_REPR) used to decode mp_obj_t words"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        self.mpy = mpy
+        self.set_doc = "Set the MicroPython object representation (auto, A, B, C or D)."
+        self.show_doc = "Show the MicroPython object representation."
+        super().__init__("mpy-obj-repr", gdb.COMMAND_DATA, gdb.PARAM_ENUM, ["auto"] + list(ObjectRepr.KINDS))
+        self.value = mpy.obj_repr_setting
+    
+    def get_set_string(self) -> str:
+        self.mpy.obj_repr_setting = self.value
+        self.mpy.obj_repr = None
+        self.mpy.clear_format_memo()
+        return ""
+    
+    def get_show_string(self, svalue: str) -> str:
+        if svalue == "auto" and self.mpy.obj_repr is not None:
+            return f"The object representation is auto (detected REPR_{self.mpy.obj_repr.kind})."
+        return f"The object representation is {svalue}."
+
+class MPHistorySizeParameter(gdb.Parameter):
+    """Number of exceptions kept in the exception history (0 or unlimited keeps all)"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        self.mpy = mpy
+        self.set_doc = "Set the number of exceptions kept in the MicroPython exception history."
+        self.show_doc = "Show the number of exceptions kept in the MicroPython exception history."
+        super().__init__("mpy-history-size", gdb.COMMAND_DATA, gdb.PARAM_ZUINTEGER_UNLIMITED)
+        capacity = mpy.exception_history.capacity
+        self.value = -1 if capacity is None else capacity
+    
+    def get_set_string(self) -> str:
+        unlimited = self.value is None or self.value <= 0
+        self.mpy.exception_history.set_capacity(None if unlimited else int(self.value))
+        return ""
+    
+    def get_show_string(self, svalue: str) -> str:
+        return f"The exception history keeps {svalue} entries."
+
+class MPExpandCommand(gdb.Command):
+    """Expand an elided MicroPython object by address"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-expand", gdb.COMMAND_DATA)
+        self.mpy = mpy
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        args = arg.split()
+        if not args:
+            print("Usage: mpy-expand <address> [start]")
+            return
+        
+        try:
+            addr = int(gdb.parse_and_eval(args[0]))
+            start = int(args[1]) if len(args) > 1 else 0
+        except (gdb.error, ValueError) as e:
+            print(Colors.colorize(f"Invalid argument: {e}", Colors.RED))
+            return
+        
+        print(f"{addr:#x} = {self.mpy.format_mp_obj(addr, start=start)}")
+
+class MPHeapCommand(gdb.Command):
+    """Show a census of the MicroPython GC heap"""
+    
+    MAP_WIDTH = 64
+    MAP_ROWS = 16
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-heap", gdb.COMMAND_DATA)
+        self.mpy = mpy
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        args = arg.split()
+        show_map = "-m" in args or "--map" in args
+        top = 20
+        for i, a in enumerate(args):
+            if a == "-n" and i + 1 < len(args) and args[i + 1].isdigit():
+                top = int(args[i + 1])
+        
+        try:
+            census = self.mpy.heap_census()
+        except Exception as e:
+            print(Colors.colorize(f"Error reading GC heap: {e}", Colors.RED))
+            return
+        
+        bs = census["block_size"]
+        total = census["total_blocks"]
+        used = census["used_blocks"]
+        free = census["free_blocks"]
+        pct = 100.0 * used / total if total else 0.0
+        print(Colors.colorize("GC heap:", Colors.CYAN, bold=True))
+        for area in census["areas"]:
+            print(f"  Area {area['start']:#x}-{area['end']:#x}")
+        print(f"  Blocks:       {total} x {bs} bytes ({total * bs} bytes)")
+        print(f"  Used:         {used} blocks ({used * bs} bytes, {pct:.1f}%)")
+        print(f"  Free:         {free} blocks ({free * bs} bytes)")
+        print(f"  Allocations:  {len(census['allocs'])}")
+        print(f"  Largest free: {census['largest_free']} blocks ({census['largest_free'] * bs} bytes)")
+        
+        print(Colors.colorize("Free runs:", Colors.CYAN, bold=True))
+        for bucket in sorted(census["free_hist"]):
+            label = f"{bucket}" if bucket == 1 else f"{bucket}-{2 * bucket - 1}"
+            print(f"  {label:>11} blocks: {census['free_hist'][bucket]}")
+        
+        print(Colors.colorize("Objects by type:", Colors.CYAN, bold=True))
+        print(f"  {'type':<24} {'count':>8} {'bytes':>10}")
+        ranked = sorted(census["types"].items(), key=lambda kv: kv[1][1], reverse=True)
+        for name, (count, nbytes) in ranked[:top]:
+            print(f"  {name:<24} {count:>8} {nbytes:>10}")
+        if len(ranked) > top:
+            print(f"  ...(+{len(ranked) - top} more)")
+        
+        if show_map:
+            self.print_map(census)
+    
+    def print_map(self, census: Dict[str, Any]) -> None:
+        """One character per group of blocks: ' ' free, '.' partly used, '#' full"""
+        print(Colors.colorize("Fragmentation map:", Colors.CYAN, bold=True))
+        for area in census["areas"]:
+            states = area["states"]
+            cells = self.MAP_WIDTH * self.MAP_ROWS
+            per_cell = max(1, -(-len(states) // cells))
+            print(f"  {area['start']:#x} ({per_cell} blocks per cell)")
+            line = ""
+            for c in range(0, len(states), per_cell):
+                group = states[c:c + per_cell]
+                used = sum(1 for st in group if st != MicroPythonHelper.GC_AT_FREE)
+                line += " " if used == 0 else "#" if used == len(group) else "."
+                if len(line) == self.MAP_WIDTH:
+                    print(f"  |{line}|")
+                    line = ""
+            if line:
+                print(f"  |{line.ljust(self.MAP_WIDTH)}|")
+
+class MPHeapSnapshotCommand(gdb.Command):
+    """Record a named summary of the GC heap for later comparison"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-heap-snapshot", gdb.COMMAND_DATA)
+        self.mpy = mpy
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        args = arg.split()
+        if not args:
+            if not self.mpy.heap_snapshots:
+                print("Usage: mpy-heap-snapshot <name>")
+                return
+            print(Colors.colorize("Heap snapshots:", Colors.CYAN, bold=True))
+            for name, snap in self.mpy.heap_snapshots.items():
+                bs = snap["block_size"]
+                print(f"  {name}: {snap['time']} used {snap['used_blocks'] * bs} bytes "
+                      f"in {snap['allocations']} allocations")
+            return
+        
+        try:
+            census = self.mpy.heap_census(owners=True)
+        except Exception as e:
+            print(Colors.colorize(f"Error reading GC heap: {e}", Colors.RED))
+            return
+        snap = self.mpy.heap_summary(census)
+        self.mpy.heap_snapshots[args[0]] = snap
+        print(Colors.colorize(f"Heap snapshot '{args[0]}' recorded: {snap['used_blocks']} blocks used, "
+                              f"{snap['allocations']} allocations", Colors.GREEN))
+
+class MPHeapDiffCommand(gdb.Command):
+    """Compare two heap snapshots by type and by owning container"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-heap-diff", gdb.COMMAND_DATA)
+        self.mpy = mpy
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        args = arg.split()
+        if len(args) < 2:
+            print("Usage: mpy-heap-diff <a> <b> [-n N]")
+            return
+        top = 20
+        for i, a in enumerate(args):
+            if a == "-n" and i + 1 < len(args) and args[i + 1].isdigit():
+                top = int(args[i + 1])
+        
+        snaps = self.mpy.heap_snapshots
+        for name in args[:2]:
+            if name not in snaps:
+                print(Colors.colorize(f"No heap snapshot named '{name}'", Colors.RED))
+                return
+        a, b = snaps[args[0]], snaps[args[1]]
+        diff = self.mpy.diff_heap_summaries(a, b)
+        bs = b["block_size"]
+        
+        print(Colors.colorize(f"Heap diff {args[0]} -> {args[1]}:", Colors.CYAN, bold=True))
+        print(f"  Used:         {diff['used_blocks']:+d} blocks ({diff['used_blocks'] * bs:+d} bytes)")
+        print(f"  Allocations:  {diff['allocations']:+d}")
+        print(f"  Largest free: {diff['largest_free'][0]} -> {diff['largest_free'][1]} blocks")
+        
+        print(Colors.colorize("Growth by type:", Colors.CYAN, bold=True))
+        print(f"  {'type':<24} {'count':>8} {'bytes':>10}")
+        for name, dcount, dbytes in diff["types"][:top]:
+            print(f"  {name:<24} {dcount:>+8d} {dbytes:>+10d}")
+        if not diff["types"]:
+            print("  (no change)")
+        
+        print(Colors.colorize("Growth by owning container:", Colors.CYAN, bold=True))
+        print(f"  {'owner':<36} {'count':>8} {'bytes':>10}")
+        for owner, name, dcount, dbytes in diff["owners"][:top]:
+            label = name if not owner else f"{name} @{owner:#x}"
+            print(f"  {label:<36} {dcount:>+8d} {dbytes:>+10d}")
+        if not diff["owners"]:
+            print("  (no change)")
+
+class MPProfileCommand(gdb.Command):
+    """Sample Python stacks while the target runs and write folded stacks"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-profile", gdb.COMMAND_RUNNING)
+        self.profiler = PythonProfiler(mpy)
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        args = arg.split()
+        profiler = self.profiler
+        if not args or args[0] not in ("start", "stop", "status"):
+            print("Usage: mpy-profile start [-r HZ] [-d SECONDS] [-o FILE] | stop | status")
+            return
+        
+        if args[0] == "status":
+            state = "running" if profiler.running else "idle"
+            print(f"Profiler {state}: {sum(profiler.samples.values())} samples, "
+                  f"{len(profiler.samples)} distinct stacks, {profiler.errors} failed samples")
+            return
+        
+        if args[0] == "stop":
+            if not profiler.running:
+                print(Colors.colorize("Profiler is not running", Colors.YELLOW))
+                return
+            profiler.request_stop()
+            return
+        
+        if profiler.running:
+            print(Colors.colorize("Profiler is already running", Colors.YELLOW))
+            return
+        rate, duration, output = 100.0, None, "profile.folded"
+        try:
+            for i, a in enumerate(args):
+                if i + 1 >= len(args):
+                    break
+                if a == "-r":
+                    rate = float(args[i + 1])
+                elif a == "-d":
+                    duration = float(args[i + 1])
+                elif a == "-o":
+                    output = args[i + 1]
+        except ValueError as e:
+            print(Colors.colorize(f"Invalid argument: {e}", Colors.RED))
+            return
+        if rate <= 0:
+            print(Colors.colorize("Sampling rate must be positive", Colors.RED))
+            return
+        
+        until = f" for {duration:g}s" if duration is not None else " until 'mpy-profile stop'"
+        print(Colors.colorize(f"Profiling at {rate:g} Hz{until}, writing {output}", Colors.GREEN))
+        try:
+            profiler.start(rate, duration, output)
+        except gdb.error as e:
+            print(Colors.colorize(f"Error starting profiler: {e}", Colors.RED))
+
+class MPStepCommand(gdb.Command):
+    """Step Python code: mpy-step (into calls), mpy-next (over calls), mpy-finish (out of the frame)"""
+    
+    def __init__(self, stepper: PythonStepper, name: str, mode: str):
+        super().__init__(name, gdb.COMMAND_RUNNING)
+        self.stepper = stepper
+        self.name = name
+        self.mode = mode
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        count = 1
+        if arg.strip():
+            if not arg.strip().isdigit():
+                print(f"Usage: {self.name} [count]")
+                return
+            count = int(arg.strip())
+        try:
+            for _ in range(count):
+                if self.stepper.run(self.mode) == "other":
+                    break
+        except gdb.error as e:
+            print(Colors.colorize(f"Error stepping: {e}", Colors.RED))
+
+class MPCacheStatsCommand(gdb.Command):
+    """Show target memory and qstr cache statistics"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-cache-stats", gdb.COMMAND_USER)
+        self.mpy = mpy
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        mem = self.mpy.mem
+        if arg.strip() == "reset":
+            mem.reset_stats()
+            print("Cache statistics reset")
+            return
+        
+        lookups = mem.hits + mem.misses
+        hit_rate = 100.0 * mem.hits / lookups if lookups else 0.0
+        print(Colors.colorize("Target memory cache:", Colors.CYAN, bold=True))
+        print(f"  Page size:      {mem.PAGE_SIZE} bytes")
+        print(f"  Cached pages:   {len(mem.pages)}")
+        print(f"  Page hits:      {mem.hits}")
+        print(f"  Page misses:    {mem.misses} ({hit_rate:.1f}% hit rate)")
+        print(f"  Read requests:  {mem.requests}")
+        print(f"  Bytes fetched:  {mem.bytes_fetched}")
+        print(f"  Flushes:        {mem.flushes}")
+        print(Colors.colorize("QSTR cache:", Colors.CYAN, bold=True))
+        print(f"  Resolved qstrs: {len(self.mpy.qstrs.strings)}")
+        print(f"  Static index:   {self.mpy.qstrs.index_path or 'not loaded'}")
+        print(Colors.colorize("Code objects:", Colors.CYAN, bold=True))
+        print(f"  Decoded:        {len(self.mpy.code_infos)}")
+        print(f"  Frames reused:  {self.mpy.frames_reused}")
+
+class MPResetCommand(gdb.Command):
+    """Delete helper breakpoints and forget exception history and caches"""
+    
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("mpy-reset", gdb.COMMAND_USER)
+        self.mpy = mpy
+    
+    def invoke(self, arg: str, from_tty: bool) -> None:
+        self.mpy.reset()
+        print("MicroPython helper state reset")
+
+class MpObjPrinter:
+    """Pretty-printer for an mp_obj_t word or a MicroPython object struct"""
+
+    def __init__(self, mpy: MicroPythonHelper, addr: int):
+        self.mpy = mpy
+        self.addr = addr
+
+    def to_string(self) -> str:
+        try:
+            return self.mpy.format_mp_obj(self.addr)
+        except Exception:
+            return f"<mp_obj_t {self.addr:#x}>"
+
+class MpContainerPrinter(MpObjPrinter):
+    """Pretty-printer for list, tuple and dict objects
+
+    children() is a generator that reads the items a page at a time as
+    GDB (or an IDE's variables pane) consumes them, so expanding a large
+    container only reads the rows that are displayed.
+    """
+
+    CHILD_PAGE = 64
+
+    def __init__(self, mpy: MicroPythonHelper, addr: int, type_name: str, kind: str):
+        super().__init__(mpy, addr)
+        self.type_name = type_name
+        self.kind = kind
+
+    def to_string(self) -> str:
+        try:
+            if self.kind == "dict":
+                n = int(self.mpy.cast_obj(self.addr, 'mp_obj_dict_t')['map']['used'])
+            else:
+                n = self.items()[1]
+            return f"{self.type_name} of length {n}"
+        except Exception:
+            return f"<{self.type_name} {self.addr:#x}>"
+
+    def display_hint(self) -> str:
+        return "map" if self.kind == "dict" else "array"
+
+    def items(self) -> tuple:
+        return self.mpy.sequence_items(self.addr, self.type_name)
+
+    def children(self):
+        obj_t = gdb.lookup_type("mp_obj_t")
+        if self.kind == "dict":
+            mp_map = self.mpy.cast_obj(self.addr, 'mp_obj_dict_t')['map']
+            for i, (key, value) in enumerate(self.mpy.iter_map_entries(mp_map, self.CHILD_PAGE)):
+                yield f"key{i}", gdb.Value(key).cast(obj_t)
+                yield f"value{i}", gdb.Value(value).cast(obj_t)
+            return
+        items, n = self.items()
+        for first in range(0, n, self.CHILD_PAGE):
+            words = self.mpy.read_words(items + first * obj_t.sizeof, min(self.CHILD_PAGE, n - first))
+            for i, word in enumerate(words):
+                yield f"[{first + i}]", gdb.Value(word).cast(obj_t)
+
+class MicroPythonPrettyPrinter(gdb.printing.PrettyPrinter):
+    """Pretty-printers for mp_obj_t and the core MicroPython object structs"""
+
+    STRUCTS = ("mp_obj_str_t", "mp_obj_int_t", "mp_obj_float_t", "mp_obj_list_t",
+               "mp_obj_tuple_t", "mp_obj_dict_t", "mp_obj_exception_t")
+
+    def __init__(self, mpy: MicroPythonHelper):
+        super().__init__("micropython")
+        self.mpy = mpy
+
+    def __call__(self, val: gdb.Value):
+        val_type = val.type.unqualified()
+        if val_type.name == "mp_obj_t":
+            addr = int(val)
+        else:
+            tag = val_type.strip_typedefs().tag or ""
+            if val_type.name not in self.STRUCTS and tag.lstrip("_") not in self.STRUCTS:
+                return None
+            if val.address is None:
+                return None
+            addr = int(val.address)
+        try:
+            if self.mpy.decode_word(addr)[0] == "ptr" and addr:
+                type_name, kind = self.mpy.get_obj_type_info(addr)
+                if kind in ("sequence", "dict"):
+                    return MpContainerPrinter(self.mpy, addr, type_name, kind)
+        except Exception:
+            pass
+        return MpObjPrinter(self.mpy, addr)
+
+_shared_helper = None
+
+def get_shared_helper() -> MicroPythonHelper:
+    """Return the helper (and its caches) shared by all MicroPython commands"""
+    global _shared_helper
+    if _shared_helper is None:
+        _shared_helper = MicroPythonHelper()
+    return _shared_helper
+
 def register_micropython_commands():
     """Register MicroPython-specific GDB commands"""
     try:
-        mpy = MicroPythonHelper()
+        mpy = get_shared_helper()
         MPLocalsCommand(mpy)
         MPGlobalsCommand(mpy)
         MPBacktraceCommand(mpy)
@@ -658,15 +3063,45 @@ def register_micropython_commands():
         MPExceptNavigateCommand(mpy)
         MPExceptHistoryCommand(mpy)
         MPExceptVisualizeCommand(mpy)
+        MPExceptTraceCommand(mpy)
+        MPCacheStatsCommand(mpy)
+        MPResetCommand(mpy)
+        MPExpandCommand(mpy)
+        MPHeapCommand(mpy)
+        MPHeapSnapshotCommand(mpy)
+        MPHeapDiffCommand(mpy)
+        MPProfileCommand(mpy)
+        stepper = PythonStepper(mpy)
+        MPStepCommand(stepper, "mpy-step", "step")
+        MPStepCommand(stepper, "mpy-next", "next")
+        MPStepCommand(stepper, "mpy-finish", "finish")
+        MPLimitParameter(mpy, "mpy-max-depth", "max_depth", "nesting depth")
+        MPLimitParameter(mpy, "mpy-max-items", "max_items", "number of container items")
+        MPLimitParameter(mpy, "mpy-max-string", "max_string", "number of string bytes")
+        MPObjReprParameter(mpy)
+        MPHistorySizeParameter(mpy)
+        gdb.printing.register_pretty_printer(None, MicroPythonPrettyPrinter(mpy), replace=True)
         print("MicroPython GDB helpers loaded successfully")
         print(Colors.colorize("Enhanced exception handling commands available:", Colors.GREEN))
-        print("  mpy-catch <type> [all|uncaught] - Configure exception catching")
+        print("  mpy-catch <type> [all|uncaught] [-s] [--ignore N] [--every N] - Configure exception catching")
         print("  mpy-except-info [-d|--detailed] [-i N|--index=N] - Show exception information")
         print("  mpy-except-bt - Show exception backtrace")
         print("  mpy-except-vars - Show variables at exception point")
         print("  mpy-except-navigate <frame_number> - Navigate through exception frames")
         print("  mpy-except-history - Show exception history")
         print("  mpy-except-visualize - Visual representation of exception")
+        print("  mpy-except-trace start [type]|stop|dump [-n N]|reset - Count raises without stopping")
+        print("  mpy-cache-stats [reset] - Show target memory cache statistics")
+        print("  mpy-reset - Delete mpy-catch/mpy-except-trace breakpoints, clear history and caches")
+        print("  mpy-expand <address> [start] - Expand an elided object")
+        print("  mpy-heap [-m|--map] [-n N] - GC heap census and fragmentation")
+        print("  mpy-heap-snapshot [name] - Record (or list) heap snapshots")
+        print("  mpy-heap-diff <a> <b> [-n N] - Heap growth between two snapshots")
+        print("  mpy-step|mpy-next [count] / mpy-finish - Step Python lines, over calls, out of the frame")
+        print("  mpy-profile start [-r HZ] [-d SECONDS] [-o FILE]|stop|status - Sampling profiler (folded stacks)")
+        print("  set mpy-max-depth|mpy-max-items|mpy-max-string <n|unlimited> - Rendering limits")
+        print("  set mpy-history-size <n|unlimited> - Exceptions kept in history")
+        print("  print <mp_obj_t> - Pretty-printed (disable with 'disable pretty-printer global micropython')")
     except Exception as e:
         print(f"Error registering MicroPython commands: {e}")
         traceback.print_exc()
@@ -712,21 +3147,19 @@ class MpyState:
         """Get type information of a MicroPython object"""
         if MpyState.is_mp_obj(obj):
             try:
-                # Get object's type based on its tag
-                tag = int(obj) & 0x3
-                if tag == 0:  # QSTR object
+                # Immediate values are decoded from the word itself
+                mpy = get_shared_helper()
+                tag, value = mpy.decode_word(obj)
+                if tag == "qstr":
                     return "str-qstr"
-                elif tag == 1:  # Integer
+                elif tag == "int":
                     return "small-int"
-                elif tag == 2:  # Immediate object
+                elif tag == "const":
                     return "immediate"
+                elif tag == "float":
+                    return "float"
                 else:  # Pointer to an object structure
-                    base_ptr = int(obj) & ~0x3
-                    base = gdb.Value(base_ptr).cast(gdb.lookup_type('mp_obj_base_t').pointer())
-                    type_ptr = base['type']
-                    if type_ptr:
-                        type_name = type_ptr['name'].string()
-                        return type_name
+                    return mpy.get_obj_type(int(obj))
             except Exception as e:
                 print(f"Error getting object type: {e}")
         return "unknown"
@@ -740,56 +3173,26 @@ class MPrintBacktraceCommand(gdb.Command):
     def invoke(self, arg, from_tty):
         try:
             # Find the MicroPython exception object if available
-            exc = gdb.parse_and_eval('MP_STATE_THREAD(mp_pending_exception)')
-            if exc != 0:  # If there's a pending exception
-                print("Current exception: ", end='')
-                print(self.format_exception(exc))
+            try:
+                exc = gdb.parse_and_eval('MP_STATE_THREAD(mp_pending_exception)')
+                if exc != 0:  # If there's a pending exception
+                    print("Current exception: ", end='')
+                    print(self.format_exception(exc))
+            except gdb.error:
+                pass  # MP_STATE_THREAD needs macro info (-g3)
             
-            # Get the MicroPython call stack
-            frame = gdb.parse_and_eval('MP_STATE_THREAD(mp_curr_frame)')
+            # Get the MicroPython call stack (frames unchanged since the
+            # previous stop are reused by the shared helper)
+            backtrace = get_shared_helper().get_backtrace()
             
-            if frame == 0:
+            if not backtrace:
                 print("No Python frames on stack")
                 return
                 
             print("\nPython call stack:")
             print("==================")
-            frame_num = 0
-            
-            while frame != 0:
-                try:
-                    code_info = frame['code_info']
-                    code_info_str = "<no source info>"
-                    if code_info != 0:
-                        code_info_str = code_info.string()
-                    
-                    fun_name = "<unknown>"
-                    codeobj = frame['code_state']['fun_bc']
-                    if codeobj != 0:
-                        fun_bc = codeobj.dereference()
-                        if 'qstr_obj' in fun_bc.type:
-                            fun_name = fun_bc['qstr_obj']['qstr']
-                            # Convert QSTR to string if possible
-                            try:
-                                qstr_pool = gdb.parse_and_eval('MP_STATE_VM(qstr_pool)')
-                                qstr_idx = int(fun_name) >> 2
-                                if qstr_idx < int(qstr_pool['len']):
-                                    qstr_entry = qstr_pool['qstrs'][qstr_idx]
-                                    fun_name = qstr_entry['data'].string()
-                            except:
-                                fun_name = f"<qstr {int(fun_name):#x}>"
-                    
-                    print(f"#{frame_num} {fun_name} at {code_info_str}")
-                    frame_num += 1
-                    
-                except Exception as e:
-                    print(f"Error processing frame: {e}")
-                    break
-                    
-                frame = frame['prev']
-                if frame_num > 20:  # Limit stack depth to avoid infinite loops
-                    print("... (stack trace truncated)")
-                    break
+            for frame_num, frame in enumerate(backtrace):
+                print(f"#{frame_num} {frame}")
                 
         except Exception as e:
             print(f"Error while printing MicroPython backtrace: {e}")
@@ -817,31 +3220,25 @@ class MPrintLocalsCommand(gdb.Command):
     
     def invoke(self, arg, from_tty):
         try:
-            frame = gdb.parse_and_eval('MP_STATE_THREAD(mp_curr_frame)')
-            if frame == 0:
+            mpy = get_shared_helper()
+            frames = mpy.python_frames(limit=1)
+            if not frames:
                 print("No active MicroPython frame")
                 return
             
-            locals_dict = frame['code_state']['locals']
-            if locals_dict == 0:
-                print("No local variables available")
-                return
-                
-            n_state = frame['code_state']['n_state']
-            n_locals = int(n_state) >> 8  # Extract number of locals from n_state
-            
-            if n_locals == 0:
+            # One read of code_state->state[]; immediates then decode without target access
+            local_words = mpy.frame_locals(frames[0])
+            if not local_words:
                 print("No local variables in current frame")
                 return
-                
-            print(f"Local variables ({n_locals} total):")
-            for i in range(n_locals):
+            
+            print(f"Local variables ({len(local_words)} total):")
+            for name, word in local_words:
                 try:
-                    var_obj = locals_dict[i]
-                    var_type = MpyState.get_obj_type(var_obj)
-                    print(f"  [{i}]: {var_obj} (type: {var_type})")
+                    var_type = mpy.get_obj_type(word)
+                    print(f"  {name}: {mpy.format_mp_obj(word)} (type: {var_type})")
                 except Exception as e:
-                    print(f"  [{i}]: Error: {e}")
+                    print(f"  {name}: Error: {e}")
                     
         except Exception as e:
             print(f"Error while printing locals: {e}")
@@ -886,38 +3283,26 @@ class MPrintStackCommand(gdb.Command):
     
     def invoke(self, arg, from_tty):
         try:
-            frame = gdb.parse_and_eval('MP_STATE_THREAD(mp_curr_frame)')
-            if frame == 0:
+            mpy = get_shared_helper()
+            frames = mpy.python_frames(limit=1)
+            if not frames:
                 print("No active MicroPython frame")
                 return
             
-            code_state = frame['code_state']
-            if code_state == 0:
-                print("No code state available")
-                return
-                
-            sp = code_state['sp']
-            stack = code_state['stack']
-            
-            if sp == 0 or stack == 0:
-                print("Stack pointer or stack base not available")
-                return
-                
-            # Calculate number of items on stack
-            sp_offset = int(sp) - int(stack)
-            if sp_offset <= 0:
+            # Fetch the whole stack in one read through the shared cache;
+            # immediates then decode without further target access
+            words = mpy.frame_stack(frames[0])
+            n_stack = len(words)
+            if not n_stack:
                 print("Stack is empty")
                 return
-                
-            n_stack = sp_offset // gdb.lookup_type('mp_obj_t').sizeof
             
             print(f"Python value stack ({n_stack} items):")
             for i in range(n_stack):
                 try:
                     idx = n_stack - i - 1  # Display in reverse order (top of stack first)
-                    val = stack[idx]
-                    val_type = MpyState.get_obj_type(val)
-                    print(f"  [{idx}]: {val} (type: {val_type})")
+                    val_type = mpy.get_obj_type(words[idx])
+                    print(f"  [{idx}]: {mpy.format_mp_obj(words[idx])} (type: {val_type})")
                 except Exception as e:
                     print(f"  [{idx}]: Error: {e}")
                     
@@ -932,18 +3317,37 @@ class MPyBreakpointCommand(gdb.Command):
         super(MPyBreakpointCommand, self).__init__("mp_break", gdb.COMMAND_USER)
     
     def invoke(self, arg, from_tty):
-        if not arg:
-            print("Usage: mp_break <function_name>")
+        args = arg.split()
+        if not args:
+            print("Usage: mp_break <function_name> | mp_break -l [pattern]")
             return
             
         try:
-            # Try setting breakpoint on Python-level function
-            # This is a simplified implementation - a full implementation would
-            # need to find the bytecode for the given function name
-            print(f"Setting breakpoint on MicroPython function '{arg}'...")
-            print("Note: This is not fully implemented in this helper version.")
-            print("Try setting a breakpoint on mp_execute_bytecode instead,")
-            print("then inspect the function name to find your target function.")
+            mpy = get_shared_helper()
+            index = mpy.function_index()
+            
+            if args[0] == "-l":
+                pattern = args[1] if len(args) > 1 else ""
+                names = sorted({q for entries in index.values() for q, _, _ in entries if pattern in q})
+                print(f"Python functions ({len(names)}):")
+                for name in names:
+                    print(f"  {name}")
+                return
+            
+            matches = index.get(args[0])
+            if not matches:
+                print(f"No Python function named '{args[0]}' in the loaded modules")
+                print("Import the module first, or use 'mp_break -l' to list known functions.")
+                return
+            
+            # Stop only when the called function's bytecode is one of the matches:
+            # a pointer compare per call, with no calls into the target
+            condition = " || ".join(f"(unsigned long)code_state->fun_bc->bytecode == {bc:#x}"
+                                    for _, _, bc in matches)
+            bp = gdb.Breakpoint("mp_execute_bytecode")
+            bp.condition = condition
+            for qualname, fun_bc, bytecode in matches:
+                print(f"Breakpoint {bp.number} on {qualname} (bytecode at {bytecode:#x})")
             
         except Exception as e:
             print(f"Error: {e}")
@@ -961,4 +3365,4 @@ print("  mp_print_backtrace - Show MicroPython call stack")
 print("  mp_print_locals    - Show local variables in current frame")
 print("  mp_print_globals   - Show global modules and variables")
 print("  mp_print_stack     - Show MicroPython value stack")
-print("  mp_break <func>    - Set breakpoint on MicroPython function")
\ No newline at end of file
+print("  mp_break <func>    - Set breakpoint on MicroPython function (-l lists them)")
\ No newline at end of file
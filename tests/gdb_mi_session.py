@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Persistent GDB/MI sessions for the GDB test scripts.
+
+Starting arm-none-eabi-gdb, loading the firmware ELF, the gdbinit and the
+MicroPython helper costs more than most tests spend talking to the target.
+GDBSessionPool keeps GDB processes alive between tests: a test borrows a
+session, runs its commands over the MI interpreter, and the session is
+reset (breakpoints deleted, helper state cleared, target disconnected)
+when it is returned.
+"""
+
+import logging
+import queue
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# [token]^done / *stopped / ~"console text" ...
+RECORD_RE = re.compile(r'^(\d*)([\^*+=~@&])(.*)$')
+STREAM_KINDS = "~@&"
+SIMPLE_ESCAPES = {"n": b"\n", "t": b"\t", "r": b"\r", "a": b"\a", "b": b"\b", "f": b"\f", "v": b"\v",
+                  "e": b"\x1b", '"': b'"', "\\": b"\\", "'": b"'"}
+
+class GDBMIError(Exception):
+    """GDB exited while a command was waiting for its result"""
+    pass
+
+@dataclass
+class MIRecord:
+    token: Optional[int]
+    kind: str
+    cls: Optional[str] = None
+    results: str = ""
+    text: str = ""
+
+@dataclass
+class MIResult:
+    cls: str
+    results: str = ""
+    output: List[str] = field(default_factory=list)
+    stopped: Optional[MIRecord] = None
+
+    @property
+    def error(self) -> Optional[str]:
+        return result_field(self.results, "msg") if self.cls == "error" else None
+
+def parse_c_string(text: str, pos: int = 0) -> Tuple[str, int]:
+    """Decode the MI C string starting at text[pos]; returns (value, end)"""
+    if pos >= len(text) or text[pos] != '"':
+        raise ValueError(f"expected C string at {pos}: {text!r}")
+    out = bytearray()
+    i = pos + 1
+    while i < len(text):
+        ch = text[i]
+        if ch == '"':
+            return out.decode("utf-8", "replace"), i + 1
+        if ch == "\\" and i + 1 < len(text):
+            nxt = text[i + 1]
+            if nxt in "01234567":
+                digits = re.match(r"[0-7]{1,3}", text[i + 1:]).group()
+                out.append(int(digits, 8) & 0xFF)
+                i += 1 + len(digits)
+                continue
+            out += SIMPLE_ESCAPES.get(nxt, nxt.encode("utf-8"))
+            i += 2
+            continue
+        out += ch.encode("utf-8")
+        i += 1
+    raise ValueError(f"unterminated C string: {text!r}")
+
+def result_field(results: str, name: str) -> Optional[str]:
+    """Value of a top-level string field such as msg="..." or reason="..." """
+    m = re.search(r'(?:^|,)' + re.escape(name) + r'="', results)
+    if not m:
+        return None
+    return parse_c_string(results, m.end() - 1)[0]
+
+def parse_record(line: str) -> Optional[MIRecord]:
+    """Parse one line of MI output; None for the (gdb) prompt"""
+    line = line.rstrip("\r\n")
+    if line.strip() == "(gdb)":
+        return None
+    m = RECORD_RE.match(line)
+    if not m:
+        # Not MI: the inferior or a script writing straight to stdout
+        return MIRecord(None, "~", text=line + "\n")
+    token = int(m.group(1)) if m.group(1) else None
+    kind, rest = m.group(2), m.group(3)
+    if kind in STREAM_KINDS:
+        return MIRecord(token, kind, text=parse_c_string(rest)[0])
+    cls, _, results = rest.partition(",")
+    return MIRecord(token, kind, cls, results)
+
+def mi_quote(command: str) -> str:
+    """Quote a CLI command as an MI C string"""
+    return '"' + command.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+class GDBMISession:
+    """One GDB process driven over the MI interpreter"""
+
+    def __init__(self, gdb: str, elf: Optional[str] = None, init_commands: Optional[List[str]] = None,
+                 startup_timeout: float = 60):
+        self.gdb = gdb
+        self.elf = elf
+        self.init_commands = init_commands or []
+        self.startup_timeout = startup_timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.reader: Optional[threading.Thread] = None
+        self.next_token = 1
+        self.running = False
+
+    def start(self):
+        """Start GDB, load the ELF and run the init commands"""
+        cmd = [self.gdb, "--interpreter=mi2", "-nx", "-q"]
+        if self.elf:
+            cmd.append(str(self.elf))
+        logger.info(f"Starting GDB session: {' '.join(cmd)}")
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=1,
+            universal_newlines=True,
+            errors="replace"
+        )
+        self.reader = threading.Thread(target=self._read_output, daemon=True)
+        self.reader.start()
+
+        for command in ["set pagination off", "set confirm off", "set width 0", "set height 0"] + self.init_commands:
+            result = self.execute(command, self.startup_timeout)
+            if result.cls == "error":
+                logger.warning(f"GDB init command '{command}' failed: {result.error}")
+
+    def _read_output(self):
+        for line in self.process.stdout:
+            self.lines.put(line)
+        self.lines.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _next_record(self, deadline: float) -> Optional[MIRecord]:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError
+        try:
+            line = self.lines.get(timeout=remaining)
+        except queue.Empty:
+            raise TimeoutError
+        if line is None:
+            raise GDBMIError("GDB exited")
+        return parse_record(line)
+
+    def execute(self, command: str, timeout: float = 30) -> MIResult:
+        """Run one CLI or MI command and wait for its result
+
+        Execution commands (continue, step, ...) also wait for the target to
+        stop again, like they do in a GDB script. If it does not stop in
+        time it is interrupted and TimeoutError is raised.
+        """
+        token = self.next_token
+        self.next_token += 1
+        mi_command = command if command.startswith("-") else f"-interpreter-exec console {mi_quote(command)}"
+        self.process.stdin.write(f"{token}{mi_command}\n")
+        self.process.stdin.flush()
+
+        deadline = time.monotonic() + timeout
+        result: Optional[MIResult] = None
+        output: List[str] = []
+        try:
+            while True:
+                record = self._next_record(deadline)
+                if record is None:
+                    continue
+                if record.kind in "~@":
+                    output.append(record.text)
+                elif record.kind == "&":
+                    logger.debug(f"GDB log: {record.text.rstrip()}")
+                elif record.kind == "*" and record.cls == "running":
+                    self.running = True
+                elif record.kind == "*" and record.cls == "stopped":
+                    self.running = False
+                    if result is not None:
+                        result.stopped = record
+                        return result
+                elif record.kind == "^" and record.token == token:
+                    result = MIResult(record.cls, record.results, output)
+                    if record.cls != "running" and not self.running:
+                        return result
+        except TimeoutError:
+            if self.running:
+                self.interrupt()
+            raise
+
+    def interrupt(self, timeout: float = 5):
+        """Stop a running target"""
+        self.process.stdin.write("-exec-interrupt\n")
+        self.process.stdin.flush()
+        deadline = time.monotonic() + timeout
+        while self.running:
+            record = self._next_record(deadline)
+            if record is not None and record.kind == "*" and record.cls == "stopped":
+                self.running = False
+
+    def run(self, commands: List[str], timeout: float = 30) -> Tuple[str, Optional[str]]:
+        """Run commands like a GDB script: stop at the first error
+
+        Returns the console output and the error message, if any. The
+        timeout covers the whole list.
+        """
+        deadline = time.monotonic() + timeout
+        output = []
+        for command in commands:
+            result = self.execute(command, deadline - time.monotonic())
+            output.extend(result.output)
+            if result.cls == "error":
+                logger.error(f"GDB command '{command}' failed: {result.error}")
+                return "".join(output), result.error or "error"
+        return "".join(output), None
+
+    def reset(self, timeout: float = 10):
+        """Return to the state just after start: no breakpoints, no target
+
+        GDB keeps numbering breakpoints where it left off, so tests must not
+        rely on breakpoint numbers.
+        """
+        if self.running:
+            self.interrupt()
+        self.execute("-break-delete", timeout)
+        # The helper's internal breakpoints, exception history and caches;
+        # errors if the helper is not loaded, which is fine
+        self.execute("mpy-reset", timeout)
+        # Errors if not connected, which is fine
+        self.execute("-target-disconnect", timeout)
+
+    def close(self):
+        if self.process is None:
+            return
+        if self.alive:
+            try:
+                self.process.stdin.write("-gdb-exit\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+class GDBSessionPool:
+    """GDB sessions that tests borrow and return
+
+    Sessions are started on first use and kept until close(). A session
+    that cannot be reset when it is returned is closed instead of reused.
+    """
+
+    def __init__(self, gdb: str, elf: Optional[str] = None, init_commands: Optional[List[str]] = None):
+        self.gdb = gdb
+        self.elf = elf
+        self.init_commands = init_commands or []
+        self.idle: List[GDBMISession] = []
+        self.started = 0
+
+    @contextmanager
+    def session(self):
+        """Borrow a session for the duration of a with block"""
+        session = self.idle.pop() if self.idle else None
+        if session is None or not session.alive:
+            session = GDBMISession(self.gdb, self.elf, self.init_commands)
+            session.start()
+            self.started += 1
+        try:
+            yield session
+        finally:
+            try:
+                session.reset()
+                self.idle.append(session)
+            except (GDBMIError, TimeoutError, OSError) as e:
+                logger.warning(f"Discarding GDB session that failed to reset: {e!r}")
+                session.close()
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
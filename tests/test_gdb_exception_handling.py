@@ -8,14 +8,15 @@ import os
 import sys
 import time
 import subprocess
-import tempfile
 from typing import List, Dict, Any, Optional
 
+from gdb_mi_session import GDBSessionPool
+
 class GDBTest:
     def __init__(self, project_dir: str):
         self.project_dir = project_dir
         self.qemu_process = None
-        self.gdb_process = None
+        self.gdb_pool = None
         self.test_log = []
     
     def setup(self) -> bool:
@@ -46,40 +47,26 @@ class GDBTest:
                 print("Failed to start QEMU")
                 return False
             
+            # One GDB, with the ELF and gdbinit loaded once, shared by all tests
+            self.gdb_pool = GDBSessionPool(
+                "arm-none-eabi-gdb",
+                os.path.join(self.project_dir, "firmware/build/firmware.elf"),
+                [f"source {os.path.join(self.project_dir, 'config/gdb/gdbinit')}"]
+            )
+            
             return True
         except Exception as e:
             print(f"Setup failed: {e}")
             return False
     
     def run_gdb_commands(self, commands: List[str]) -> List[str]:
-        """Run a series of GDB commands and return the output"""
+        """Run a series of GDB commands on a pooled GDB session and return the output"""
         try:
-            # Create a temporary GDB script
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.gdb', delete=False) as f:
-                for cmd in commands:
-                    f.write(cmd + "\n")
-                f.write("quit\n")
-                script_path = f.name
-            
-            # Run GDB with the script
-            gdb_cmd = [
-                "arm-none-eabi-gdb",
-                "-x", os.path.join(self.project_dir, "config/gdb/gdbinit"),
-                "-x", script_path,
-                "--batch",
-                os.path.join(self.project_dir, "firmware/build/firmware.elf")
-            ]
-            
-            result = subprocess.run(
-                gdb_cmd,
-                capture_output=True,
-                text=True
-            )
-            
-            # Clean up
-            os.unlink(script_path)
-            
-            return result.stdout.splitlines()
+            with self.gdb_pool.session() as gdb:
+                output, error = gdb.run(commands, timeout=60)
+            if error:
+                print(f"GDB command failed: {error}")
+            return output.splitlines()
         except Exception as e:
             print(f"GDB command execution failed: {e}")
             return []
@@ -100,7 +87,7 @@ class GDBTest:
         
         # Verify the output contains expected information
         expected_patterns = [
-            "Will break on uncaught ZeroDivisionError exceptions",
+            "Will break on all ZeroDivisionError exceptions",
             "Exception Type: ZeroDivisionError",
             "Local variables at exception point"
         ]
@@ -153,6 +140,8 @@ class GDBTest:
     
     def cleanup(self):
         """Clean up test resources"""
+        if self.gdb_pool:
+            self.gdb_pool.close()
         if self.qemu_process:
             self.qemu_process.terminate()
             try:
@@ -19,6 +19,8 @@ import select
 import json
 from datetime import datetime
 
+from gdb_mi_session import GDBSessionPool, GDBMIError
+
 # Configure logging
 LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 logging.basicConfig(
@@ -140,6 +142,7 @@ class GDBIntegrationTester:
         self.firmware_path = self.project_dir / "firmware/build/firmware.elf"
         self.results: List[TestResult] = []
         self.qemu: Optional[QEMUProcess] = None
+        self.gdb_pool: Optional[GDBSessionPool] = None
         self.test_start_time = datetime.now()
         
         # Create test results directory
@@ -158,53 +161,37 @@ class GDBIntegrationTester:
 
     def run_gdb_commands(self, commands: List[str], expected_output: Optional[List[str]] = None, 
                         timeout: int = 30) -> Tuple[bool, str]:
-        """Run GDB commands and check output"""
+        """Run GDB commands on a pooled GDB session and check output"""
         try:
-            # Create a temporary GDB command file
-            gdb_script = self.results_dir / "gdb_commands.txt"
-            with open(gdb_script, 'w') as f:
-                f.write("set pagination off\n")
-                f.write("set confirm off\n")
-                f.write("set debug remote 1\n")
-                f.write(f"file {self.firmware_path}\n")
-                f.write("target remote :1234\n")
-                for cmd in commands:
-                    f.write(f"{cmd}\n")
-                f.write("quit\n")
-
-            # Run GDB with the command file
-            gdb_cmd = ['arm-none-eabi-gdb', '-x', str(gdb_script)]
-            logger.info(f"Running GDB with command: {' '.join(gdb_cmd)}")
-            
-            gdb_output = subprocess.run(
-                gdb_cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
+            with self.gdb_pool.session() as gdb:
+                logger.info(f"Running {len(commands)} GDB commands")
+                stdout, error = gdb.run(["target remote :1234"] + commands, timeout)
             
             # Log GDB output
-            logger.debug(f"GDB stdout:\n{gdb_output.stdout}")
-            if gdb_output.stderr:
-                logger.debug(f"GDB stderr:\n{gdb_output.stderr}")
+            logger.debug(f"GDB output:\n{stdout}")
+            if error:
+                logger.debug(f"GDB error:\n{error}")
             
             # Save GDB output to file
             output_file = self.results_dir / f"gdb_output_{len(self.results)}.txt"
             with open(output_file, 'w') as f:
-                f.write(f"Command: {' '.join(gdb_cmd)}\n")
-                f.write(f"Stdout:\n{gdb_output.stdout}\n")
-                f.write(f"Stderr:\n{gdb_output.stderr}\n")
+                f.write("Commands:\n" + "\n".join(commands) + "\n")
+                f.write(f"Stdout:\n{stdout}\n")
+                f.write(f"Error:\n{error or ''}\n")
             
             if expected_output:
                 for expected in expected_output:
-                    if expected not in gdb_output.stdout:
+                    if expected not in stdout:
                         logger.error(f"Expected output not found: {expected}")
-                        logger.error(f"Actual output: {gdb_output.stdout}")
-                        return False, gdb_output.stdout
-            return True, gdb_output.stdout
-        except subprocess.TimeoutExpired:
+                        logger.error(f"Actual output: {stdout}")
+                        return False, stdout
+            return True, stdout
+        except TimeoutError:
             logger.error(f"GDB command timed out after {timeout} seconds")
             return False, f"Timeout after {timeout}s"
+        except GDBMIError as e:
+            logger.error(f"GDB session failed: {e}")
+            return False, str(e)
         except Exception as e:
             logger.error(f"Error running GDB commands: {e}")
             return False, str(e)
@@ -282,7 +269,8 @@ class GDBIntegrationTester:
                 "continue",
                 "info registers"
             ],
-            expected_output=["Breakpoint 1", "SystemInit"]
+            # Breakpoint numbers carry on across tests sharing a GDB session
+            expected_output=["Breakpoint", "SystemInit"]
         )
 
     def test_examine_memory(self) -> TestResult:
@@ -393,12 +381,17 @@ class GDBIntegrationTester:
         
         # Wait for GDB server to be ready
         time.sleep(2)
+        
+        # GDB is started once, on first use, and shared by all tests
+        self.gdb_pool = GDBSessionPool("arm-none-eabi-gdb", str(self.firmware_path))
         logger.info("Test environment ready")
         return True
 
     def cleanup(self):
         """Cleanup test environment"""
         logger.info("\nCleaning up test environment...")
+        if self.gdb_pool:
+            self.gdb_pool.close()
         if self.qemu:
             self.qemu.stop()
         subprocess.run(['pkill', 'qemu-system-arm'], stderr=subprocess.DEVNULL)
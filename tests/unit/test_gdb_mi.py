@@ -0,0 +1,42 @@
+"""
+Unit tests for the GDB/MI output parser used by the GDB test scripts
+"""
+import sys
+import os
+import unittest
+
+# Add the tests directory to the path so we can import the session module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gdb_mi_session
+
+class TestGDBMIParser(unittest.TestCase):
+    """Test cases for gdb_mi_session record parsing"""
+
+    def test_parse_c_string(self):
+        """Escapes, including octal bytes of UTF-8 text, are decoded"""
+        self.assertEqual(gdb_mi_session.parse_c_string(r'"a\"b\\c\n"'), ('a"b\\c\n', 11))
+        self.assertEqual(gdb_mi_session.parse_c_string(r'"\302\260C"')[0], "°C")
+
+    def test_parse_stream_record(self):
+        """Console records carry their decoded text"""
+        record = gdb_mi_session.parse_record('~"Breakpoint 1, SystemInit ()\\n"\n')
+        self.assertEqual((record.kind, record.text), ("~", "Breakpoint 1, SystemInit ()\n"))
+
+    def test_parse_result_record(self):
+        """Result records keep their token, class and fields"""
+        record = gdb_mi_session.parse_record('12^error,msg="No symbol \\"x\\" in current context."')
+        self.assertEqual((record.token, record.kind, record.cls), (12, "^", "error"))
+        self.assertEqual(gdb_mi_session.result_field(record.results, "msg"), 'No symbol "x" in current context.')
+
+    def test_prompt_and_raw_lines(self):
+        """The prompt is skipped and non-MI lines are treated as console output"""
+        self.assertIsNone(gdb_mi_session.parse_record("(gdb) \n"))
+        self.assertEqual(gdb_mi_session.parse_record("hello\n").text, "hello\n")
+
+    def test_mi_quote(self):
+        """CLI commands are quoted for -interpreter-exec"""
+        self.assertEqual(gdb_mi_session.mi_quote('print "a\\b"'), '"print \\"a\\\\b\\""')
+
+if __name__ == '__main__':
+    unittest.main()
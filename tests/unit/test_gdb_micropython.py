@@ -0,0 +1,124 @@
+"""
+Unit tests for the VSCode integration script's exception log and repeat folding
+"""
+import sys
+import os
+import struct
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# Add the scripts and VSCode config directories to the path so we can import the integration script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../scripts')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../config/vscode')))
+
+# The gdb module only exists inside GDB: mock it, with real classes to subclass
+class MockGdbClass:
+    def __init__(self, *args, **kwargs):
+        pass
+
+gdb = MagicMock()
+gdb.Command = gdb.Parameter = gdb.Breakpoint = gdb.FinishBreakpoint = MockGdbClass
+gdb.printing.PrettyPrinter = MockGdbClass
+gdb.error = type("error", (RuntimeError,), {})
+gdb.MemoryError = type("MemoryError", (gdb.error,), {})
+gdb.lookup_type = lambda name: SimpleNamespace(sizeof=4)
+# Shared with the other test modules that import the helper
+gdb = sys.modules.setdefault('gdb', gdb)
+sys.modules.setdefault('gdb.printing', gdb.printing)
+
+# Now we can import the integration script (it only sets itself up when sourced into GDB)
+import gdb_micropython
+
+class TestExceptionLog(unittest.TestCase):
+    """Test cases for the append-only exception history log"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "exception_history.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def index(self):
+        data = self.read(os.path.join(self.tmp.name, "exception_history.idx"))
+        return [o for o, in struct.iter_unpack("<Q", data)]
+
+    def line_offsets(self):
+        data = self.read(self.path)
+        return [0] + [i + 1 for i, c in enumerate(data[:-1]) if c == ord("\n")]
+
+    def test_append_and_load(self):
+        """Every line is indexed, and load returns the newest entries"""
+        log = gdb_micropython.ExceptionLog(self.path, 2)
+        self.assertEqual(log.load(), [])
+        for i in range(3):
+            log.append({"type": "ValueError", "n": i})
+        self.assertEqual(self.index(), self.line_offsets())
+        self.assertEqual([e["n"] for e in gdb_micropython.ExceptionLog(self.path, 2).load()], [1, 2])
+
+    def test_compaction(self):
+        """Past COMPACT_FACTOR times the entries kept, only the newest remain"""
+        log = gdb_micropython.ExceptionLog(self.path, 2)
+        log.load()
+        for i in range(2 * log.COMPACT_FACTOR + 1):
+            log.append({"n": i})
+        self.assertEqual(len(self.line_offsets()), 2)
+        self.assertEqual(self.index(), self.line_offsets())
+        self.assertEqual(log.size, len(self.read(self.path)))
+        log.append({"n": "next"})
+        self.assertEqual([e["n"] for e in gdb_micropython.ExceptionLog(self.path, 3).load()], [7, 8, "next"])
+
+    def test_torn_write_rebuilds_index(self):
+        """A torn last line is dropped and an index out of step with the log rebuilt"""
+        log = gdb_micropython.ExceptionLog(self.path, 10)
+        log.load()
+        log.append({"n": 0})
+        log.append({"n": 1})
+        with open(self.path, "ab") as f:
+            f.write(b'{"n":2}\n{"n":')
+        self.assertEqual([e["n"] for e in gdb_micropython.ExceptionLog(self.path, 10).load()], [0, 1, 2])
+        self.assertTrue(self.read(self.path).endswith(b'{"n":2}\n'))
+        self.assertEqual(self.index(), self.line_offsets())
+
+class TestExceptionCoalescer(unittest.TestCase):
+    """Test cases for folding repeated exceptions into one record"""
+
+    SIGNATURE = ("ValueError", "main.py", 12, "read")
+
+    def setUp(self):
+        self.now = 100.0
+        patcher = patch.object(gdb_micropython.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.coalescer = gdb_micropython.ExceptionCoalescer()
+        self.record = {"type": "ValueError", "count": 1}
+        self.coalescer.open(self.SIGNATURE, self.record)
+
+    def test_repeats_within_window(self):
+        """Each repeat restarts the window from the last occurrence"""
+        for _ in range(3):
+            self.now += self.coalescer.WINDOW - 0.5
+            self.assertTrue(self.coalescer.repeat(self.SIGNATURE))
+        self.assertEqual(self.record["count"], 4)
+        self.assertIn("last_seen", self.record)
+        self.assertIs(self.coalescer.close(), self.record)
+        self.assertFalse(self.coalescer.repeat(self.SIGNATURE))
+
+    def test_window_lapses(self):
+        self.now += self.coalescer.WINDOW + 0.1
+        self.assertFalse(self.coalescer.repeat(self.SIGNATURE))
+        self.assertEqual(self.record["count"], 1)
+
+    def test_other_signature(self):
+        """A different location is not a repeat; closing a record never repeated returns nothing"""
+        self.assertFalse(self.coalescer.repeat(("ValueError", "main.py", 13, "read")))
+        self.assertIsNone(self.coalescer.close())
+
+if __name__ == '__main__':
+    unittest.main()
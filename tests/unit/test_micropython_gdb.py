@@ -0,0 +1,405 @@
+"""
+Unit tests for the target-independent parts of the MicroPython GDB helper
+"""
+import sys
+import os
+import struct
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# Add the scripts directory to the path so we can import the helper
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../scripts')))
+
+# The gdb module only exists inside GDB: mock it, with real classes to subclass
+class MockGdbClass:
+    def __init__(self, *args, **kwargs):
+        pass
+
+gdb = MagicMock()
+gdb.Command = gdb.Parameter = gdb.Breakpoint = gdb.FinishBreakpoint = MockGdbClass
+gdb.printing.PrettyPrinter = MockGdbClass
+gdb.error = type("error", (RuntimeError,), {})
+gdb.MemoryError = type("MemoryError", (gdb.error,), {})
+gdb.lookup_type = lambda name: SimpleNamespace(sizeof=4)
+# Shared with the other test modules that import the helper
+gdb = sys.modules.setdefault('gdb', gdb)
+sys.modules.setdefault('gdb.printing', gdb.printing)
+
+# Now we can import the helper
+import micropython_gdb
+
+class MockMemory:
+    """Target memory image starting at address 0"""
+
+    def __init__(self, size=4096):
+        self.data = bytearray(size)
+        self.reads = []
+
+    def put_words(self, addr, words):
+        struct.pack_into("<%dI" % len(words), self.data, addr, *words)
+
+    def read(self, addr, size):
+        self.reads.append((addr, size))
+        return bytes(self.data[addr:addr + size])
+
+def make_helper(mem):
+    """A MicroPythonHelper reading from mem, without the GDB-dependent setup"""
+    mpy = micropython_gdb.MicroPythonHelper.__new__(micropython_gdb.MicroPythonHelper)
+    mpy.mem = mem
+    return mpy
+
+class TestMapEntries(unittest.TestCase):
+    """Test cases for mp_map_t slot decoding"""
+
+    def test_skips_empty_and_deleted_slots(self):
+        """Empty (0) and deleted (sentinel 4, or 8 in debug builds) slots are not entries"""
+        mem = MockMemory()
+        mem.put_words(0x100, [0, 0, 0x2a2, 0x11, 4, 0x99, 8, 0x98, 0x3a2, 0x13])
+        mpy = make_helper(mem)
+        mp_map = {"table": 0x100, "alloc": 5}
+        self.assertEqual(list(mpy.iter_map_entries(mp_map)), [(0x2a2, 0x11), (0x3a2, 0x13)])
+        self.assertEqual(mpy.read_map_entries(mp_map, start=1, limit=1), [(0x3a2, 0x13)])
+
+class MockInferior:
+    """gdb.Inferior over a MockMemory, optionally with an unmapped range"""
+
+    def __init__(self, mem, unmapped=None):
+        self.mem = mem
+        self.unmapped = unmapped
+
+    def read_memory(self, addr, size):
+        if self.unmapped and addr < self.unmapped[1] and addr + size > self.unmapped[0]:
+            raise gdb.MemoryError("Cannot access memory")
+        return memoryview(self.mem.read(addr, size))
+
+class TestTargetMemoryCache(unittest.TestCase):
+    """Test cases for the page cache of target memory"""
+
+    PAGE = micropython_gdb.TargetMemoryCache.PAGE_SIZE
+
+    def setUp(self):
+        self.mem = MockMemory(8 * self.PAGE)
+        self.mem.data[:] = bytes(i & 0xFF for i in range(len(self.mem.data)))
+        gdb.selected_inferior = lambda: self.inferior
+        self.inferior = MockInferior(self.mem)
+        self.cache = micropython_gdb.TargetMemoryCache()
+
+    def test_read_spanning_pages(self):
+        """A read across page boundaries returns the right bytes and fetches the pages in one request"""
+        addr = self.PAGE - 3
+        self.assertEqual(self.cache.read(addr, self.PAGE + 6), bytes(self.mem.data[addr:addr + self.PAGE + 6]))
+        self.assertEqual(self.mem.reads, [(0, 3 * self.PAGE)])
+        self.assertEqual((self.cache.misses, self.cache.hits, self.cache.requests), (3, 0, 1))
+
+    def test_only_missing_pages_fetched(self):
+        """Cached pages are hits; the missing run around them is fetched once"""
+        self.cache.read(self.PAGE, 4)
+        self.mem.reads.clear()
+        self.cache.read(0, 3 * self.PAGE)
+        self.assertEqual(self.mem.reads, [(0, self.PAGE), (2 * self.PAGE, self.PAGE)])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_flush(self):
+        """After a flush the target is read again"""
+        self.cache.read(0, 4)
+        self.cache.flush()
+        self.cache.read(0, 4)
+        self.assertEqual(len(self.mem.reads), 2)
+        self.assertEqual(self.cache.flushes, 1)
+
+    def test_unmapped_page_in_run(self):
+        """Readable pages of a run crossing unmapped memory are still cached"""
+        self.inferior.unmapped = (2 * self.PAGE, 3 * self.PAGE)
+        with self.assertRaises(gdb.MemoryError):
+            self.cache.read(self.PAGE, 2 * self.PAGE)
+        self.assertIn(1, self.cache.pages)
+        self.assertNotIn(2, self.cache.pages)
+
+class TestObjectRepr(unittest.TestCase):
+    """Test cases for decoding tagged mp_obj_t words"""
+
+    def test_repr_a(self):
+        """REPR_A: xxxx...xxx1 small int, xxxx...x010 qstr, xxxx...x110 immediate"""
+        repr_a = micropython_gdb.ObjectRepr("A")
+        self.assertEqual(repr_a.decode((21 << 1) | 1), ("int", 21))
+        self.assertEqual(repr_a.decode(0xffffffff), ("int", -1))
+        self.assertEqual(repr_a.decode((77 << 3) | 2), ("qstr", 77))
+        self.assertEqual(repr_a.decode((3 << 3) | 6), ("const", 3))
+        self.assertEqual(repr_a.decode(0x20001230), ("ptr", 0x20001230))
+
+    def test_repr_b(self):
+        """REPR_B: xxxx...xx01 small int, xxxx...x011 qstr, xxxx...x111 immediate"""
+        repr_b = micropython_gdb.ObjectRepr("B")
+        self.assertEqual(repr_b.decode((-7 << 2 | 1) & 0xffffffff), ("int", -7))
+        self.assertEqual(repr_b.decode((77 << 3) | 3), ("qstr", 77))
+        self.assertEqual(repr_b.decode((1 << 3) | 7), ("const", 1))
+        self.assertEqual(repr_b.decode(0x20001234), ("ptr", 0x20001234))
+
+    def test_repr_c(self):
+        """REPR_C: 30-bit floats are stored in the word"""
+        repr_c = micropython_gdb.ObjectRepr("C")
+        self.assertEqual(repr_c.decode((21 << 1) | 1), ("int", 21))
+        self.assertEqual(repr_c.decode((77 << 4) | 6), ("qstr", 77))
+        self.assertEqual(repr_c.decode((3 << 4) | 0xe), ("const", 3))
+        one = ((0x3f800000 & ~3) | 2) + 0x80800000
+        self.assertEqual(repr_c.decode(one & 0xffffffff), ("float", 1.0))
+        self.assertEqual(repr_c.decode(0x20001230), ("ptr", 0x20001230))
+
+    def test_repr_d(self):
+        """REPR_D: 64-bit words with NaN-boxed doubles and 0x0001/2/3 tagged values"""
+        repr_d = micropython_gdb.ObjectRepr("D", 64)
+        self.assertEqual(repr_d.decode((((-5) & 0x7fffffffffff) << 1) | 0x0001000000000001), ("int", -5))
+        self.assertEqual(repr_d.decode((77 << 1) | 0x0002000000000001), ("qstr", 77))
+        for value in (0, 1, 3):
+            self.assertEqual(repr_d.decode((value << 46) | 0x0003000000000000), ("const", value))
+        double = struct.unpack("<Q", struct.pack("<d", 2.5))[0]
+        self.assertEqual(repr_d.decode((double + 0x8004000000000000) & 0xffffffffffffffff), ("float", 2.5))
+        self.assertEqual(repr_d.decode(0x20001230), ("ptr", 0x20001230))
+
+class TestHeapSnapshots(unittest.TestCase):
+    """Test cases for heap snapshot summaries and diffs"""
+
+    RAW = micropython_gdb.MicroPythonHelper.GC_RAW_ALLOC
+
+    def census(self, allocs, owners):
+        types = {}
+        for _, n, name in allocs:
+            entry = types.setdefault(name, [0, 0])
+            entry[0] += 1
+            entry[1] += n * 16
+        return {"block_size": 16, "used_blocks": sum(n for _, n, _ in allocs), "free_blocks": 100,
+                "largest_free": 50, "allocs": allocs, "types": types, "owners": owners}
+
+    def test_summary_looks_through_item_arrays(self):
+        """Objects in a list's items array count towards the list"""
+        census = self.census([(0x100, 2, "list"), (0x200, 4, self.RAW), (0x300, 1, "str")],
+                             {0x200: 0x100, 0x300: 0x200})
+        summary = make_helper(MockMemory()).heap_summary(census)
+        self.assertEqual(summary["owners"][0x100], ("list", 2, 80))
+        self.assertEqual(summary["owners"][0], ("<root>", 1, 32))
+        self.assertEqual(summary["types"]["str"], (1, 16))
+
+    def test_diff(self):
+        """Only changed types and owners are reported, largest growth first"""
+        mpy = make_helper(MockMemory())
+        a = mpy.heap_summary(self.census([(0x100, 2, "list"), (0x200, 4, self.RAW)], {0x200: 0x100}))
+        b = mpy.heap_summary(self.census(
+            [(0x100, 2, "list"), (0x200, 8, self.RAW), (0x300, 1, "str"), (0x400, 2, "dict")],
+            {0x200: 0x100, 0x300: 0x200}))
+        diff = micropython_gdb.MicroPythonHelper.diff_heap_summaries(a, b)
+        self.assertEqual(diff["used_blocks"], 7)
+        self.assertEqual(diff["allocations"], 2)
+        self.assertEqual(diff["types"], [(self.RAW, 0, 64), ("dict", 1, 32), ("str", 1, 16)])
+        self.assertEqual(diff["owners"], [(0x100, "list", 1, 80), (0, "<root>", 1, 32)])
+
+class MockCodeHelper:
+    """Helper stand-in resolving fun_bc addresses to code info"""
+
+    def __init__(self, code, stacks=()):
+        self.code = code
+        self.stacks = list(stacks)
+        self.lookups = 0
+
+    def code_info(self, fun_bc):
+        self.lookups += 1
+        return self.code[fun_bc]
+
+    def python_frames(self, limit=None):
+        return [{"fun_bc": f} for f in self.stacks.pop(0)]
+
+class TestPythonProfiler(unittest.TestCase):
+    """Test cases for profiler sampling and folded stack output"""
+
+    def test_samples_and_folded_stacks(self):
+        """Stacks are folded outermost first, with names resolved once per code object"""
+        code = {0x10: {"file": "main.py", "name": "<module>"},
+                0x20: {"file": "app.py", "name": "loop"},
+                0x30: {"file": "lib;x.py", "name": "read"}}
+        mpy = MockCodeHelper(code, [(0x30, 0x20, 0x10), (0x30, 0x20, 0x10), (0x20, 0x10), (0x40, 0x10)])
+        profiler = micropython_gdb.PythonProfiler(mpy)
+        for _ in range(4):
+            profiler.sample()
+        self.assertEqual(profiler.folded_stacks(), [
+            "main.py:<module>;app.py:loop;lib:x.py:read 2",
+            "main.py:<module>;app.py:loop 1",
+            "main.py:<module>;<code @0x40> 1",
+        ])
+        self.assertEqual(mpy.lookups, 4)
+
+class TestExceptionHistory(unittest.TestCase):
+    """Test cases for the bounded exception history"""
+
+    def entry(self, address, type_addr=0x5000, stop_id=1):
+        return {"address": address, "type_addr": type_addr, "type": "ValueError",
+                "stop_id": stop_id, "timestamp": "t"}
+
+    def test_repeat_bumps_count(self):
+        """The same object of the same type is recorded once and counted"""
+        history = micropython_gdb.ExceptionHistory()
+        first = self.entry(0x100)
+        self.assertIs(history.add(first), first)
+        self.assertIs(history.add(self.entry(0x100)), first)
+        self.assertEqual(first["count"], 1)
+        first["value"] = "bad"
+        self.assertIs(history.add(self.entry(0x100, stop_id=2)), first)
+        self.assertEqual((first["stop_id"], "value" in first), (2, False))
+        history.add(self.entry(0x100, type_addr=0x5100))
+        self.assertEqual([e["count"] for e in history], [2, 1])
+
+    def test_eviction(self):
+        """The oldest entries are dropped past capacity, and can be recorded afresh"""
+        history = micropython_gdb.ExceptionHistory(capacity=3)
+        for address in (0x100, 0x200, 0x300, 0x400):
+            history.add(self.entry(address))
+        self.assertEqual([e["address"] for e in history], [0x200, 0x300, 0x400])
+        self.assertEqual(history.add(self.entry(0x100))["count"], 1)
+        history.set_capacity(2)
+        self.assertEqual([e["address"] for e in history], [0x400, 0x100])
+        self.assertEqual(history[-1]["count"], 1)
+        history.clear()
+        self.assertEqual(len(history), 0)
+        self.assertEqual(history.add(self.entry(0x400))["count"], 1)
+
+    def test_expand_skips_reused_object(self):
+        """After a resume, an object no longer of the recorded type is not read"""
+        mem = MockMemory()
+        mem.put_words(0x100, [0x5100])
+        mpy = make_helper(mem)
+        mpy.stop_id = 2
+        history = micropython_gdb.ExceptionHistory()
+        history.add(self.entry(0x100))
+        info = mpy.expand_history_entry(history[0])
+        self.assertEqual((info["address"], info["traceback"], info["attributes"], info["locals"]),
+                         ("0x100", [], {}, {}))
+        self.assertEqual(info["value"], "<unavailable: object freed>")
+        self.assertEqual(mem.reads, [(0x100, 4)])
+
+    def test_recording_reads_only_the_type(self):
+        """Recording a snapshot reads nothing past its type; fields it reads later are kept"""
+        mem = MockMemory()
+        mem.put_words(0x100, [0x5000])
+        mpy = make_helper(mem)
+        mpy.stop_id = 1
+        mpy.type_table = {0x5000: ("ValueError", "exception")}
+        mpy.exception_history = micropython_gdb.ExceptionHistory()
+        mpy.format_mp_obj = lambda obj, *args: "ValueError('bad')"
+        snapshot = micropython_gdb.ExceptionSnapshot(mpy, 0x100)
+        mpy.add_to_exception_history(snapshot)
+        self.assertEqual(mem.reads, [(0x100, 4)])
+        entry = mpy.exception_history[0]
+        self.assertNotIn("value", entry)
+        self.assertEqual(snapshot["value"], "ValueError('bad')")
+        self.assertEqual(entry["value"], "ValueError('bad')")
+        self.assertEqual((entry["type"], entry["type_addr"], entry["stop_id"]), ("ValueError", 0x5000, 1))
+
+    def test_inspecting_twice_counts_once(self):
+        """Several commands looking at one exception at one stop record one raise"""
+        mem = MockMemory()
+        mem.put_words(0x100, [0x5000])
+        mpy = make_helper(mem)
+        mpy.stop_id = 1
+        mpy.type_table = {0x5000: ("ValueError", "exception")}
+        mpy.exception_history = micropython_gdb.ExceptionHistory()
+        mpy.current_exception = lambda: 0x100
+        mpy.get_exception_info()
+        mpy.get_exception_info()
+        self.assertEqual([e["count"] for e in mpy.exception_history], [1])
+        mpy.stop_id = 2
+        mpy.get_exception_info()
+        self.assertEqual([e["count"] for e in mpy.exception_history], [2])
+
+class TestBytecodeDecoding(unittest.TestCase):
+    """Test cases for prelude and line-table decoding, against bytes encoded as py/bc.h does"""
+
+    Helper = micropython_gdb.MicroPythonHelper
+
+    def test_decode_uint(self):
+        self.assertEqual(self.Helper.decode_uint(bytes([0x05, 0x82, 0x01]), 0), (5, 1))
+        self.assertEqual(self.Helper.decode_uint(bytes([0x05, 0x82, 0x01]), 1), (257, 3))
+
+    def test_prelude_single_bytes(self):
+        """n_state 3, 2 positional args; 5 info bytes, 1 cell"""
+        self.assertEqual(self.Helper.decode_prelude(bytes([0x12, 0x0b])), {
+            "n_state": 3, "n_pos_args": 2, "n_kwonly_args": 0,
+            "n_info": 5, "n_cell": 1, "code_info": 2})
+
+    def test_prelude_continuation_bytes(self):
+        """n_state 21, 5 positional and 1 keyword-only arg; 100 info bytes"""
+        self.assertEqual(self.Helper.decode_prelude(bytes([0xa1, 0x1c, 0xc8, 0x02, 0xff])), {
+            "n_state": 21, "n_pos_args": 5, "n_kwonly_args": 1,
+            "n_info": 100, "n_cell": 0, "code_info": 4})
+
+    def test_line_table(self):
+        """Short and long entries; a long entry cut off at the end is ignored"""
+        table = bytes([0x24, 0x02, 0x93, 0x2c, 0x85])
+        self.assertEqual(self.Helper.decode_line_table(table), ([0, 4, 6, 9], [1, 2, 2, 302]))
+        self.assertEqual(self.Helper.decode_line_table(b""), ([0], [1]))
+
+class TestExceptionCatchpoint(unittest.TestCase):
+    """Test cases for mpy-catch breakpoints in the default (all raises) mode"""
+
+    def frame(self, exc):
+        return SimpleNamespace(read_var=lambda name: exc)
+
+    def test_builtin_type_is_plain_condition(self):
+        """An exact builtin match is a pointer compare with no uncaught filter"""
+        sym = SimpleNamespace(value=lambda: SimpleNamespace(address=0x5000))
+        with patch.object(gdb, "lookup_global_symbol", lambda name: sym):
+            bp = micropython_gdb.install_exception_catchpoint(None, "ValueError")
+        self.assertNotIsInstance(bp, micropython_gdb.ExceptionCatchpoint)
+        self.assertEqual(bp.condition, "*(void **)exc == (void *)0x5000")
+
+    def test_subclass_match(self):
+        """Subclass matching stops on raises whose MRO includes the type, and on nothing else"""
+        mem = MockMemory()
+        mem.put_words(0x100, [0x5100])
+        mem.put_words(0x200, [0x6000])
+        mpy = make_helper(mem)
+        mpy.obj_repr = micropython_gdb.ObjectRepr("A")
+        mpy.type_mro = lambda type_addr: [type_addr, 0x5000] if type_addr == 0x5100 else [type_addr]
+        with patch.object(micropython_gdb, "lookup_type_object", lambda name: 0x5000):
+            bp = micropython_gdb.install_exception_catchpoint(mpy, "ValueError", subclasses=True, ignore=1)
+        self.assertFalse(bp.uncaught)
+        with patch.object(gdb, "selected_frame", lambda: self.frame(0x100)):
+            self.assertFalse(bp.stop())  # ignored
+            self.assertTrue(bp.stop())
+        with patch.object(gdb, "selected_frame", lambda: self.frame(0x200)):
+            self.assertFalse(bp.stop())
+        self.assertEqual(bp.matched, 2)
+
+    def test_unreadable_raise_does_not_stop(self):
+        """An error checking a raise is reported once and does not stop the target"""
+        mpy = make_helper(MockMemory())
+        with patch.object(micropython_gdb, "lookup_type_object", lambda name: None):
+            bp = micropython_gdb.install_exception_catchpoint(mpy, "MyError")
+
+        def fail():
+            raise gdb.error("No frame selected.")
+
+        with patch.object(gdb, "selected_frame", fail), patch("builtins.print") as printed:
+            self.assertFalse(bp.stop())
+            self.assertFalse(bp.stop())
+        self.assertEqual(printed.call_count, 1)
+
+class TestFrameState(unittest.TestCase):
+    """Test cases for reading a Python frame's value stack"""
+
+    def helper(self, sp):
+        mem = MockMemory()
+        mem.put_words(0x108, [0x11, 0x13, 0x15, 0x17, 0x19])
+        mpy = make_helper(mem)
+        mpy.field_offset = lambda type_name, field: 8
+        mpy.cast_obj = lambda addr, type_name: {"sp": sp}
+        mpy.code_info = lambda fun_bc: {"n_state": 5}
+        return mpy
+
+    def test_stack_up_to_sp(self):
+        """state[0] is the bottom of the stack and sp its top item"""
+        frame = {"code_state": 0x100, "fun_bc": 0x40}
+        self.assertEqual(self.helper(0x10c).frame_stack(frame), [0x11, 0x13])
+        self.assertEqual(self.helper(0x104).frame_stack(frame), [])
+        self.assertEqual(self.helper(0x200).frame_stack(frame), [0x11, 0x13, 0x15, 0x17, 0x19])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Unit tests for the static qstr index generator
+"""
+import sys
+import os
+import unittest
+
+# Add the scripts directory to the path so we can import the generator
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../scripts')))
+
+import gen_qstr_index
+
+class TestQstrIndex(unittest.TestCase):
+    """Test cases for gen_qstr_index"""
+
+    def test_parse_current_format(self):
+        """QDEF0/QDEF1 entries are returned in pool order"""
+        lines = [
+            '// This file was automatically generated by makeqstrdata.py',
+            'QDEF0(MP_QSTRnull, 0, 0, "")',
+            'QDEF0(MP_QSTR_, 5, 0, "")',
+            'QDEF0(MP_QSTR___dir__, 122, 7, "__dir__")',
+            'QDEF1(MP_QSTR_sensor_data, 215, 11, "sensor_data")',
+        ]
+        self.assertEqual(gen_qstr_index.parse_qstrdefs(lines), ["", "", "__dir__", "sensor_data"])
+
+    def test_qdef0_before_qdef1(self):
+        """QDEF0 qstrs take the first ids even if the header interleaves them"""
+        lines = [
+            'QDEF0(MP_QSTRnull, 0, 0, "")',
+            'QDEF1(MP_QSTR_alpha, 41, 5, "alpha")',
+            'QDEF0(MP_QSTR___init__, 95, 8, "__init__")',
+            'QDEF1(MP_QSTR_beta, 12, 4, "beta")',
+        ]
+        self.assertEqual(gen_qstr_index.parse_qstrdefs(lines), ["", "__init__", "alpha", "beta"])
+
+    def test_parse_legacy_format(self):
+        """Legacy QDEF entries skip the hash/length header literal"""
+        lines = [
+            'QDEF(MP_QSTRnull, (const byte*)"\\x00\\x00\\x00" "")',
+            'QDEF(MP_QSTR_main, (const byte*)"\\x8e\\xa5\\x04" "main")',
+        ]
+        self.assertEqual(gen_qstr_index.parse_qstrdefs(lines), ["", "main"])
+
+    def test_unescape(self):
+        """C escapes are decoded"""
+        self.assertEqual(gen_qstr_index.unescape_c_string(r'a\x41\n\\\"'), b'aA\n\\"')
+        self.assertEqual(gen_qstr_index.unescape_c_string(r'\101'), b'A')
+
+if __name__ == '__main__':
+    unittest.main()